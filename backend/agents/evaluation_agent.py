@@ -1,59 +1,243 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, AsyncIterator, Iterator, List, Optional
+from concurrent.futures import ThreadPoolExecutor
 from utils.gemini_client import GeminiClient
-from utils.prompt_templates import EVALUATION_AGENT_PROMPT, RESPONSE_GENERATION_PROMPT
+from utils.prompt_templates import (EVALUATION_AGENT_SYSTEM, EVALUATION_AGENT_INPUT,
+                                    RESPONSE_GENERATION_SYSTEM, RESPONSE_GENERATION_INPUT)
+from utils.evaluation_store import EvaluationStore, evaluation_store
+from utils.metrics import MetricsSink, metrics_sink
+from utils.prompt_context import format_tool_results, summarize_tool_results
+from utils.schemas import Evaluation
+from utils.tracing import propagate
+import os
+import time
+import uuid
+import random
 
 class EvaluationAgent:
     """
     Agent responsible for generating and evaluating responses.
     """
-    def __init__(self, gemini_client: GeminiClient):
+    def __init__(self, gemini_client: GeminiClient, mode: Optional[str] = None, sample_rate: Optional[float] = None,
+                 store: Optional[EvaluationStore] = None, sink: Optional[MetricsSink] = None):
+        """
+        Initialize the evaluation agent.
+        
+        Args:
+            gemini_client: Client used for generation and evaluation
+            mode: "inline" evaluates before returning; "background" returns as soon as the response is
+                  generated and evaluates a sample of traffic in a worker pool (default: EVALUATION_MODE or "inline")
+            sample_rate: Fraction of in-scope responses evaluated in background mode
+                         (default: EVALUATION_SAMPLE_RATE or 0.1)
+            store: Where background results are kept for clients to fetch by message ID
+            sink: Where background results are emitted as metrics
+        """
         self.gemini_client = gemini_client
         self.evaluation_criteria = ["accuracy", "relevance", "completeness", "clarity"]
+        # Only the answer the user reads needs the pro model
+        self.response_tier = os.environ.get("RESPONSE_MODEL_TIER", "pro")
+        self.evaluation_tier = os.environ.get("EVALUATION_MODEL_TIER", "fast")
+        self.mode = (mode or os.environ.get("EVALUATION_MODE", "inline")).lower()
+        self.sample_rate = sample_rate if sample_rate is not None else float(os.environ.get("EVALUATION_SAMPLE_RATE", 0.1))
+        self.store = store or evaluation_store
+        self.sink = sink or metrics_sink
+        self.pool = None
+        if self.mode == "background":
+            self.pool = ThreadPoolExecutor(
+                max_workers=int(os.environ.get("EVALUATION_WORKERS", 2)),
+                thread_name_prefix="evaluation"
+            )
     
-    def generate_response(self, query: str, information: Dict[str, Any], context: str = "") -> str:
+    def build_response_prompt(self, query: str, information: Dict[str, Any], context: str = "") -> str:
         """
-        Generate a response based on the gathered information and conversation context.
+        Build the dynamic part of the response generation prompt; the static
+        part is sent as the system instruction.
         """
-        prompt = RESPONSE_GENERATION_PROMPT.format(
+        return RESPONSE_GENERATION_INPUT.format(
             query=query,
             context=context,
-            information=str(information)
+            information=format_tool_results(information, query, consumer="response")
         )
+    
+    def generate_response(self, query: str, information: Dict[str, Any], context: str = "") -> str:
+        """
+        Generate a response based on the gathered information and conversation context.
+        """
+        prompt = self.build_response_prompt(query, information, context)
         
-        response = self.gemini_client.generate_text(prompt)
+        response = self.gemini_client.generate_text(prompt, system_instruction=RESPONSE_GENERATION_SYSTEM,
+                                                    tier=self.response_tier)
         return response
     
-    def evaluate_response(self, query: str, tool_results: Dict[str, Any], proposed_response: str) -> Dict[str, Any]:
+    async def agenerate_response(self, query: str, information: Dict[str, Any], context: str = "") -> str:
         """
-        Evaluate the proposed response.
+        Async variant of generate_response().
+        """
+        prompt = self.build_response_prompt(query, information, context)
+        return await self.gemini_client.agenerate_text(prompt, system_instruction=RESPONSE_GENERATION_SYSTEM,
+                                                       tier=self.response_tier)
+    
+    def stream_response(self, query: str, information: Dict[str, Any], context: str = "") -> Iterator[str]:
+        """
+        Generate a response like generate_response, yielding text chunks as they are produced.
         """
-        prompt = EVALUATION_AGENT_PROMPT.format(
+        prompt = self.build_response_prompt(query, information, context)
+        return self.gemini_client.stream_text(prompt, system_instruction=RESPONSE_GENERATION_SYSTEM,
+                                             tier=self.response_tier)
+    
+    def astream_response(self, query: str, information: Dict[str, Any], context: str = "") -> AsyncIterator[str]:
+        """
+        Async variant of stream_response().
+        """
+        prompt = self.build_response_prompt(query, information, context)
+        return self.gemini_client.astream_text(prompt, system_instruction=RESPONSE_GENERATION_SYSTEM,
+                                              tier=self.response_tier)
+    
+    def build_evaluation_prompt(self, query: str, tool_results: Dict[str, Any], proposed_response: str) -> str:
+        return EVALUATION_AGENT_INPUT.format(
             query=query,
-            tool_results=str(tool_results),
+            # The evaluator only needs an outline of what the tools found
+            tool_results=summarize_tool_results(tool_results, query, consumer="evaluation"),
             proposed_response=proposed_response
         )
+    
+    def evaluate_response(self, query: str, tool_results: Dict[str, Any], proposed_response: str) -> Dict[str, Any]:
+        """
+        Evaluate the proposed response.
+        """
+        prompt = self.build_evaluation_prompt(query, tool_results, proposed_response)
         
-        evaluation_json = self.gemini_client.generate_text(prompt)
+        try:
+            # Every criterion is required; output missing one gets a repair call
+            evaluation = self.gemini_client.generate_structured(prompt, Evaluation,
+                                                                system_instruction=EVALUATION_AGENT_SYSTEM,
+                                                                tier=self.evaluation_tier)
+            return evaluation.model_dump()
+        except Exception as e:
+            print(f"Error parsing evaluation: {str(e)}")
+            return self.fallback_evaluation()
+    
+    async def aevaluate_response(self, query: str, tool_results: Dict[str, Any], proposed_response: str) -> Dict[str, Any]:
+        """
+        Async variant of evaluate_response().
+        """
+        prompt = self.build_evaluation_prompt(query, tool_results, proposed_response)
         
         try:
-            evaluation = self.gemini_client.parse_json_response(evaluation_json)
-            
-            # Ensure all criteria have values
-            for criterion in self.evaluation_criteria:
-                if criterion not in evaluation:
-                    evaluation[criterion] = 7  # Default score
-                    
-            return evaluation
+            evaluation = await self.gemini_client.agenerate_structured(prompt, Evaluation,
+                                                                       system_instruction=EVALUATION_AGENT_SYSTEM,
+                                                                       tier=self.evaluation_tier)
+            return evaluation.model_dump()
         except Exception as e:
             print(f"Error parsing evaluation: {str(e)}")
-            # Fallback evaluation
+            return self.fallback_evaluation()
+    
+    def fallback_evaluation(self) -> Dict[str, Any]:
+        # Fallback evaluation, flagged so it is not mistaken for a real score
+        return {
+            "accuracy": 7,
+            "relevance": 7,
+            "completeness": 7,
+            "clarity": 7,
+            "feedback": "Unable to generate detailed evaluation.",
+            "fallback": True
+        }
+    
+    def evaluate_in_background(self, message_id: str, conversation_id: Optional[str], query: str,
+                               tool_results: Dict[str, Any], response: str) -> None:
+        """
+        Evaluate a response in the worker pool and record the result.
+        """
+        start_time = time.time()
+        try:
+            evaluation = self.evaluate_response(query, tool_results, response)
+        except Exception as e:
+            print(f"Error in background evaluation: {str(e)}")
+            self.store.fail(message_id, str(e), conversation_id)
+            return
+        
+        followers = self.store.complete(message_id, evaluation, conversation_id)
+        self.sink.emit("response_evaluation", {
+            "message_id": message_id,
+            "conversation_id": conversation_id,
+            "duration_ms": int((time.time() - start_time) * 1000),
+            **{criterion: evaluation.get(criterion) for criterion in self.evaluation_criteria}
+        })
+        
+        # Coalesced requests that shared this response have their own stored turns
+        for stored_message_id, stored_conversation_id in [(message_id, conversation_id)] + followers:
+            if not stored_conversation_id:
+                continue
+            try:
+                from graph.state_management import conversation_state
+                conversation_state.update_message_evaluation(stored_conversation_id, stored_message_id, evaluation)
+            except Exception as e:
+                print(f"Warning: Could not store evaluation: {str(e)}")
+    
+    def evaluate_or_schedule(self, state: Dict[str, Any], response: str) -> Dict[str, Any]:
+        """
+        Evaluate a generated response inline, or schedule it in background mode.
+        
+        Returns:
+            State updates: "evaluation" (None while pending, when not sampled or when degraded) and "evaluation_status"
+        """
+        query = state.get("message", "")
+        tool_results = state.get("tool_results", {})
+        
+        if state.get("degraded"):
+            # Admitted under load: answer without spending a Gemini call on grading it
+            return {"evaluation": None, "evaluation_status": "skipped"}
+        if self.mode != "background":
             return {
-                "accuracy": 7,
-                "relevance": 7,
-                "completeness": 7,
-                "clarity": 7,
-                "feedback": "Unable to generate detailed evaluation."
+                "evaluation": self.evaluate_response(query, tool_results, response),
+                "evaluation_status": "complete"
             }
+        return self.schedule(state, response)
+    
+    async def aevaluate_or_schedule(self, state: Dict[str, Any], response: str) -> Dict[str, Any]:
+        """
+        Async variant of evaluate_or_schedule(); background evaluations still run in the worker pool.
+        """
+        if state.get("degraded"):
+            return {"evaluation": None, "evaluation_status": "skipped"}
+        if self.mode != "background":
+            return {
+                "evaluation": await self.aevaluate_response(state.get("message", ""), state.get("tool_results", {}), response),
+                "evaluation_status": "complete"
+            }
+        return self.schedule(state, response)
+    
+    def schedule(self, state: Dict[str, Any], response: str) -> Dict[str, Any]:
+        """
+        Queue a sampled background evaluation.
+        """
+        query = state.get("message", "")
+        tool_results = state.get("tool_results", {})
+        
+        if random.random() >= self.sample_rate:
+            return {"evaluation": None, "evaluation_status": "skipped"}
+        
+        message_id = state.get("message_id") or uuid.uuid4().hex
+        conversation_id = state.get("conversation_id")
+        self.store.mark_pending(message_id, conversation_id)
+        self.pool.submit(propagate(self.evaluate_in_background), message_id, conversation_id, query, tool_results, response)
+        return {"evaluation": None, "evaluation_status": "pending", "message_id": message_id}
+    
+    def out_of_scope_result(self) -> Dict[str, Any]:
+        """
+        Fixed response and evaluation for queries outside the chatbot's scope.
+        """
+        out_of_scope_response = "I'm sorry, but I can only answer questions about Duke University, its academic programs, campus life, or events. Your question appears to be outside my scope of knowledge. Could you ask something related to Duke University instead?"
+        return {
+            "proposed_response": out_of_scope_response,
+            "evaluation": {
+                "accuracy": 10,
+                "relevance": 10,
+                "completeness": 10,
+                "clarity": 10,
+                "feedback": "Out of scope query correctly identified."
+            },
+            "response": out_of_scope_response
+        }
     
     def __call__(self, state: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -66,29 +250,46 @@ class EvaluationAgent:
         
         # Check if query was deemed out of scope (empty tools)
         if not plan.get("tools"):
-            out_of_scope_response = "I'm sorry, but I can only answer questions about Duke University, its academic programs, campus life, or events. Your question appears to be outside my scope of knowledge. Could you ask something related to Duke University instead?"
             return {
                 **state,
-                "proposed_response": out_of_scope_response,
-                "evaluation": {
-                    "accuracy": 10,
-                    "relevance": 10,
-                    "completeness": 10,
-                    "clarity": 10,
-                    "feedback": "Out of scope query correctly identified."
-                },
-                "response": out_of_scope_response,
+                **self.out_of_scope_result(),
+                "next": "final"
+            }
+        
+        # Continue with normal response generation for in-scope queries, unless an
+        # earlier node has already generated the response
+        proposed_response = state.get("proposed_response")
+        if proposed_response is None:
+            proposed_response = self.generate_response(query, tool_results, context)
+        
+        return {
+            **state,
+            "proposed_response": proposed_response,
+            **self.evaluate_or_schedule(state, proposed_response),
+            "response": proposed_response,
+            "next": "final"
+        }
+    
+    async def acall(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Async variant of __call__, for the async serving path.
+        """
+        if not state.get("plan", {}).get("tools"):
+            return {
+                **state,
+                **self.out_of_scope_result(),
                 "next": "final"
             }
         
-        # Continue with normal response generation for in-scope queries
-        proposed_response = self.generate_response(query, tool_results, context)
-        evaluation = self.evaluate_response(query, tool_results, proposed_response)
+        proposed_response = state.get("proposed_response")
+        if proposed_response is None:
+            proposed_response = await self.agenerate_response(state.get("message", ""), state.get("tool_results", {}),
+                                                              state.get("context", ""))
         
         return {
             **state,
             "proposed_response": proposed_response,
-            "evaluation": evaluation,
+            **await self.aevaluate_or_schedule(state, proposed_response),
             "response": proposed_response,
             "next": "final"
         }
\ No newline at end of file
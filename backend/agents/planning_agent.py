@@ -1,27 +1,226 @@
 ## agents/planning_agent.py
 from langchain_core.tools import BaseTool
-from typing import List, Dict, Any
-from utils.gemini_client import GeminiClient
-from utils.prompt_templates import PLANNING_AGENT_PROMPT
+from typing import List, Dict, Any, Optional
+from utils.gemini_client import GeminiClient, GeminiError, GeminiRateLimitError
+from agents.rule_router import RuleBasedRouter
+from utils.schemas import Plan
+from utils.prompt_templates import (PLANNING_AGENT_SYSTEM, PLANNING_AGENT_INPUT,
+                                    PLANNING_AGENT_SINGLE_CALL_SYSTEM, PLANNING_AGENT_SINGLE_CALL_INPUT)
 from datetime import datetime
+import os
+import zlib
+
+# Response schema for single-call planning; the union of every tool's parameters
+PLAN_RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "in_scope": {"type": "boolean"},
+        "tools": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "name": {"type": "string"},
+                    "parameters": {
+                        "type": "object",
+                        "properties": {
+                            "query": {"type": "string"},
+                            "topic": {"type": "string"},
+                            "days": {"type": "integer"},
+                            "keyword": {"type": "string"},
+                            "start_date": {"type": "string"},
+                            "end_date": {"type": "string"},
+                            "limit": {"type": "integer"}
+                        }
+                    }
+                },
+                "required": ["name", "parameters"]
+            }
+        },
+        "reasoning": {"type": "string"}
+    },
+    "required": ["in_scope", "tools", "reasoning"]
+}
 
 class PlanningAgent:
     """
     Agent responsible for planning which tools to use based on the user query.
     """
-    def __init__(self, available_tools: List[BaseTool], gemini_client: GeminiClient):
+    def __init__(self, available_tools: List[BaseTool], gemini_client: GeminiClient, mode: str = None,
+                 router: Optional[RuleBasedRouter] = None):
+        """
+        Initialize the planning agent.
+        
+        Args:
+            available_tools: The tools the planner may select
+            gemini_client: Client used for the planning calls
+            mode: "single" (one schema-constrained call), "two_call" (the original decision plus planning
+                  calls) or "ab" (split traffic between the two by PLANNING_AB_SINGLE_RATIO).
+                  Defaults to PLANNING_MODE or "single".
+            router: Optional rule-based router tried before any Gemini call
+        """
         self.available_tools = available_tools
         self.gemini_client = gemini_client
         self.tool_dict = {tool.name: tool for tool in available_tools}
+        self.mode = (mode or os.environ.get("PLANNING_MODE", "single")).lower()
+        self.ab_single_ratio = float(os.environ.get("PLANNING_AB_SINGLE_RATIO", 0.5))
+        self.router = router
+        # Planning is a short classification task, so it runs on the fast model by default
+        self.model_tier = os.environ.get("PLANNING_MODEL_TIER", "fast")
+    
+    def select_mode(self, query: str) -> str:
+        """
+        Pick the planning mode for a query. In "ab" mode the split is a stable hash
+        of the query so repeated questions are always routed the same way.
+        """
+        if self.mode != "ab":
+            return "two_call" if self.mode == "two_call" else "single"
+        bucket = zlib.crc32(query.strip().lower().encode("utf-8")) % 1000
+        return "single" if bucket < self.ab_single_ratio * 1000 else "two_call"
+    
+    def is_ai_faculty_query(self, query: str) -> bool:
+        """
+        Check whether a query asks about who teaches in the AI program.
+        """
+        return "ai" in query.lower() and any(word in query.lower() for word in ["faculty", "teach", "professor"])
+    
+    def route(self, query: str) -> Optional[Dict[str, Any]]:
+        """
+        Plan obvious queries with the rule table, without calling the LLM.
+        """
+        if self.router is None:
+            return None
+        fast_plan = self.router.try_route(query)
+        if fast_plan is not None:
+            fast_plan["planning_mode"] = "rules"
+        return fast_plan
     
-    # In planning_agent.py, update the plan method:
-
     def plan(self, query: str) -> Dict[str, Any]:
         """
         Plan which tools to use and parameters to pass based on the user query.
         """
+        fast_plan = self.route(query)
+        if fast_plan is not None:
+            return fast_plan
+        
+        mode = self.select_mode(query)
+        if mode == "single":
+            plan = self.plan_single_call(query)
+        else:
+            plan = self.plan_two_call(query)
+        plan["planning_mode"] = mode
+        return plan
+    
+    async def aplan(self, query: str) -> Dict[str, Any]:
+        """
+        Async variant of plan().
+        """
+        fast_plan = self.route(query)
+        if fast_plan is not None:
+            return fast_plan
+        
+        mode = self.select_mode(query)
+        if mode == "single":
+            plan = await self.aplan_single_call(query)
+        else:
+            plan = await self.aplan_two_call(query)
+        plan["planning_mode"] = mode
+        return plan
+    
+    def single_call_prompt(self, query: str) -> str:
+        return PLANNING_AGENT_SINGLE_CALL_INPUT.format(
+            query=query,
+            today=datetime.now().strftime("%Y-%m-%d")
+        )
+    
+    def plan_single_call(self, query: str) -> Dict[str, Any]:
+        """
+        Decide scope, tools and parameters with one schema-constrained Gemini call.
+        """
+        try:
+            decision = self.gemini_client.generate_structured(self.single_call_prompt(query), Plan,
+                                                              system_instruction=PLANNING_AGENT_SINGLE_CALL_SYSTEM,
+                                                              tier=self.model_tier,
+                                                              response_schema=PLAN_RESPONSE_SCHEMA)
+        except GeminiRateLimitError:
+            # Answering would hit the same quota, so let the caller back off
+            raise
+        except GeminiError as e:
+            print(f"Planning error: {str(e)}")
+            return self.fallback_plan(query)
+        return self.single_call_plan(query, decision)
+    
+    async def aplan_single_call(self, query: str) -> Dict[str, Any]:
+        """
+        Async variant of plan_single_call().
+        """
+        try:
+            decision = await self.gemini_client.agenerate_structured(self.single_call_prompt(query), Plan,
+                                                                     system_instruction=PLANNING_AGENT_SINGLE_CALL_SYSTEM,
+                                                                     tier=self.model_tier,
+                                                                     response_schema=PLAN_RESPONSE_SCHEMA)
+        except GeminiRateLimitError:
+            raise
+        except GeminiError as e:
+            print(f"Planning error: {str(e)}")
+            return self.fallback_plan(query)
+        return self.single_call_plan(query, decision)
+    
+    def single_call_plan(self, query: str, decision: Plan) -> Dict[str, Any]:
+        """
+        Turn a validated single-call decision into the plan.
+        """
+        if not decision.in_scope:
+            return {
+                "tools": [],
+                "reasoning": "This query appears to be outside the scope of the Duke University chatbot."
+            }
+        
+        # Unset parameters were already dropped when the plan was validated
+        tools = [tool.model_dump() for tool in decision.tools if tool.name in self.tool_dict]
+        
+        # Same guard as the two-call planner - AI faculty questions go to the specialized tool
+        if self.is_ai_faculty_query(query) and any(tool["name"] != "DukeAIMEngTool" for tool in tools):
+            return {
+                "tools": [{
+                    "name": "DukeAIMEngTool",
+                    "parameters": {"query": query}
+                }],
+                "reasoning": "Routing AI faculty question to specialized tool"
+            }
+        
+        if not tools:
+            return self.fallback_plan(query)
+        
+        return {
+            "tools": tools,
+            "reasoning": decision.reasoning
+        }
+    
+    def fallback_plan(self, query: str) -> Dict[str, Any]:
+        """
+        Plan used when the model's output cannot be used.
+        """
+        if self.is_ai_faculty_query(query):
+            return {
+                "tools": [{
+                    "name": "DukeAIMEngTool",
+                    "parameters": {"query": query}
+                }],
+                "reasoning": "Routing AI faculty question to specialized tool despite parsing error"
+            }
+        
+        return {
+            "tools": [{
+                "name": "DukeGeneralInfoTool",
+                "parameters": {"query": query}
+            }],
+            "reasoning": "Defaulting to general info tool due to planning error."
+        }
+    
+    def decision_prompt(self, query: str) -> str:
         # First, create a more contextual prompt that helps the model understand what's Duke-related
-        contextual_prompt = f"""
+        return f"""
         Analyze this user query: "{query}"
         
         Determine which Duke University information tool would be most appropriate:
@@ -35,78 +234,114 @@ class PlanningAgent:
         
         Return a JSON with your decision.
         """
+    
+    def decision_plan(self, query: str, decision: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        The plan implied by the first call's decision alone, or None if the planning call is needed.
+        """
+        if decision.get("out_of_scope", False):
+            return {
+                "tools": [],
+                "reasoning": "This query appears to be outside the scope of the Duke University chatbot."
+            }
+            
+        selected_tool = decision.get("selected_tool")
+        if selected_tool == "DukeAIMEngTool" and "faculty" in query.lower():
+            return {
+                "tools": [{
+                    "name": "DukeAIMEngTool", 
+                    "parameters": {"query": query}
+                }],
+                "reasoning": "Using specialized AI MEng tool for faculty information."
+            }
+        return None
+    
+    def two_call_plan(self, query: str, plan: Plan) -> Dict[str, Any]:
+        """
+        Turn the validated planning call output into the plan.
+        """
+        plan_json = {"tools": [tool.model_dump() for tool in plan.tools], "reasoning": plan.reasoning}
         
-        # Get a decision from the LLM directly
-        decision_response = self.gemini_client.generate_text(contextual_prompt)
+        # Extra validation - ensure AI faculty questions go to the right tool
+        if self.is_ai_faculty_query(query):
+            for tool in plan_json.get("tools", []):
+                if tool.get("name") != "DukeAIMEngTool":
+                    # Override with the correct tool
+                    return {
+                        "tools": [{
+                            "name": "DukeAIMEngTool",
+                            "parameters": {"query": query}
+                        }],
+                        "reasoning": "Routing AI faculty question to specialized tool"
+                    }
         
+        return plan_json
+    
+    def plan_two_call(self, query: str) -> Dict[str, Any]:
+        """
+        Plan with a free-form scope/tool decision call followed by a full planning call.
+        """
         try:
+            # Get a decision from the LLM directly
+            decision_response = self.gemini_client.generate_text(self.decision_prompt(query), tier=self.model_tier)
             decision = self.gemini_client.parse_json_response(decision_response)
             
-            if decision.get("out_of_scope", False):
-                return {
-                    "tools": [],
-                    "reasoning": "This query appears to be outside the scope of the Duke University chatbot."
-                }
-                
-            selected_tool = decision.get("selected_tool")
-            if selected_tool == "DukeAIMEngTool" and "faculty" in query.lower():
-                return {
-                    "tools": [{
-                        "name": "DukeAIMEngTool", 
-                        "parameters": {"query": query}
-                    }],
-                    "reasoning": "Using specialized AI MEng tool for faculty information."
-                }
+            decided = self.decision_plan(query, decision)
+            if decided is not None:
+                return decided
                 
             # Proceed with standard planning for other queries
-            prompt = PLANNING_AGENT_PROMPT.format(query=query)
-            response = self.gemini_client.generate_text(prompt)
-            
-            # Process the planning response
-            plan_json = self.gemini_client.parse_json_response(response)
-            
-            # Extra validation - ensure AI faculty questions go to the right tool
-            if "ai" in query.lower() and any(word in query.lower() for word in ["faculty", "teach", "professor"]):
-                for tool in plan_json.get("tools", []):
-                    if tool.get("name") != "DukeAIMEngTool":
-                        # Override with the correct tool
-                        return {
-                            "tools": [{
-                                "name": "DukeAIMEngTool",
-                                "parameters": {"query": query}
-                            }],
-                            "reasoning": "Routing AI faculty question to specialized tool"
-                        }
-            
-            return plan_json
+            prompt = PLANNING_AGENT_INPUT.format(query=query)
+            plan = self.gemini_client.generate_structured(prompt, Plan, system_instruction=PLANNING_AGENT_SYSTEM,
+                                                          tier=self.model_tier)
+            return self.two_call_plan(query, plan)
+        except GeminiRateLimitError:
+            raise
         except Exception as e:
             print(f"Planning error: {str(e)}")
             # Even in case of errors, route AI faculty questions correctly
-            if "ai" in query.lower() and any(word in query.lower() for word in ["faculty", "teach", "professor"]):
-                return {
-                    "tools": [{
-                        "name": "DukeAIMEngTool",
-                        "parameters": {"query": query}
-                    }],
-                    "reasoning": "Routing AI faculty question to specialized tool despite parsing error"
-                }
+            return self.fallback_plan(query)
+    
+    async def aplan_two_call(self, query: str) -> Dict[str, Any]:
+        """
+        Async variant of plan_two_call().
+        """
+        try:
+            decision_response = await self.gemini_client.agenerate_text(self.decision_prompt(query), tier=self.model_tier)
+            decision = self.gemini_client.parse_json_response(decision_response)
             
-            # Default fallback
-            return {
-                "tools": [{
-                    "name": "DukeGeneralInfoTool",
-                    "parameters": {"query": query}
-                }],
-                "reasoning": "Defaulting to general info tool due to planning error."
-            }
+            decided = self.decision_plan(query, decision)
+            if decided is not None:
+                return decided
+            
+            prompt = PLANNING_AGENT_INPUT.format(query=query)
+            plan = await self.gemini_client.agenerate_structured(prompt, Plan, system_instruction=PLANNING_AGENT_SYSTEM,
+                                                                 tier=self.model_tier)
+            return self.two_call_plan(query, plan)
+        except GeminiRateLimitError:
+            raise
+        except Exception as e:
+            print(f"Planning error: {str(e)}")
+            return self.fallback_plan(query)
     
     def __call__(self, state: Dict[str, Any]) -> Dict[str, Any]:
         """
         Process the user query and update the state with the planning information.
         """
         query = state.get("message", "")
-        plan = self.plan(query)
-        
+        return self.planned_state(state, query, self.plan(query))
+    
+    async def acall(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Async variant of __call__, for the async serving path.
+        """
+        query = state.get("message", "")
+        return self.planned_state(state, query, await self.aplan(query))
+    
+    def planned_state(self, state: Dict[str, Any], query: str, plan: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Add a plan to the state.
+        """
         # Enhanced plan with current date for future reference
         plan["query_time"] = datetime.now().isoformat()
         
@@ -116,7 +351,9 @@ class PlanningAgent:
             if "out of scope" not in plan.get("reasoning", "").lower():
                 plan["reasoning"] = "This query appears to be outside the scope of the Duke University chatbot."
         
+        # Carry the rest of the state (conversation ID, context, message ID) forward
         return {
+            **state,
             "message": query,
             "plan": plan,
             "next": "execute_tools"
@@ -0,0 +1,272 @@
+# backend/agents/rule_router.py
+import os
+import re
+import json
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+
+# Words that carry no topic information when extracting an event topic
+STOPWORDS = {
+    "a", "an", "the", "at", "in", "on", "of", "for", "to", "and", "or", "is", "are", "any", "there", "what",
+    "whats", "which", "when", "where", "who", "how", "me", "show", "list", "find", "tell", "about", "duke",
+    "university", "campus", "happening", "going", "do", "does", "i", "can", "some", "upcoming",
+    "event", "events", "activities", "activity", "this", "next", "today", "tonight", "tomorrow", "week",
+    "weekend", "month", "please", "with", "get"
+}
+
+EVENT_WORDS = ["event", "events", "happening", "activities", "seminar", "seminars", "workshop", "workshops",
+               "talk", "talks", "lecture", "lectures", "career fair", "info session"]
+
+# Phrases that tie a query to Duke; generic service words ("bus", "gym", "tuition") alone do not
+DUKE_ANCHORS = ["duke", "dukecard", "east campus", "west campus", "central campus", "perkins", "bostock",
+                "lilly library", "brodhead center", "bryan center", "wilson gym"]
+
+# Default rule table. Each rule matches on keywords ("any"/"all") and/or regexes ("patterns"),
+# optionally only together with one of its "anchors", maps to a tool and parameter templates
+# (a template that comes out empty is left out), and carries a base confidence.
+DEFAULT_RULES: List[Dict[str, Any]] = [
+    {
+        "name": "ai_meng",
+        "patterns": [r"\bai\s*-?\s*m\.?\s*eng\b", r"\bai\b.*\b(faculty|professors?|teach\w*|instructors?)\b"],
+        "tool": "DukeAIMEngTool",
+        "parameters": {"query": "{query}"},
+        "confidence": 0.95
+    },
+    {
+        "name": "dated_events",
+        "any": EVENT_WORDS,
+        "requires_date": True,
+        "tool": "DukeEventsSearchTool",
+        "date_routing": True,
+        "confidence": 0.9
+    },
+    {
+        "name": "undated_events",
+        "any": EVENT_WORDS,
+        "tool": "DukeEventsSearchTool",
+        "parameters": {"topic": "{topic}", "days": 7},
+        "confidence": 0.7
+    },
+    {
+        "name": "campus_services",
+        "any": ["parking", "dining", "dining hall", "meal plan", "library", "libraries", "housing", "dorm",
+                "dorms", "shuttle", "bus", "gym", "recreation", "bookstore", "student health", "counseling",
+                "caps", "wifi", "duke card", "dukecard", "tuition", "financial aid", "admissions office"],
+        "anchors": DUKE_ANCHORS,
+        "tool": "DukeGeneralInfoTool",
+        "parameters": {"query": "{query}"},
+        "confidence": 0.85,
+        "max_words": 10
+    }
+]
+
+
+def normalize(text: str) -> str:
+    """Lowercase, drop possessives and apostrophes ("duke's" -> "duke", "what's" -> "whats") and punctuation."""
+    text = re.sub(r"['\u2019]s\b", "", text.lower())
+    text = re.sub(r"['\u2019]", "", text)
+    return re.sub(r"\s+", " ", re.sub(r"[^\w\s-]", " ", text)).strip()
+
+
+def contains_phrase(text: str, phrase: str) -> bool:
+    return re.search(rf"\b{re.escape(phrase)}\b", text) is not None
+
+
+def parse_date_expression(text: str, now: Optional[datetime] = None) -> Optional[Dict[str, Any]]:
+    """
+    Resolve a relative date expression ("today", "this week", "next month", ...) into a window.
+
+    Returns:
+        {"expression", "start_date", "end_date", "days", "future"} or None; "future" is True
+        when the window starts after today and so needs the future events tool
+    """
+    now = now or datetime.now()
+    today = now.date()
+
+    if contains_phrase(text, "today") or contains_phrase(text, "tonight"):
+        expression, start, end = "today", today, today
+    elif contains_phrase(text, "tomorrow"):
+        expression, start, end = "tomorrow", today + timedelta(days=1), today + timedelta(days=1)
+    elif contains_phrase(text, "this weekend"):
+        # Friday through Sunday; on a Sunday only today is left
+        sunday = today + timedelta(days=6 - today.weekday())
+        expression, start, end = "this weekend", max(today, sunday - timedelta(days=2)), sunday
+    elif contains_phrase(text, "next week"):
+        monday = today + timedelta(days=7 - today.weekday())
+        expression, start, end = "next week", monday, monday + timedelta(days=6)
+    elif contains_phrase(text, "this week"):
+        expression, start, end = "this week", today, today + timedelta(days=6 - today.weekday())
+    elif contains_phrase(text, "next month"):
+        first = (today.replace(day=1) + timedelta(days=32)).replace(day=1)
+        last = (first + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+        expression, start, end = "next month", first, last
+    elif contains_phrase(text, "this month"):
+        last = (today.replace(day=1) + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+        expression, start, end = "this month", today, last
+    else:
+        return None
+
+    return {
+        "expression": expression,
+        "start_date": start.strftime("%Y-%m-%d"),
+        "end_date": end.strftime("%Y-%m-%d"),
+        "days": (end - today).days + 1,
+        "future": start > today
+    }
+
+
+def extract_topic(text: str) -> str:
+    """
+    Extract the topic words of an events query, e.g. "career" from "career events this week",
+    or "" when the query names no topic.
+    """
+    words = [w for w in text.split() if w not in STOPWORDS and not w.isdigit()]
+    return " ".join(words)
+
+
+class RuleBasedRouter:
+    """
+    Deterministic pre-router that plans obvious queries without calling the LLM.
+
+    Every rule that matches a query is scored; the best rule becomes a plan with
+    a confidence score. Confidence is reduced when rules that point at different
+    tools match the same query. Plans below the threshold fall through to the
+    LLM planner.
+    """
+    def __init__(self, rules: Optional[List[Dict[str, Any]]] = None, threshold: float = 0.8):
+        self.rules = rules if rules is not None else DEFAULT_RULES
+        self.threshold = threshold
+        self._compiled = [[re.compile(p, re.IGNORECASE) for p in rule.get("patterns", [])] for rule in self.rules]
+        self._lock = threading.Lock()
+        self._stats = {"total": 0, "fast_path": 0, "fallthrough": 0, "rules": {}}
+
+    def match_rule(self, index: int, text: str, date_window: Optional[Dict[str, Any]]) -> bool:
+        rule = self.rules[index]
+        if rule.get("requires_date") and date_window is None:
+            return False
+        if rule.get("all") and not all(contains_phrase(text, k) for k in rule["all"]):
+            return False
+        if rule.get("any") and not any(contains_phrase(text, k) for k in rule["any"]):
+            return False
+        if self._compiled[index] and not any(p.search(text) for p in self._compiled[index]):
+            return False
+        if rule.get("anchors") and not any(contains_phrase(text, a) for a in rule["anchors"]):
+            return False
+        return bool(rule.get("any") or rule.get("all") or self._compiled[index])
+
+    def build_tool(self, rule: Dict[str, Any], query: str, text: str,
+                   date_window: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        topic = extract_topic(text)
+
+        if rule.get("date_routing") and date_window is not None:
+            if date_window["future"]:
+                parameters = {"start_date": date_window["start_date"], "end_date": date_window["end_date"]}
+                if topic:
+                    parameters["keyword"] = topic
+                return {"name": "DukeFutureEventsSearchTool", "parameters": parameters}
+            parameters = {"days": date_window["days"]}
+            if topic:
+                parameters["topic"] = topic
+            return {"name": "DukeEventsSearchTool", "parameters": parameters}
+
+        values = {"query": query, "topic": topic}
+        parameters = {}
+        for key, value in rule.get("parameters", {}).items():
+            if isinstance(value, str):
+                value = value.format(**values)
+                if not value:
+                    continue
+            parameters[key] = value
+        return {"name": rule["tool"], "parameters": parameters}
+
+    def route(self, query: str) -> Optional[Dict[str, Any]]:
+        """
+        Route a query with the rule table.
+
+        Returns:
+            A plan with "tools", "reasoning", "confidence" and "rule", or None if no rule matched
+        """
+        text = normalize(query)
+        date_window = parse_date_expression(text)
+        word_count = len(text.split())
+
+        matches = []
+        for index, rule in enumerate(self.rules):
+            if not self.match_rule(index, text, date_window):
+                continue
+            confidence = float(rule.get("confidence", 0.5))
+            if rule.get("max_words") and word_count > rule["max_words"]:
+                confidence -= 0.2
+            matches.append((confidence, index))
+
+        if not matches:
+            return None
+
+        matches.sort(reverse=True)
+        confidence, index = matches[0]
+        rule = self.rules[index]
+        tool = self.build_tool(rule, query, text, date_window)
+
+        # Competing rules that point at another tool make the query ambiguous
+        competing = {self.rules[i].get("tool") for _, i in matches[1:]} - {rule.get("tool")}
+        if competing:
+            confidence -= 0.15
+
+        return {
+            "tools": [tool],
+            "reasoning": f"Matched routing rule '{rule['name']}'"
+                         + (f" with date expression '{date_window['expression']}'" if date_window else ""),
+            "confidence": round(max(confidence, 0.0), 3),
+            "rule": rule["name"]
+        }
+
+    def try_route(self, query: str) -> Optional[Dict[str, Any]]:
+        """
+        Route a query and return the plan only if it clears the confidence threshold.
+        """
+        plan = self.route(query)
+        fast_path = plan is not None and plan["confidence"] >= self.threshold
+
+        with self._lock:
+            self._stats["total"] += 1
+            self._stats["fast_path" if fast_path else "fallthrough"] += 1
+            if fast_path:
+                self._stats["rules"][plan["rule"]] = self._stats["rules"].get(plan["rule"], 0) + 1
+
+        return plan if fast_path else None
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get how often the fast path fired in this process.
+        """
+        with self._lock:
+            total = self._stats["total"]
+            return {
+                **self._stats,
+                "rules": dict(self._stats["rules"]),
+                "fast_path_rate": round(self._stats["fast_path"] / total, 3) if total else 0.0,
+                "threshold": self.threshold
+            }
+
+
+def build_rule_router() -> Optional[RuleBasedRouter]:
+    """
+    Build the router from the environment, or None if ROUTER_ENABLED is false.
+
+    ROUTER_RULES_PATH may point at a JSON list of rules that replaces the
+    default table; ROUTER_CONFIDENCE_THRESHOLD sets the fast-path threshold.
+    """
+    if os.environ.get("ROUTER_ENABLED", "true").lower() not in ("1", "true", "yes"):
+        return None
+
+    rules = None
+    rules_path = os.environ.get("ROUTER_RULES_PATH")
+    if rules_path:
+        try:
+            with open(rules_path) as f:
+                rules = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Warning: Could not load router rules from {rules_path}: {str(e)}")
+
+    return RuleBasedRouter(rules, threshold=float(os.environ.get("ROUTER_CONFIDENCE_THRESHOLD", 0.8)))
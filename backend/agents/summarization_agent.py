@@ -0,0 +1,27 @@
+# backend/agents/summarization_agent.py
+from typing import List
+from utils.gemini_client import GeminiClient
+from utils.prompt_templates import CONVERSATION_SUMMARY_PROMPT
+import os
+
+class SummarizationAgent:
+    """
+    Agent responsible for folding older conversation turns into a running summary.
+    """
+    def __init__(self, gemini_client: GeminiClient, max_words: int = 120):
+        self.gemini_client = gemini_client
+        self.max_words = max_words
+        self.model_tier = os.environ.get("SUMMARY_MODEL_TIER", "fast")
+    
+    def summarize(self, summary: str, turns: List[str]) -> str:
+        """
+        Update a running summary with the given formatted turns.
+        """
+        prompt = CONVERSATION_SUMMARY_PROMPT.format(
+            summary=summary or "(none)",
+            turns="\n".join(turns),
+            max_words=self.max_words
+        )
+        
+        # Failures raise GeminiError; the caller keeps the turns for the next attempt
+        return self.gemini_client.generate_text(prompt, tier=self.model_tier).strip()
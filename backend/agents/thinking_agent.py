@@ -1,14 +1,41 @@
 # backend/agents/thinking_agent.py
-from typing import Dict, Any
-from utils.gemini_client import GeminiClient
-from utils.prompt_templates import THINKING_AGENT_PROMPT
+from typing import Dict, Any, Optional
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from utils.gemini_client import GeminiClient, GeminiError
+from utils.prompt_templates import THINKING_AGENT_SYSTEM, THINKING_AGENT_INPUT
+from utils.prompt_context import format_plan, summarize_tool_results
+from utils.tracing import tracer, propagate
+import os
+import threading
+
+# Shown in place of the explanation when it could not be generated
+THINKING_UNAVAILABLE = "I wasn't able to put together an explanation of my reasoning for this answer."
 
 class ThinkingAgent:
     """
     Agent responsible for explaining the thinking process to the user.
     """
-    def __init__(self, gemini_client: GeminiClient):
+    def __init__(self, gemini_client: GeminiClient, mode: Optional[str] = None, max_deferred: int = 2000):
+        """
+        Initialize the thinking agent.
+        
+        Args:
+            gemini_client: Client used to generate the explanation
+            mode: "eager" generates the explanation with every response; "lazy" only keeps its inputs
+                  and generates it when the client asks for it (default: THINKING_MODE or "eager")
+            max_deferred: Number of deferred explanations kept before the oldest are dropped
+        """
         self.gemini_client = gemini_client
+        self.mode = (mode or os.environ.get("THINKING_MODE", "eager")).lower()
+        self.max_deferred = max_deferred
+        self.model_tier = os.environ.get("THINKING_MODEL_TIER", "fast")
+        self.pool = ThreadPoolExecutor(
+            max_workers=int(os.environ.get("THINKING_WORKERS", 8)),
+            thread_name_prefix="thinking"
+        )
+        self._deferred: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._deferred_lock = threading.Lock()
     
     def explain_thinking(self, query: str, planning: Dict[str, Any], tool_results: Dict[str, Any]) -> str:
         """
@@ -19,14 +46,98 @@ class ThinkingAgent:
             return """I analyzed your question and determined it's outside the scope of my knowledge. As a Duke University chatbot, I'm specifically designed to answer questions about Duke University, including its academic programs, campus life, events, facilities, and services. Your question appears to be unrelated to Duke, so I can't provide a helpful response. I'd be happy to answer any Duke-specific questions you might have instead."""
         
         # For Duke-related queries, use the normal thinking explanation
-        prompt = THINKING_AGENT_PROMPT.format(
+        prompt = self.build_prompt(query, planning, tool_results)
+        
+        with tracer.span("thinking") as span:
+            try:
+                explanation = self.gemini_client.generate_text(prompt, system_instruction=THINKING_AGENT_SYSTEM,
+                                                              tier=self.model_tier)
+            except GeminiError as e:
+                # The explanation is secondary to the answer, so never fail the request over it
+                return self.unavailable(span, e)
+        return explanation
+    
+    async def aexplain_thinking(self, query: str, planning: Dict[str, Any], tool_results: Dict[str, Any]) -> str:
+        """
+        Async variant of explain_thinking().
+        """
+        if not planning.get("tools", []):
+            return self.explain_thinking(query, planning, tool_results)
+        
+        prompt = self.build_prompt(query, planning, tool_results)
+        with tracer.span("thinking") as span:
+            try:
+                return await self.gemini_client.agenerate_text(prompt, system_instruction=THINKING_AGENT_SYSTEM,
+                                                               tier=self.model_tier)
+            except GeminiError as e:
+                return self.unavailable(span, e)
+    
+    def build_prompt(self, query: str, planning: Dict[str, Any], tool_results: Dict[str, Any]) -> str:
+        return THINKING_AGENT_INPUT.format(
             query=query,
-            planning=str(planning),
-            tool_results=str(tool_results)
+            planning=format_plan(planning),
+            tool_results=summarize_tool_results(tool_results, query, consumer="thinking")
         )
+    
+    def unavailable(self, span: Any, error: GeminiError) -> str:
+        print(f"Warning: Could not generate thinking explanation: {str(error)}")
+        if span is not None:
+            span.set("unavailable", True)
+        return THINKING_UNAVAILABLE
+    
+    def explain_async(self, query: str, planning: Dict[str, Any], tool_results: Dict[str, Any]) -> Future:
+        """
+        Start generating the explanation in the thinking pool, so it can overlap response generation.
+        """
+        return self.pool.submit(propagate(self.explain_thinking), query, planning, tool_results)
+    
+    def defer(self, message_id: str, query: str, planning: Dict[str, Any], tool_results: Dict[str, Any]) -> None:
+        """
+        Keep the inputs for an explanation so it can be generated on request.
+        """
+        with self._deferred_lock:
+            self._deferred[message_id] = {
+                "query": query,
+                "planning": planning,
+                "tool_results": tool_results,
+                "explanation": None
+            }
+            while len(self._deferred) > self.max_deferred:
+                self._deferred.popitem(last=False)
+    
+    def get_deferred(self, message_id: str) -> Optional[str]:
+        """
+        Generate (or return the already generated) explanation for a deferred message.
         
-        explanation = self.gemini_client.generate_text(prompt)
-        return explanation
+        Returns:
+            The explanation, or None if the message is unknown or has been evicted
+        """
+        with self._deferred_lock:
+            entry = self._deferred.get(message_id)
+        if entry is None:
+            return None
+        if entry["explanation"] is None:
+            explanation = self.explain_thinking(entry["query"], entry["planning"], entry["tool_results"])
+            if explanation == THINKING_UNAVAILABLE:
+                # Let a later request try again
+                return explanation
+            entry["explanation"] = explanation
+        return entry["explanation"]
+    
+    async def aget_deferred(self, message_id: str) -> Optional[str]:
+        """
+        Async variant of get_deferred().
+        """
+        with self._deferred_lock:
+            entry = self._deferred.get(message_id)
+        if entry is None:
+            return None
+        if entry["explanation"] is None:
+            explanation = await self.aexplain_thinking(entry["query"], entry["planning"], entry["tool_results"])
+            if explanation == THINKING_UNAVAILABLE:
+                return explanation
+            entry["explanation"] = explanation
+        return entry["explanation"]
     
     def __call__(self, state: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -1,10 +1,25 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
 import os
+import copy
+import json
 import time
+import uuid
+from contextlib import ExitStack, nullcontext
 from dotenv import load_dotenv
-from graph.agent_workflow import create_agent_workflow
-from utils.gemini_client import GeminiClient
+from graph.agent_workflow import create_agents, create_agent_workflow
+from graph.streaming import stream_agent_workflow
+from graph.state_management import conversation_state
+from agents.summarization_agent import SummarizationAgent
+from agents.rule_router import build_rule_router
+from tools.registry import build_default_registry
+from utils.tool_cache import build_tool_cache
+from utils.semantic_cache import build_semantic_cache, normalize_query
+from utils.gemini_client import GeminiClient, GeminiError, GeminiRateLimitError
+from utils.evaluation_store import evaluation_store
+from utils.tracing import tracer
+from utils.single_flight import SingleFlight
+from utils.admission import AdmissionRejected, build_admission_controller, client_ip
 
 # Load environment variables
 load_dotenv()
@@ -16,8 +31,223 @@ CORS(app)
 # Initialize Gemini client
 gemini_client = GeminiClient(api_key=os.environ.get("GEMINI_API_KEY"))
 
+# Build the shared tool registry once at startup
+tool_registry = build_default_registry()
+
+# Shared cache for tool results (None when TOOL_CACHE_BACKEND=none)
+tool_cache = build_tool_cache()
+
+# Deterministic pre-router for obvious queries (None when ROUTER_ENABLED=false)
+query_router = build_rule_router()
+
+# Initialize the workflow nodes once; the graph and the streaming endpoint share them
+agents = create_agents(gemini_client, tool_registry, tool_cache, query_router)
+
 # Initialize the agent workflow
-agent_graph = create_agent_workflow(gemini_client)
+agent_graph = create_agent_workflow(gemini_client, agents=agents)
+
+# Fold older conversation turns into a running summary in the background
+conversation_state.set_summarizer(SummarizationAgent(gemini_client).summarize)
+
+# Front cache of complete answers for repeat questions (None when disabled)
+answer_cache = build_semantic_cache()
+
+# Answers that depend on event listings go stale quickly
+EVENT_TOOLS = {"DukeEventsSearchTool", "DukeFutureEventsSearchTool"}
+EVENT_ANSWER_TTL = float(os.environ.get("SEMANTIC_CACHE_EVENTS_TTL", 300))
+
+# Identical context-free messages arriving together share one workflow run (None when disabled)
+chat_flights = SingleFlight() if os.environ.get("CHAT_COALESCING_ENABLED", "true").lower() == "true" else None
+
+# Bounded workflow slots and wait queue, and per-client rate limits (None when ADMISSION_ENABLED=false).
+# Requests beyond the slots and queue get a fast 503, so gunicorn needs more threads than slots plus queue.
+admission = build_admission_controller(default_max_in_flight=8)
+
+# Include the per-stage "timings" breakdown in every response (requests can also ask with "timings": true)
+TRACING_TIMINGS = os.environ.get("TRACING_TIMINGS", "false").lower() == "true"
+
+def store_conversation_turn(conversation_id, user_message, result):
+    """Store the user message and assistant response in the conversation history."""
+    try:
+        if conversation_id:
+            from graph.state_management import conversation_state
+            # Store user message
+            conversation_state.add_message(
+                conversation_id=conversation_id,
+                role="user",
+                content=user_message
+            )
+            # A background evaluation may already have finished before the turn is stored
+            evaluation = result.get("evaluation")
+            if evaluation is None and result.get("message_id"):
+                entry = evaluation_store.get(result["message_id"])
+                evaluation = entry.get("evaluation") if entry else None
+            # Store assistant response
+            conversation_state.add_message(
+                conversation_id=conversation_id,
+                role="assistant",
+                content=result.get("response", ""),
+                thinking=result.get("thinking_explanation"),
+                tool_results=result.get("tool_results"),
+                evaluation=evaluation,
+                message_id=result.get("message_id")
+            )
+    except Exception as e:
+        print(f"Warning: Could not store conversation: {str(e)}")
+
+def load_conversation_context(conversation_id):
+    """Get the recent context for a conversation and whether it has any history."""
+    if not conversation_id:
+        return "", False
+    try:
+        from graph.state_management import conversation_state
+        has_history = bool(conversation_state.get_conversation_history(conversation_id))
+        return conversation_state.get_recent_context(conversation_id), has_history
+    except (ImportError, AttributeError) as e:
+        print(f"Warning: Could not load conversation context: {str(e)}")
+        # Continue without context if there's an error
+        return "", False
+
+def build_initial_state(user_message, conversation_id, conversation_context, degraded=False):
+    """Build the initial workflow state for a message."""
+    # Initialize the state with basic information
+    initial_state = {
+        "message": user_message,
+        "conversation_id": conversation_id,
+        "message_id": uuid.uuid4().hex,
+    }
+    
+    # Add context if available
+    if conversation_context:
+        initial_state["context"] = conversation_context
+    
+    # Admitted under load: skip the thinking explanation and the evaluation
+    if degraded:
+        initial_state["degraded"] = True
+    return initial_state
+
+def lookup_cached_answer(user_message, start_time):
+    """Build a chat result from the answer cache, or return None on a miss."""
+    with tracer.span("answer_cache.lookup") as span:
+        cached = answer_cache.lookup(user_message)
+        if span is not None:
+            span.set("cache_hit", cached is not None)
+    if cached is None:
+        return None
+    return {
+        "message": user_message,
+        "message_id": uuid.uuid4().hex,
+        "response": cached.get("response", ""),
+        "thinking_explanation": cached.get("thinking_explanation"),
+        "evaluation": cached.get("evaluation"),
+        "plan": cached.get("plan"),
+        "cache": {
+            "hit": True,
+            "similarity": cached.get("similarity"),
+            "cached_query": cached.get("cached_query")
+        },
+        "processing_time": int((time.time() - start_time) * 1000)
+    }
+
+def cacheable(result):
+    """
+    Whether an answer may be served to later askers: every tool call succeeded
+    with fresh data and the full pipeline ran (not degraded).
+    """
+    if not result.get("response") or result.get("degraded"):
+        return False
+    return all(isinstance(tool_result, dict) and tool_result.get("status") == "success"
+               and not tool_result.get("stale")
+               for tool_result in (result.get("tool_results") or {}).values())
+
+def cache_answer(user_message, result):
+    """Store a completed answer in the answer cache, unless it is degraded or incomplete."""
+    if not cacheable(result):
+        return
+    tools_used = {tool.get("name") for tool in result.get("plan", {}).get("tools", [])}
+    answer_cache.store(
+        user_message,
+        {
+            "response": result.get("response"),
+            "thinking_explanation": result.get("thinking_explanation"),
+            "evaluation": result.get("evaluation"),
+            "plan": result.get("plan")
+        },
+        ttl=EVENT_ANSWER_TTL if tools_used & EVENT_TOOLS else None
+    )
+
+def rate_limited_body(error):
+    """The error body returned when Gemini is rate limiting us."""
+    return {
+        "error": "The assistant is busy, please try again shortly",
+        "retry_after": error.retry_after
+    }
+
+def retry_after_header(seconds):
+    """Format a Retry-After header value (whole seconds, rounded up)."""
+    return str(int(seconds + 0.999))
+
+def check_rate_limits(conversation_id, ip):
+    """Apply the per-conversation and per-IP rate limits; raises AdmissionRejected."""
+    if admission is not None:
+        admission.check_rate(conversation_id, ip)
+
+def admission_slot():
+    """Context manager holding a workflow slot; yields whether to run in degraded mode."""
+    return admission.admit() if admission is not None else nullcontext(False)
+
+def rejected_body(error):
+    """The error body returned when a request is shed or rate limited."""
+    return {"error": str(error), "reason": error.reason, "retry_after": error.retry_after}
+
+def rejected_response(error):
+    print(f"Warning: Request rejected ({error.reason})")
+    response = jsonify(rejected_body(error))
+    response.headers["Retry-After"] = retry_after_header(error.retry_after)
+    return response, error.status
+
+def run_workflow(initial_state, coalesce):
+    """
+    Run the agent workflow for a message, sharing the run of an identical
+    message already in flight when coalesce is set.
+    """
+    if not coalesce or chat_flights is None:
+        return agent_graph.invoke(initial_state)
+    with tracer.span("single_flight") as span:
+        result, shared = chat_flights.do(normalize_query(initial_state["message"]),
+                                         lambda: agent_graph.invoke(initial_state))
+        if span is not None:
+            span.set("coalesced", shared)
+    return coalesced_result(result, shared, initial_state)
+
+def coalesced_result(result, shared, initial_state):
+    """
+    Give each caller of a shared run its own copy of the result, carrying the
+    caller's own conversation, message ID, context and degraded flag. A waiter's
+    deferred thinking and pending evaluation are registered under its message ID.
+    """
+    result = copy.deepcopy(result)
+    if not shared:
+        return result
+    leader_message_id = result.get("message_id")
+    result["coalesced"] = True
+    result["conversation_id"] = initial_state.get("conversation_id")
+    result["message_id"] = initial_state["message_id"]
+    for field in ("context", "degraded"):
+        if field in initial_state:
+            result[field] = initial_state[field]
+        else:
+            result.pop(field, None)
+    if result.get("thinking_status") == "deferred":
+        agents["thinking"].defer(result["message_id"], result.get("message", ""),
+                                 result.get("plan", {}), result.get("tool_results", {}))
+    if result.get("evaluation_status") == "pending" and leader_message_id:
+        evaluation_store.follow(result["message_id"], leader_message_id, result["conversation_id"])
+    return result
+
+def wants_timings(data):
+    """Whether a request's response should include the "timings" breakdown."""
+    return TRACING_TIMINGS or data.get('timings') is True
 
 # Modify the chat endpoint in app.py
 @app.route('/api/chat', methods=['POST'])
@@ -30,56 +260,65 @@ def chat():
     if not user_message:
         return jsonify({"error": "No message provided"}), 400
     
+    try:
+        check_rate_limits(conversation_id, client_ip(request.headers, request.remote_addr))
+    except AdmissionRejected as e:
+        return rejected_response(e)
+    
+    with tracer.start_trace("chat") as trace:
+        return handle_chat(data, user_message, conversation_id, start_time, trace)
+
+def handle_chat(data, user_message, conversation_id, start_time, trace):
+    """Answer a chat message inside the request's trace."""
     # Get conversation context if available
-    conversation_context = ""
-    if conversation_id:
-        try:
-            from graph.state_management import conversation_state
-            conversation_context = conversation_state.get_recent_context(conversation_id)
-        except (ImportError, AttributeError) as e:
-            print(f"Warning: Could not load conversation context: {str(e)}")
-            # Continue without context if there's an error
+    with tracer.span("load_context"):
+        conversation_context, has_history = load_conversation_context(conversation_id)
+    
+    # Context-dependent queries always go through the full pipeline
+    use_answer_cache = answer_cache is not None and not has_history
+    
+    if use_answer_cache:
+        result = lookup_cached_answer(user_message, start_time)
+        if result is not None:
+            store_conversation_turn(conversation_id, user_message, result)
+            if wants_timings(data):
+                result["timings"] = tracer.timings(trace)
+            return jsonify(result)
     
     # Process the message through the agent workflow
     try:
-        # Initialize the state with basic information
-        initial_state = {
-            "message": user_message,
-            "conversation_id": conversation_id,
-        }
-        
-        # Add context if available
-        if conversation_context:
-            initial_state["context"] = conversation_context
-        
-        result = agent_graph.invoke(initial_state)
+        with admission_slot() as degraded:
+            initial_state = build_initial_state(user_message, conversation_id, conversation_context, degraded)
+            
+            # Only messages without conversation context give the same answer to everyone
+            result = run_workflow(initial_state, coalesce=not has_history)
         
         # Add processing time
         result["processing_time"] = int((time.time() - start_time) * 1000)
         
         # Store the message in conversation history if we have conversation state
-        try:
-            if conversation_id:
-                from graph.state_management import conversation_state
-                # Store user message
-                conversation_state.add_message(
-                    conversation_id=conversation_id,
-                    role="user",
-                    content=user_message
-                )
-                # Store assistant response
-                conversation_state.add_message(
-                    conversation_id=conversation_id,
-                    role="assistant",
-                    content=result.get("response", ""),
-                    thinking=result.get("thinking_explanation"),
-                    tool_results=result.get("tool_results"),
-                    evaluation=result.get("evaluation")
-                )
-        except Exception as e:
-            print(f"Warning: Could not store conversation: {str(e)}")
+        with tracer.span("store_turn"):
+            store_conversation_turn(conversation_id, user_message, result)
+        
+        if use_answer_cache:
+            cache_answer(user_message, result)
         
+        if wants_timings(data):
+            result["timings"] = tracer.timings(trace)
         return jsonify(result)
+    except AdmissionRejected as e:
+        return rejected_response(e)
+    except GeminiRateLimitError as e:
+        print(f"Warning: Gemini rate limited: {str(e)}")
+        response = jsonify(rate_limited_body(e))
+        response.headers["Retry-After"] = retry_after_header(e.retry_after)
+        return response, 503
+    except GeminiError as e:
+        print(f"Error generating response: {str(e)}")
+        return jsonify({
+            "error": "Failed to generate a response",
+            "details": str(e)
+        }), 502
     except Exception as e:
         print(f"Error processing message: {str(e)}")
         return jsonify({
@@ -87,9 +326,154 @@ def chat():
             "details": str(e)
         }), 500
 
+def format_sse(event, data):
+    """Format a Server-Sent Events message."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    """
+    Streaming variant of /api/chat using Server-Sent Events.
+    
+    Emits "planning" and "tools" stage events, "token" events as the answer is
+    generated, then "response", "thinking" and "evaluation", and finally "done"
+    with the complete result (the same body /api/chat returns).
+    """
+    start_time = time.time()
+    data = request.json or {}
+    user_message = data.get('message', '')
+    conversation_id = data.get('conversationId', None)
+    
+    if not user_message:
+        return jsonify({"error": "No message provided"}), 400
+    
+    try:
+        check_rate_limits(conversation_id, client_ip(request.headers, request.remote_addr))
+    except AdmissionRejected as e:
+        return rejected_response(e)
+    
+    conversation_context, has_history = load_conversation_context(conversation_id)
+    use_answer_cache = answer_cache is not None and not has_history
+    
+    def generate():
+        with tracer.start_trace("chat_stream") as trace:
+            yield from stream_chat(trace)
+    
+    def stream_chat(trace):
+        if use_answer_cache:
+            result = lookup_cached_answer(user_message, start_time)
+            if result is not None:
+                store_conversation_turn(conversation_id, user_message, result)
+                if wants_timings(data):
+                    result["timings"] = tracer.timings(trace)
+                yield format_sse("token", {"text": result["response"]})
+                yield format_sse("done", result)
+                return
+        
+        try:
+            initial_state = build_initial_state(user_message, conversation_id, conversation_context, degraded)
+            result = None
+            for event, payload in stream_agent_workflow(agents, initial_state):
+                if event == "final":
+                    result = payload
+                    continue
+                yield format_sse(event, payload)
+            
+            result["processing_time"] = int((time.time() - start_time) * 1000)
+            with tracer.span("store_turn"):
+                store_conversation_turn(conversation_id, user_message, result)
+            if use_answer_cache:
+                cache_answer(user_message, result)
+            if wants_timings(data):
+                result["timings"] = tracer.timings(trace)
+            yield format_sse("done", result)
+        except GeminiRateLimitError as e:
+            print(f"Warning: Gemini rate limited: {str(e)}")
+            yield format_sse("error", rate_limited_body(e))
+        except Exception as e:
+            print(f"Error streaming message: {str(e)}")
+            yield format_sse("error", {
+                "error": "Failed to process message",
+                "details": str(e)
+            })
+    
+    # The slot is held until the stream is closed, and released if the response cannot be built
+    slot = ExitStack()
+    try:
+        degraded = slot.enter_context(admission_slot())
+        response = Response(
+            stream_with_context(generate()),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+        response.call_on_close(slot.close)
+    except AdmissionRejected as e:
+        return rejected_response(e)
+    except BaseException:
+        slot.close()
+        raise
+    return response
+
+@app.route('/api/evaluation/<message_id>', methods=['GET'])
+def get_evaluation(message_id):
+    """Fetch the evaluation of a response that was evaluated in the background."""
+    entry = evaluation_store.get(message_id)
+    if entry is None:
+        return jsonify({"message_id": message_id, "status": "not_found"}), 404
+    return jsonify({
+        "message_id": message_id,
+        "status": entry["status"],
+        "evaluation": entry.get("evaluation")
+    })
+
+@app.route('/api/thinking/<message_id>', methods=['GET'])
+def get_thinking(message_id):
+    """Generate (on first request) the thinking explanation of a response in lazy thinking mode."""
+    try:
+        explanation = agents["thinking"].get_deferred(message_id)
+    except Exception as e:
+        print(f"Error generating thinking explanation: {str(e)}")
+        return jsonify({"error": "Failed to generate thinking explanation", "details": str(e)}), 500
+    if explanation is None:
+        return jsonify({"message_id": message_id, "status": "not_found"}), 404
+    return jsonify({"message_id": message_id, "status": "complete", "thinking_explanation": explanation})
+
+@app.route('/api/conversations/<conversation_id>/messages/<message_id>/tool_results', methods=['GET'])
+def get_tool_results(conversation_id, message_id):
+    """Fetch the full tool results stored for an assistant message."""
+    tool_results = conversation_state.get_tool_results(conversation_id, message_id)
+    if tool_results is None:
+        return jsonify({"message_id": message_id, "status": "not_found"}), 404
+    return jsonify({"message_id": message_id, "tool_results": tool_results})
+
+def health_status():
+    """Collect the health and cache/limiter statistics reported by /api/health."""
+    health = {"status": "healthy"}
+    if tool_cache is not None:
+        health["tool_cache"] = tool_cache.stats()
+    if answer_cache is not None:
+        health["answer_cache"] = answer_cache.stats()
+    if query_router is not None:
+        health["router"] = query_router.stats()
+    health["coalescing"] = {
+        "chat": chat_flights.stats() if chat_flights is not None else {"enabled": False},
+        "tools": agents["execute_tools"].stats()
+    }
+    if admission is not None:
+        health["admission"] = admission.stats()
+    health["circuit_breakers"] = agents["execute_tools"].breaker_stats()
+    health["evaluations"] = evaluation_store.stats()
+    health["gemini"] = gemini_client.stats()
+    try:
+        from graph.state_management import conversation_state
+        health["conversations"] = conversation_state.stats()
+    except Exception as e:
+        print(f"Warning: Could not read conversation store stats: {str(e)}")
+    return health
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    return jsonify({"status": "healthy"})
+    return jsonify(health_status())
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 8080))
@@ -0,0 +1,329 @@
+# backend/async_app.py
+"""
+Async serving path for the chat API.
+
+Serves the same endpoints as app.py, sharing its agents, caches and
+conversation store, but runs each request as a coroutine: the workflow runs
+with agent_graph.ainvoke, tools through their async _arun and Gemini through
+the async GeminiClient methods, so a waiting request holds no thread. Run with
+
+    gunicorn async_app:app --bind :8080 --worker-class aiohttp.GunicornWebWorker
+
+or `python async_app.py` for a single local process. app.py keeps working as
+the sync entry point.
+"""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from aiohttp import web
+from graph.streaming import astream_agent_workflow
+from graph.state_management import conversation_state
+from utils.gemini_client import GeminiError, GeminiRateLimitError
+from utils.evaluation_store import evaluation_store
+from utils.http_client import get_async_http_client
+from utils.tracing import tracer, run_in_pool
+from utils.single_flight import AsyncSingleFlight
+from utils.semantic_cache import normalize_query
+from utils.admission import AdmissionRejected, build_admission_controller
+from app import (
+    agents, agent_graph, answer_cache,
+    store_conversation_turn, load_conversation_context, build_initial_state,
+    lookup_cached_answer, cache_answer, wants_timings, format_sse,
+    rate_limited_body, retry_after_header, health_status, chat_flights, coalesced_result,
+    client_ip, rejected_body
+)
+
+# Async counterpart of app.chat_flights, enabled by the same setting
+async_chat_flights = AsyncSingleFlight() if chat_flights is not None else None
+
+# A waiting request costs no thread here, so the slots are sized for the event loop
+async_admission = build_admission_controller(default_max_in_flight=256)
+
+# The conversation store, answer cache and tool cache may hit SQLite or disk, so they are
+# called from these threads rather than on the event loop
+store_pool = ThreadPoolExecutor(max_workers=int(os.environ.get("ASYNC_STORE_WORKERS", 16)),
+                                thread_name_prefix="store")
+
+CORS_HEADERS = {
+    "Access-Control-Allow-Origin": "*",
+    "Access-Control-Allow-Headers": "Content-Type",
+    "Access-Control-Allow-Methods": "GET, POST, OPTIONS"
+}
+
+@web.middleware
+async def cors_middleware(request, handler):
+    """Allow cross-origin requests from the frontend, as flask_cors does for app.py."""
+    if request.method == "OPTIONS":
+        response = web.Response()
+    else:
+        response = await handler(request)
+    if not response.prepared:
+        response.headers.update(CORS_HEADERS)
+    return response
+
+async def read_json(request):
+    """Parse the request body, treating a missing or invalid body as empty."""
+    try:
+        data = await request.json()
+    except ValueError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+def check_rate_limits(conversation_id, ip):
+    """Apply the per-conversation and per-IP rate limits; raises AdmissionRejected."""
+    if async_admission is not None:
+        async_admission.check_rate(conversation_id, ip)
+
+@asynccontextmanager
+async def admission_slot():
+    """Hold a workflow slot; yields whether to run in degraded mode."""
+    if async_admission is None:
+        yield False
+        return
+    async with async_admission.aadmit() as degraded:
+        yield degraded
+
+def rejected_response(error):
+    print(f"Warning: Request rejected ({error.reason})")
+    return web.json_response(rejected_body(error), status=error.status,
+                             headers={"Retry-After": retry_after_header(error.retry_after)})
+
+async def run_workflow(initial_state, coalesce):
+    """
+    Async variant of app.run_workflow(). A caller that goes away stops
+    waiting without cancelling the run for the others sharing it.
+    """
+    if not coalesce or async_chat_flights is None:
+        return await agent_graph.ainvoke(initial_state)
+    with tracer.span("single_flight") as span:
+        result, shared = await async_chat_flights.do(normalize_query(initial_state["message"]),
+                                                     lambda: agent_graph.ainvoke(initial_state))
+        if span is not None:
+            span.set("coalesced", shared)
+    return coalesced_result(result, shared, initial_state)
+
+async def chat(request):
+    start_time = time.time()
+    data = await read_json(request)
+    user_message = data.get('message', '')
+    conversation_id = data.get('conversationId', None)
+
+    if not user_message:
+        return web.json_response({"error": "No message provided"}, status=400)
+
+    try:
+        check_rate_limits(conversation_id, client_ip(request.headers, request.remote))
+    except AdmissionRejected as e:
+        return rejected_response(e)
+
+    with tracer.start_trace("chat") as trace:
+        return await handle_chat(data, user_message, conversation_id, start_time, trace)
+
+async def handle_chat(data, user_message, conversation_id, start_time, trace):
+    """Answer a chat message inside the request's trace."""
+    with tracer.span("load_context"):
+        conversation_context, has_history = await run_in_pool(store_pool, load_conversation_context, conversation_id)
+
+    # Context-dependent queries always go through the full pipeline
+    use_answer_cache = answer_cache is not None and not has_history
+
+    if use_answer_cache:
+        result = await run_in_pool(store_pool, lookup_cached_answer, user_message, start_time)
+        if result is not None:
+            await run_in_pool(store_pool, store_conversation_turn, conversation_id, user_message, result)
+            if wants_timings(data):
+                result["timings"] = tracer.timings(trace)
+            return web.json_response(result)
+
+    try:
+        async with admission_slot() as degraded:
+            initial_state = build_initial_state(user_message, conversation_id, conversation_context, degraded)
+
+            result = await run_workflow(initial_state, coalesce=not has_history)
+
+        result["processing_time"] = int((time.time() - start_time) * 1000)
+
+        with tracer.span("store_turn"):
+            await run_in_pool(store_pool, store_conversation_turn, conversation_id, user_message, result)
+
+        if use_answer_cache:
+            await run_in_pool(store_pool, cache_answer, user_message, result)
+
+        if wants_timings(data):
+            result["timings"] = tracer.timings(trace)
+        return web.json_response(result)
+    except AdmissionRejected as e:
+        return rejected_response(e)
+    except GeminiRateLimitError as e:
+        print(f"Warning: Gemini rate limited: {str(e)}")
+        return web.json_response(rate_limited_body(e), status=503,
+                                 headers={"Retry-After": retry_after_header(e.retry_after)})
+    except GeminiError as e:
+        print(f"Error generating response: {str(e)}")
+        return web.json_response({
+            "error": "Failed to generate a response",
+            "details": str(e)
+        }, status=502)
+    except Exception as e:
+        print(f"Error processing message: {str(e)}")
+        return web.json_response({
+            "error": "Failed to process message",
+            "details": str(e)
+        }, status=500)
+
+async def chat_stream(request):
+    """
+    Streaming variant of /api/chat using Server-Sent Events, with the same
+    events as app.py's /api/chat/stream.
+    """
+    start_time = time.time()
+    data = await read_json(request)
+    user_message = data.get('message', '')
+    conversation_id = data.get('conversationId', None)
+
+    if not user_message:
+        return web.json_response({"error": "No message provided"}, status=400)
+
+    try:
+        check_rate_limits(conversation_id, client_ip(request.headers, request.remote))
+        async with admission_slot() as degraded:
+            return await stream_chat(request, data, user_message, conversation_id, start_time, degraded)
+    except AdmissionRejected as e:
+        return rejected_response(e)
+
+async def stream_chat(request, data, user_message, conversation_id, start_time, degraded):
+    """Stream the answer to a chat message, holding the request's workflow slot."""
+    response = web.StreamResponse(headers={
+        "Content-Type": "text/event-stream",
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+        **CORS_HEADERS
+    })
+    await response.prepare(request)
+
+    async def send(event, payload):
+        await response.write(format_sse(event, payload).encode("utf-8"))
+
+    with tracer.start_trace("chat_stream") as trace:
+        # The stream has started, so failures from here on are reported as "error" events
+        events = None
+        try:
+            conversation_context, has_history = await run_in_pool(store_pool, load_conversation_context,
+                                                                  conversation_id)
+            use_answer_cache = answer_cache is not None and not has_history
+
+            if use_answer_cache:
+                result = await run_in_pool(store_pool, lookup_cached_answer, user_message, start_time)
+                if result is not None:
+                    await run_in_pool(store_pool, store_conversation_turn, conversation_id, user_message, result)
+                    if wants_timings(data):
+                        result["timings"] = tracer.timings(trace)
+                    await send("token", {"text": result["response"]})
+                    await send("done", result)
+                    await response.write_eof()
+                    return response
+
+            initial_state = build_initial_state(user_message, conversation_id, conversation_context, degraded)
+            result = None
+            events = astream_agent_workflow(agents, initial_state)
+            async for event, payload in events:
+                if event == "final":
+                    result = payload
+                    continue
+                await send(event, payload)
+
+            result["processing_time"] = int((time.time() - start_time) * 1000)
+            with tracer.span("store_turn"):
+                await run_in_pool(store_pool, store_conversation_turn, conversation_id, user_message, result)
+            if use_answer_cache:
+                await run_in_pool(store_pool, cache_answer, user_message, result)
+            if wants_timings(data):
+                result["timings"] = tracer.timings(trace)
+            await send("done", result)
+        except ConnectionResetError:
+            # The client went away; there is nobody left to send an error to
+            print("Warning: Client disconnected during stream")
+            return response
+        except GeminiRateLimitError as e:
+            print(f"Warning: Gemini rate limited: {str(e)}")
+            await send("error", rate_limited_body(e))
+        except Exception as e:
+            print(f"Error streaming message: {str(e)}")
+            await send("error", {
+                "error": "Failed to process message",
+                "details": str(e)
+            })
+        finally:
+            if events is not None:
+                await events.aclose()
+    await response.write_eof()
+    return response
+
+async def get_evaluation(request):
+    """Fetch the evaluation of a response that was evaluated in the background."""
+    message_id = request.match_info["message_id"]
+    entry = evaluation_store.get(message_id)
+    if entry is None:
+        return web.json_response({"message_id": message_id, "status": "not_found"}, status=404)
+    return web.json_response({
+        "message_id": message_id,
+        "status": entry["status"],
+        "evaluation": entry.get("evaluation")
+    })
+
+async def get_thinking(request):
+    """Generate (on first request) the thinking explanation of a response in lazy thinking mode."""
+    message_id = request.match_info["message_id"]
+    try:
+        explanation = await agents["thinking"].aget_deferred(message_id)
+    except Exception as e:
+        print(f"Error generating thinking explanation: {str(e)}")
+        return web.json_response({"error": "Failed to generate thinking explanation", "details": str(e)}, status=500)
+    if explanation is None:
+        return web.json_response({"message_id": message_id, "status": "not_found"}, status=404)
+    return web.json_response({"message_id": message_id, "status": "complete", "thinking_explanation": explanation})
+
+async def get_tool_results(request):
+    """Fetch the full tool results stored for an assistant message."""
+    conversation_id = request.match_info["conversation_id"]
+    message_id = request.match_info["message_id"]
+    tool_results = await run_in_pool(store_pool, conversation_state.get_tool_results, conversation_id, message_id)
+    if tool_results is None:
+        return web.json_response({"message_id": message_id, "status": "not_found"}, status=404)
+    return web.json_response({"message_id": message_id, "tool_results": tool_results})
+
+async def health_check(request):
+    health = await run_in_pool(store_pool, health_status)
+    if async_admission is not None:
+        health["admission"] = async_admission.stats()
+    if async_chat_flights is not None:
+        health["coalescing"]["chat_async"] = async_chat_flights.stats()
+    return web.json_response(health)
+
+async def close_http_client(app):
+    await get_async_http_client().close()
+
+async def shutdown_store_pool(app):
+    # Let conversation turns and cache writes already queued finish
+    store_pool.shutdown(wait=True)
+
+def create_app():
+    """Build the aiohttp application."""
+    application = web.Application(middlewares=[cors_middleware])
+    application.router.add_post('/api/chat', chat)
+    application.router.add_post('/api/chat/stream', chat_stream)
+    application.router.add_get('/api/evaluation/{message_id}', get_evaluation)
+    application.router.add_get('/api/thinking/{message_id}', get_thinking)
+    application.router.add_get('/api/conversations/{conversation_id}/messages/{message_id}/tool_results',
+                               get_tool_results)
+    application.router.add_get('/api/health', health_check)
+    application.on_cleanup.append(close_http_client)
+    application.on_cleanup.append(shutdown_store_pool)
+    return application
+
+app = create_app()
+
+if __name__ == '__main__':
+    port = int(os.environ.get('PORT', 8080))
+    web.run_app(app, host='0.0.0.0', port=port)
@@ -0,0 +1,63 @@
+# backend/benchmarks/compare.py
+"""
+Compare two load test results, e.g. before and after a change:
+    python -m benchmarks.compare benchmarks/results/<baseline>.json benchmarks/results/<candidate>.json
+"""
+import sys
+import json
+import argparse
+from typing import Dict, Any, List, Optional
+
+
+def change(before: Optional[float], after: Optional[float]) -> str:
+    if before is None or after is None:
+        return "n/a"
+    if not before:
+        return f"{after - before:+.1f}"
+    return f"{(after - before) / before * 100:+.1f}%"
+
+
+def latency_rows(baseline: Dict[str, Any], candidate: Dict[str, Any]) -> List[tuple]:
+    before = baseline["summary"]["latency_ms"]
+    after = candidate["summary"]["latency_ms"]
+    rows = [("end_to_end", before["end_to_end"], after["end_to_end"]), ("server", before["server"], after["server"])]
+    for stage in sorted(set(before["stages"]) | set(after["stages"])):
+        rows.append((stage, before["stages"].get(stage, {}), after["stages"].get(stage, {})))
+    return rows
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Compare two load test result files")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    args = parser.parse_args(argv)
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    print(f"baseline:  {baseline['git'].get('commit')} ({baseline['run_id']})")
+    print(f"candidate: {candidate['git'].get('commit')} ({candidate['run_id']})")
+    if baseline["config"] != candidate["config"]:
+        print("Warning: the runs used different configurations", file=sys.stderr)
+
+    before, after = baseline["summary"], candidate["summary"]
+    print(f"\nthroughput  {before['throughput_rps']:>8.2f} -> {after['throughput_rps']:>8.2f} req/s "
+          f"({change(before['throughput_rps'], after['throughput_rps'])})")
+    print(f"errors      {sum(before['errors'].values()):>8} -> {sum(after['errors'].values()):>8}")
+    print(f"rss growth  {baseline['memory']['growth_mb']:>8.1f} -> {candidate['memory']['growth_mb']:>8.1f} MB")
+
+    print(f"\n{'stage':<32}" + "".join(f"{f'p{p} before':>12}{f'p{p} after':>12}{'change':>9}" for p in (50, 95, 99)))
+    for name, old, new in latency_rows(baseline, candidate):
+        cells = ""
+        for p in (50, 95, 99):
+            key = f"p{p}"
+            old_value, new_value = old.get(key), new.get(key)
+            cells += f"{old_value if old_value is not None else '-':>12}{new_value if new_value is not None else '-':>12}"
+            cells += f"{change(old_value, new_value):>9}"
+        print(f"{name:<32}{cells}")
+
+
+if __name__ == "__main__":
+    main()
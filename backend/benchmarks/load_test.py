@@ -0,0 +1,378 @@
+# backend/benchmarks/load_test.py
+"""
+Offline load test of the chat backend.
+
+Runs the real Flask app and agent workflow in-process against stubbed Duke,
+Google PSE and Gemini APIs (see stubs.py), drives concurrent /api/chat
+traffic from a replayable query corpus, and reports throughput, end-to-end
+and per-stage latency percentiles, and memory growth. Results are written as
+JSON so runs on different commits can be compared with compare.py.
+
+Run from the backend directory:
+    python -m benchmarks.load_test --requests 300 --concurrency 16
+    python -m benchmarks.load_test --stub gemini=1200:0.6:0.02 --env PLANNING_MODE=two_call
+    python -m benchmarks.load_test --server async --concurrency 200
+"""
+import os
+import gc
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import resource
+import threading
+import subprocess
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Callable, List, Optional, Tuple
+
+import numpy as np
+import requests
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+from benchmarks.stubs import StubBackend, StubServer, LatencyProfile, DEFAULT_PROFILES
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CORPUS = os.path.join(BENCHMARK_DIR, "corpus.jsonl")
+RESULTS_DIR = os.path.join(BENCHMARK_DIR, "results")
+
+# App settings for a benchmark run, applied unless overridden with --env. The stubs
+# have no quota, so the Gemini limiter is opened up; lower GEMINI_RPM to measure it.
+BENCHMARK_ENV_DEFAULTS = {
+    "GEMINI_API_KEY": "benchmark",
+    "GOOGLE_API_KEY": "benchmark",
+    "GEMINI_RPM": "100000",
+    "GEMINI_TPM": "1000000000",
+    "METRICS_SINK": os.devnull,
+    # Every benchmark request comes from one IP, so only the overall admission limits apply
+    "ADMISSION_IP_RPM": "0",
+    "ADMISSION_CONVERSATION_RPM": "0",
+    "TRACING_TIMINGS": "true"
+}
+
+PERCENTILES = (50, 95, 99)
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    """Werkzeug handler without the per-request access log."""
+    def log_request(self, *args: Any, **kwargs: Any) -> None:
+        pass
+
+
+def start_flask_server() -> Tuple[str, Callable[[], None]]:
+    """Serve app.py's Flask app from a threaded werkzeug server; returns (base URL, stop)."""
+    import app as chat_app
+    server = make_server("127.0.0.1", 0, chat_app.app, threaded=True, request_handler=QuietRequestHandler)
+    threading.Thread(target=server.serve_forever, name="benchmark-app", daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}", server.shutdown
+
+
+def start_async_server() -> Tuple[str, Callable[[], None]]:
+    """Serve async_app.py's aiohttp app on an event loop thread; returns (base URL, stop)."""
+    from aiohttp import web
+    import async_app
+    loop = asyncio.new_event_loop()
+    runner = web.AppRunner(async_app.app, access_log=None)
+
+    async def start() -> int:
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        return runner.addresses[0][1]
+
+    threading.Thread(target=loop.run_forever, name="benchmark-app", daemon=True).start()
+    port = asyncio.run_coroutine_threadsafe(start(), loop).result()
+
+    def stop() -> None:
+        asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+    return f"http://127.0.0.1:{port}", stop
+
+
+def load_corpus(path: str) -> List[Dict[str, Any]]:
+    """Load the query corpus: one {"query", optional "conversation"} object per line."""
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def build_schedule(corpus: List[Dict[str, Any]], total: int, seed: Optional[int], run_id: str) -> List[Dict[str, Any]]:
+    """
+    Repeat the corpus until there are total requests.
+
+    Each pass gets its own conversation ids, so multi-turn entries replay as
+    fresh conversations. With a seed, standalone queries are shuffled within
+    each pass; conversations keep their turn order.
+    """
+    rng = random.Random(seed)
+    schedule = []
+    passes = 0
+    while len(schedule) < total:
+        entries = list(corpus)
+        if seed is not None:
+            standalone = [entry for entry in entries if not entry.get("conversation")]
+            rng.shuffle(standalone)
+            turns = iter(standalone)
+            entries = [entry if entry.get("conversation") else next(turns) for entry in entries]
+        for entry in entries:
+            conversation = entry.get("conversation")
+            schedule.append({
+                "query": entry["query"],
+                "conversation_id": f"bench-{run_id}-{passes}-{conversation}" if conversation else None
+            })
+        passes += 1
+    return schedule[:total]
+
+
+def current_rss_mb() -> float:
+    """Resident set size of this process, in MB."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        # No /proc (macOS): fall back to the peak, reported in bytes there
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2**20 if sys.platform == "darwin" else peak / 1024
+
+
+class MemorySampler:
+    """Samples RSS in a background thread while the load runs."""
+    def __init__(self, interval: float = 1.0):
+        self.interval = interval
+        self.samples: List[Dict[str, float]] = []
+        self._stop = threading.Event()
+        self._start = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name="memory-sampler", daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.samples.append({"t": round(time.monotonic() - self._start, 2), "rss_mb": round(current_rss_mb(), 2)})
+            self._stop.wait(self.interval)
+
+    def start(self) -> "MemorySampler":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {"count": 0}
+    array = np.asarray(values, dtype=float)
+    summary = {f"p{p}": round(float(np.percentile(array, p)), 2) for p in PERCENTILES}
+    summary.update({"mean": round(float(array.mean()), 2), "max": round(float(array.max()), 2), "count": len(values)})
+    return summary
+
+
+def send_chat(session: requests.Session, base_url: str, item: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+    """Send one chat request and record what the report needs."""
+    payload = {"message": item["query"], "timings": True}
+    if item["conversation_id"]:
+        payload["conversationId"] = item["conversation_id"]
+
+    start = time.perf_counter()
+    try:
+        response = session.post(f"{base_url}/api/chat", json=payload, timeout=timeout)
+        status = response.status_code
+        body = response.json() if response.headers.get("Content-Type", "").startswith("application/json") else {}
+    except requests.exceptions.RequestException as e:
+        status, body = type(e).__name__, {}
+    latency_ms = (time.perf_counter() - start) * 1000
+
+    timings = body.get("timings") or {}
+    return {
+        "status": status,
+        "latency_ms": latency_ms,
+        "server_ms": timings.get("total_ms"),
+        "stages": timings.get("stages", {}),
+        "answer_cache_hit": bool((body.get("cache") or {}).get("hit"))
+    }
+
+
+def run_load(base_url: str, schedule: List[Dict[str, Any]], concurrency: int, timeout: float) -> Dict[str, Any]:
+    """
+    Drive the schedule with a closed loop of concurrency workers.
+
+    Turns of one conversation are sent in order by a single worker, so
+    follow-ups see the earlier turns' context.
+    """
+    streams: Dict[str, List[Dict[str, Any]]] = {}
+    for i, item in enumerate(schedule):
+        streams.setdefault(item["conversation_id"] or f"single-{i}", []).append(item)
+    queue = list(streams.values())
+    queue_lock = threading.Lock()
+    records: List[Dict[str, Any]] = []
+    local = threading.local()
+
+    def worker() -> None:
+        local.session = requests.Session()
+        while True:
+            with queue_lock:
+                if not queue:
+                    return
+                items = queue.pop(0)
+            for item in items:
+                record = send_chat(local.session, base_url, item, timeout)
+                with queue_lock:
+                    records.append(record)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="load") as pool:
+        for future in [pool.submit(worker) for _ in range(concurrency)]:
+            future.result()
+    return {"records": records, "duration_s": time.perf_counter() - start}
+
+
+def summarize(records: List[Dict[str, Any]], duration_s: float) -> Dict[str, Any]:
+    ok = [record for record in records if record["status"] == 200]
+    errors: Dict[str, int] = {}
+    for record in records:
+        if record["status"] != 200:
+            errors[str(record["status"])] = errors.get(str(record["status"]), 0) + 1
+
+    stage_values: Dict[str, List[float]] = {}
+    for record in ok:
+        for stage, value in record["stages"].items():
+            stage_values.setdefault(stage, []).append(value)
+
+    return {
+        "requests": len(records),
+        "succeeded": len(ok),
+        "errors": errors,
+        "answer_cache_hits": sum(record["answer_cache_hit"] for record in ok),
+        "duration_s": round(duration_s, 2),
+        "throughput_rps": round(len(ok) / duration_s, 2) if duration_s else 0.0,
+        "latency_ms": {
+            "end_to_end": percentiles([record["latency_ms"] for record in ok]),
+            "server": percentiles([record["server_ms"] for record in ok if record["server_ms"] is not None]),
+            "stages": {stage: percentiles(values) for stage, values in sorted(stage_values.items())}
+        }
+    }
+
+
+def git_revision() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BENCHMARK_DIR, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=BENCHMARK_DIR,
+                                    capture_output=True, text=True).stdout.strip())
+        return {"commit": commit, "dirty": dirty}
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+
+
+def parse_assignments(values: List[str], flag: str) -> Dict[str, str]:
+    assignments = {}
+    for value in values:
+        key, sep, setting = value.partition("=")
+        if not sep:
+            raise SystemExit(f"{flag} expects KEY=VALUE, got {value!r}")
+        assignments[key] = setting
+    return assignments
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    summary = report["summary"]
+    print(f"\n{summary['succeeded']}/{summary['requests']} requests succeeded in {summary['duration_s']}s "
+          f"({summary['throughput_rps']} req/s), errors: {summary['errors'] or 'none'}, "
+          f"answer cache hits: {summary['answer_cache_hits']}")
+    rows = [("end_to_end", summary["latency_ms"]["end_to_end"]), ("server", summary["latency_ms"]["server"])]
+    rows += list(summary["latency_ms"]["stages"].items())
+    print(f"\n{'stage':<32}{'p50':>10}{'p95':>10}{'p99':>10}{'count':>8}")
+    for name, stats in rows:
+        if stats.get("count"):
+            print(f"{name:<32}{stats['p50']:>10.1f}{stats['p95']:>10.1f}{stats['p99']:>10.1f}{stats['count']:>8}")
+    memory = report["memory"]
+    print(f"\nRSS {memory['rss_start_mb']:.1f} MB -> {memory['rss_end_mb']:.1f} MB "
+          f"(growth {memory['growth_mb']:+.1f} MB, peak {memory['rss_peak_mb']:.1f} MB)")
+
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    parser = argparse.ArgumentParser(description="Offline load test of /api/chat against stubbed upstreams")
+    parser.add_argument("--requests", type=int, default=200, help="Requests to send after the warmup")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent clients")
+    parser.add_argument("--warmup", type=int, default=10, help="Requests sent before measuring")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS, help="Query corpus (JSON lines)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for query order and stub latencies")
+    parser.add_argument("--timeout", type=float, default=120, help="Client timeout per request, in seconds")
+    parser.add_argument("--stub", action="append", default=[], metavar="UPSTREAM=MEDIAN_MS[:SIGMA[:FAILURE_RATE[:STATUS]]]",
+                        help=f"Latency profile of a stubbed upstream ({', '.join(DEFAULT_PROFILES)})")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="App environment variable for this run")
+    parser.add_argument("--server", choices=("flask", "async"), default="flask",
+                        help="Serve app.py (flask) or async_app.py (async)")
+    parser.add_argument("--output", help="Result file (default: benchmarks/results/<time>-<commit>.json)")
+    args = parser.parse_args(argv)
+
+    profiles = {}
+    for upstream, spec in parse_assignments(args.stub, "--stub").items():
+        if upstream not in DEFAULT_PROFILES:
+            raise SystemExit(f"Unknown upstream {upstream!r}; expected one of {', '.join(DEFAULT_PROFILES)}")
+        profiles[upstream] = LatencyProfile.parse(spec, DEFAULT_PROFILES[upstream])
+    env_overrides = parse_assignments(args.env, "--env")
+
+    backend = StubBackend(profiles, seed=args.seed)
+    with StubServer(backend) as stubs:
+        # The app reads its configuration at import time, so the environment is set first
+        os.environ.update({**BENCHMARK_ENV_DEFAULTS, **stubs.environment(), **env_overrides})
+        base_url, stop_server = start_async_server() if args.server == "async" else start_flask_server()
+
+        run_id = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+        corpus = load_corpus(args.corpus)
+        schedule = build_schedule(corpus, args.warmup + args.requests, args.seed, run_id)
+
+        try:
+            if args.warmup:
+                run_load(base_url, schedule[:args.warmup], args.concurrency, args.timeout)
+            gc.collect()
+            rss_start = current_rss_mb()
+            sampler = MemorySampler().start()
+            result = run_load(base_url, schedule[args.warmup:], args.concurrency, args.timeout)
+            sampler.stop()
+            gc.collect()
+            rss_end = current_rss_mb()
+        finally:
+            stop_server()
+
+    samples = sampler.samples
+    report = {
+        "run_id": run_id,
+        "git": git_revision(),
+        "config": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "server": args.server,
+            "warmup": args.warmup,
+            "corpus": os.path.relpath(args.corpus, BENCHMARK_DIR),
+            "corpus_size": len(corpus),
+            "seed": args.seed,
+            "stubs": {name: profile.to_dict() for name, profile in backend.profiles.items()},
+            "env": env_overrides
+        },
+        "summary": summarize(result["records"], result["duration_s"]),
+        "memory": {
+            "rss_start_mb": round(rss_start, 2),
+            "rss_end_mb": round(rss_end, 2),
+            "rss_peak_mb": round(max([rss_end] + [sample["rss_mb"] for sample in samples]), 2),
+            "growth_mb": round(rss_end - rss_start, 2),
+            "samples": samples
+        },
+        "upstream_calls": backend.stats()
+    }
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{run_id}-{report['git']['commit'] or 'nogit'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print_report(report)
+    print(f"\nResults written to {output}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
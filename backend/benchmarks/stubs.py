@@ -0,0 +1,352 @@
+# backend/benchmarks/stubs.py
+import re
+import json
+import math
+import time
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from typing import Dict, Any, List, Optional, Tuple
+
+# Paths the stub serves for each upstream; the load driver points the app's env at them
+DUKE_PATHS = {
+    "/duke/events": "duke_events",
+    "/duke/future_events": "duke_future_events",
+    "/duke/general": "duke_general"
+}
+PSE_PATH = "/customsearch/v1"
+GEMINI_PATH = re.compile(r"^/v1beta/(?:models|tunedModels)/(?P<model>[^:]+):(?P<method>generateContent|streamGenerateContent)$")
+
+# Typical latencies of the live services: (median ms, lognormal sigma, failure rate, failure status)
+DEFAULT_PROFILES = {
+    "duke_events": (250, 0.4, 0.0, 503),
+    "duke_future_events": (300, 0.4, 0.0, 503),
+    "duke_general": (400, 0.5, 0.0, 503),
+    "pse": (200, 0.3, 0.0, 503),
+    "gemini": (900, 0.5, 0.0, 429)
+}
+
+# Words the stub planner treats as Duke-related; anything else is out of scope
+DUKE_TERMS = ("duke", "campus", "chapel", "dining", "parking", "library", "pratt", "admission", "durham",
+              "blue devil", "student", "course", "faculty", "meng", "event", "dorm", "housing", "tuition")
+
+FILLER = ("Duke University offers students a range of resources across campus, and the details below summarize "
+          "what the official sources report about this topic including locations hours contacts and programs").split()
+
+
+class LatencyProfile:
+    """
+    Latency and failure behaviour of one stubbed upstream.
+
+    Latencies are drawn from a lognormal distribution around the median, which
+    gives the long right tail real services have.
+    """
+    def __init__(self, median_ms: float, sigma: float = 0.5, failure_rate: float = 0.0, failure_status: int = 503):
+        self.median_ms = median_ms
+        self.sigma = sigma
+        self.failure_rate = failure_rate
+        self.failure_status = failure_status
+
+    @classmethod
+    def parse(cls, spec: str, default: Tuple = (0, 0.0, 0.0, 503)) -> "LatencyProfile":
+        """
+        Parse "median_ms[:sigma[:failure_rate[:status]]]"; omitted fields keep their defaults.
+        """
+        fields = list(default)
+        for i, value in enumerate(spec.split(":")[:4]):
+            if value:
+                fields[i] = int(value) if i == 3 else float(value)
+        return cls(*fields)
+
+    def sample(self, rng: random.Random) -> Tuple[float, bool]:
+        """
+        Returns:
+            (seconds to wait, whether this call fails)
+        """
+        delay = self.median_ms * math.exp(self.sigma * rng.gauss(0, 1)) / 1000 if self.median_ms > 0 else 0.0
+        return delay, rng.random() < self.failure_rate
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"median_ms": self.median_ms, "sigma": self.sigma, "failure_rate": self.failure_rate,
+                "failure_status": self.failure_status}
+
+
+def extract_query(prompt: str) -> str:
+    """Find the user's query in an agent prompt."""
+    match = re.search(r"(?:USER QUERY|User Query):\s*(.+)", prompt) or \
+        re.search(r'Analyze this user query:\s*"(.*)"', prompt)
+    return match.group(1).strip() if match else prompt.strip()[:200]
+
+
+def choose_tools(query: str) -> List[Dict[str, Any]]:
+    """Pick tools for a query with keyword rules, standing in for the planning model."""
+    lowered = query.lower()
+    if not any(term in lowered for term in DUKE_TERMS):
+        return []
+    if "meng" in lowered:
+        return [{"name": "DukeAIMEngTool", "parameters": {"query": query}}]
+    if "event" in lowered and any(word in lowered for word in ("next month", "upcoming", "future", "semester")):
+        return [{"name": "DukeFutureEventsSearchTool", "parameters": {"keyword": "events", "limit": 5}}]
+    if "event" in lowered:
+        return [{"name": "DukeEventsSearchTool", "parameters": {"topic": "events", "days": 7, "limit": 5}},
+                {"name": "DukeGeneralInfoTool", "parameters": {"query": query}}]
+    return [{"name": "DukeGeneralInfoTool", "parameters": {"query": query}}]
+
+
+def filler_text(words: int, seed: str) -> str:
+    rng = random.Random(seed)
+    return " ".join(rng.choice(FILLER) for _ in range(words)).capitalize() + "."
+
+
+class StubBackend:
+    """
+    Canned responses for the Duke APIs, Google PSE and the Gemini REST API.
+    """
+    def __init__(self, profiles: Optional[Dict[str, LatencyProfile]] = None, seed: int = 0,
+                 result_count: int = 8, response_words: int = 220, stream_chunks: int = 12,
+                 chunk_interval_ms: float = 25):
+        """
+        Args:
+            profiles: Latency profile per upstream (keys of DEFAULT_PROFILES)
+            seed: Seed for latency and failure sampling
+            result_count: Items returned by each Duke/PSE search
+            response_words: Length of generated answers
+            stream_chunks: Chunks a streamed answer is split into
+            chunk_interval_ms: Delay between streamed chunks
+        """
+        self.profiles = {name: LatencyProfile(*spec) for name, spec in DEFAULT_PROFILES.items()}
+        self.profiles.update(profiles or {})
+        self.result_count = result_count
+        self.response_words = response_words
+        self.stream_chunks = stream_chunks
+        self.chunk_interval = chunk_interval_ms / 1000
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def sample(self, upstream: str) -> Tuple[float, bool]:
+        with self._lock:
+            delay, failed = self.profiles[upstream].sample(self._rng)
+            counts = self._stats.setdefault(upstream, {"calls": 0, "failures": 0})
+            counts["calls"] += 1
+            counts["failures"] += int(failed)
+        return delay, failed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {name: dict(counts) for name, counts in self._stats.items()}
+
+    def duke_results(self, upstream: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        subject = payload.get("query") or payload.get("topic") or payload.get("keyword") or "duke"
+        limit = int(payload.get("limit") or self.result_count)
+        if upstream == "duke_general":
+            return {"results": [{
+                "title": f"{subject.title()} at Duke ({i + 1})",
+                "snippet": filler_text(40, f"{subject}-{i}"),
+                "link": f"https://duke.edu/{upstream}/{i}"
+            } for i in range(self.result_count)]}
+        return {"events": [{
+            "title": f"{subject.title()} event {i + 1}",
+            "date": f"2026-10-{10 + i:02d}",
+            "location": "Bryan Center",
+            "description": filler_text(30, f"{subject}-event-{i}"),
+            "link": f"https://calendar.duke.edu/events/{upstream}/{i}"
+        } for i in range(limit)]}
+
+    def pse_results(self, query: str) -> Dict[str, Any]:
+        return {"items": [{
+            "title": f"AI MEng - {query[:40]} ({i + 1})",
+            "link": f"https://ai.meng.duke.edu/page/{i}",
+            "snippet": filler_text(35, f"{query}-pse-{i}")
+        } for i in range(self.result_count)]}
+
+    def gemini_text(self, body: Dict[str, Any]) -> str:
+        """Answer a generateContent request the way each agent's prompt expects."""
+        system = " ".join(part.get("text", "") for part in (body.get("systemInstruction") or {}).get("parts", []))
+        prompt = " ".join(part.get("text", "") for content in body.get("contents", []) for part in content.get("parts", []))
+        query = extract_query(prompt)
+
+        if "planning agent" in system:
+            tools = choose_tools(query)
+            return json.dumps({"in_scope": bool(tools), "tools": tools, "reasoning": "Selected by keyword."})
+        if "Analyze this user query" in prompt:
+            tools = choose_tools(query)
+            return json.dumps({"out_of_scope": not tools, "selected_tool": tools[0]["name"] if tools else None})
+        if "evaluation agent" in system:
+            return json.dumps({"accuracy": 8, "relevance": 9, "completeness": 7, "clarity": 8,
+                               "feedback": "Covers the main points."})
+        if "supposed to be a single JSON object" in prompt:
+            return "{}"
+        if "running summary" in prompt:
+            return filler_text(60, prompt[-200:])
+        if "thinking agent" in system:
+            return filler_text(70, query)
+        return filler_text(self.response_words, query)
+
+    def gemini_response(self, text: str, prompt_chars: int) -> Dict[str, Any]:
+        prompt_tokens = prompt_chars // 4
+        output_tokens = len(text) // 4
+        return {
+            "candidates": [{
+                "content": {"parts": [{"text": text}], "role": "model"},
+                "finishReason": "STOP",
+                "index": 0
+            }],
+            "usageMetadata": {"promptTokenCount": prompt_tokens, "candidatesTokenCount": output_tokens,
+                              "totalTokenCount": prompt_tokens + output_tokens}
+        }
+
+
+class StubRequestHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 so the app's pooled sessions keep their connections alive
+    protocol_version = "HTTP/1.1"
+    backend: StubBackend = None
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def send_json(self, status: int, payload: Any) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_json(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        try:
+            return json.loads(raw or b"{}")
+        except json.JSONDecodeError:
+            return {}
+
+    def fail(self, upstream: str) -> None:
+        status = self.backend.profiles[upstream].failure_status
+        if upstream == "gemini":
+            self.send_json(status, {"error": {"code": status, "message": "Stubbed failure",
+                                              "status": "RESOURCE_EXHAUSTED" if status == 429 else "UNAVAILABLE"}})
+        else:
+            self.send_json(status, {"error": "Stubbed failure"})
+
+    def do_GET(self) -> None:
+        url = urlparse(self.path)
+        if url.path != PSE_PATH:
+            self.send_json(404, {"error": f"Unknown path {url.path}"})
+            return
+        delay, failed = self.backend.sample("pse")
+        time.sleep(delay)
+        if failed:
+            self.fail("pse")
+            return
+        self.send_json(200, self.backend.pse_results(parse_qs(url.query).get("q", [""])[0]))
+
+    def do_POST(self) -> None:
+        url = urlparse(self.path)
+        payload = self.read_json()
+
+        if url.path in DUKE_PATHS:
+            upstream = DUKE_PATHS[url.path]
+            delay, failed = self.backend.sample(upstream)
+            time.sleep(delay)
+            if failed:
+                self.fail(upstream)
+                return
+            self.send_json(200, self.backend.duke_results(upstream, payload))
+            return
+
+        match = GEMINI_PATH.match(url.path)
+        if not match:
+            self.send_json(404, {"error": f"Unknown path {url.path}"})
+            return
+
+        delay, failed = self.backend.sample("gemini")
+        time.sleep(delay)
+        if failed:
+            self.fail("gemini")
+            return
+
+        text = self.backend.gemini_text(payload)
+        prompt_chars = len(json.dumps(payload))
+        if match.group("method") == "generateContent":
+            self.send_json(200, self.backend.gemini_response(text, prompt_chars))
+            return
+
+        # streamGenerateContent over REST returns a JSON array of partial responses
+        words = text.split(" ")
+        size = max(1, math.ceil(len(words) / self.backend.stream_chunks))
+        pieces = [" ".join(words[i:i + size]) + (" " if i + size < len(words) else "") for i in range(0, len(words), size)]
+        chunks = [json.dumps(self.backend.gemini_response(piece, prompt_chars if i == len(pieces) - 1 else 0))
+                  for i, piece in enumerate(pieces)]
+        parts = ["[" + chunks[0]] + ["," + chunk for chunk in chunks[1:]]
+        parts[-1] += "]"
+        encoded = [part.encode("utf-8") for part in parts]
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(sum(len(part) for part in encoded)))
+        self.end_headers()
+        for i, part in enumerate(encoded):
+            if i:
+                time.sleep(self.backend.chunk_interval)
+            self.wfile.write(part)
+            self.wfile.flush()
+
+
+class StubServer:
+    """
+    Threaded HTTP server for the stubbed upstreams, run in a background thread.
+
+    Usage:
+        with StubServer(StubBackend()) as stubs:
+            os.environ.update(stubs.environment())
+    """
+    def __init__(self, backend: StubBackend, host: str = "127.0.0.1", port: int = 0):
+        handler = type("BoundStubRequestHandler", (StubRequestHandler,), {"backend": backend})
+        self.backend = backend
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, name="benchmark-stubs", daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def environment(self) -> Dict[str, str]:
+        """Environment variables that point the app at the stubs."""
+        return {
+            "DUKE_EVENTS_API_URL": f"{self.url}/duke/events",
+            "DUKE_FUTURE_EVENTS_API_URL": f"{self.url}/duke/future_events",
+            "DUKE_GENERAL_API_URL": f"{self.url}/duke/general",
+            "GOOGLE_PSE_URL": f"{self.url}{PSE_PATH}",
+            "GEMINI_API_ENDPOINT": self.url
+        }
+
+    def start(self) -> "StubServer":
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self) -> "StubServer":
+        return self.start()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
+
+
+if __name__ == "__main__":
+    # Run the stubs on their own, e.g. for a gunicorn-served app started separately
+    import argparse
+    parser = argparse.ArgumentParser(description="Serve stubbed Duke, PSE and Gemini APIs")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    stubs = StubServer(StubBackend(seed=args.seed), port=args.port)
+    for key, value in stubs.environment().items():
+        print(f"{key}={value}")
+    stubs.server.serve_forever()
@@ -1,125 +1,74 @@
 from langgraph.graph import StateGraph, END
-from typing import Dict, Any, List
+from langchain_core.runnables import RunnableLambda
+from typing import Dict, Any, List, Optional
 from utils.gemini_client import GeminiClient
 from agents.planning_agent import PlanningAgent
 from agents.thinking_agent import ThinkingAgent
 from agents.evaluation_agent import EvaluationAgent
-from tools.duke_events_tool import DukeEventsSearchTool
-from tools.duke_future_events_tool import DukeFutureEventsSearchTool
-from tools.duke_general_tool import DukeGeneralInfoTool
-from tools.duke_ai_meng_tool import DukeAIMEngTool
-import os
+from agents.rule_router import RuleBasedRouter
+from graph.tool_executor import ToolExecutor
+from graph.response_node import ResponseNode
+from graph.result_reranker import ResultReranker
+from tools.registry import ToolRegistry, build_default_registry
+from utils.tool_cache import ToolResultCache, build_tool_cache
+from utils.tracing import traced_node, atraced_node
 
-def create_agent_workflow(gemini_client: GeminiClient):
-    """Create the agent workflow graph."""
-    # Initialize the tools
-    tools = [
-        DukeEventsSearchTool(
-            api_url=os.environ.get("DUKE_EVENTS_API_URL", "https://dukeevents-695116221974.us-central1.run.app"),
-            auth_token=os.environ.get("DUKE_API_AUTH_TOKEN")
-        ),
-        DukeFutureEventsSearchTool(
-            api_url=os.environ.get("DUKE_FUTURE_EVENTS_API_URL", "https://dukeeventsfuture-695116221974.us-central1.run.app"),
-            auth_token=os.environ.get("DUKE_API_AUTH_TOKEN")
-        ),
-        DukeGeneralInfoTool(
-            api_url=os.environ.get("DUKE_GENERAL_API_URL", "https://dukegeneral-695116221974.us-central1.run.app"),
-            auth_token=os.environ.get("DUKE_API_AUTH_TOKEN")
-        ),
-        DukeAIMEngTool(
-            api_key=os.environ.get("GOOGLE_API_KEY"),
-            cx="40ad5871d1ccf4b4e"  # Your Programmable Search Engine ID
-        )
-    ]
+def create_agents(gemini_client: GeminiClient, tool_registry: Optional[ToolRegistry] = None,
+                  tool_cache: Optional[ToolResultCache] = None, router: Optional[RuleBasedRouter] = None) -> Dict[str, Any]:
+    """Create the workflow nodes, keyed by node name."""
+    # Build the shared tool registry once; it is reused by every request
+    if tool_registry is None:
+        tool_registry = build_default_registry()
+    if tool_cache is None:
+        tool_cache = build_tool_cache()
     
-    # Initialize the agents
-    planning_agent = PlanningAgent(tools, gemini_client)
     thinking_agent = ThinkingAgent(gemini_client)
     evaluation_agent = EvaluationAgent(gemini_client)
     
+    return {
+        "planning": PlanningAgent(tool_registry.tools(), gemini_client, router=router),
+        "execute_tools": ToolExecutor(tool_registry, tool_cache),
+        "rerank": ResultReranker(),
+        "thinking": thinking_agent,
+        "respond": ResponseNode(thinking_agent, evaluation_agent),
+        "evaluate_response": evaluation_agent
+    }
+
+def graph_node(name: str, node: Any) -> RunnableLambda:
+    """
+    Wrap a node for the graph: traced, and with its async variant (the node's
+    acall) so the compiled graph also runs natively under ainvoke.
+    """
+    return RunnableLambda(traced_node(name, node), afunc=atraced_node(name, node.acall))
+
+def create_agent_workflow(gemini_client: GeminiClient, tool_registry: Optional[ToolRegistry] = None,
+                          tool_cache: Optional[ToolResultCache] = None, router: Optional[RuleBasedRouter] = None,
+                          agents: Optional[Dict[str, Any]] = None):
+    """Create the agent workflow graph."""
+    # Initialize the agents unless the caller shares its own
+    if agents is None:
+        agents = create_agents(gemini_client, tool_registry, tool_cache, router)
+    
     # Create the state graph
     workflow = StateGraph(Dict[str, Any])
     
-    # Add nodes to the graph
-    workflow.add_node("planning", planning_agent)
-    workflow.add_node("execute_tools", execute_tools)
-    workflow.add_node("thinking", thinking_agent)
-    workflow.add_node("evaluate_response", evaluation_agent)
+    # Add nodes to the graph; each run is recorded as a span of the request's trace
+    workflow.add_node("planning", graph_node("planning", agents["planning"]))
+    workflow.add_node("execute_tools", graph_node("execute_tools", agents["execute_tools"]))
+    workflow.add_node("rerank", graph_node("rerank", agents["rerank"]))
+    workflow.add_node("respond", graph_node("respond", agents["respond"]))
+    workflow.add_node("evaluate_response", graph_node("evaluate_response", agents["evaluate_response"]))
     
-    # Define the edges (transitions)
+    # Define the edges (transitions); "respond" generates the thinking
+    # explanation and the response concurrently
     workflow.add_edge("planning", "execute_tools")
-    workflow.add_edge("execute_tools", "thinking")
-    workflow.add_edge("thinking", "evaluate_response")
+    workflow.add_edge("execute_tools", "rerank")
+    workflow.add_edge("rerank", "respond")
+    workflow.add_edge("respond", "evaluate_response")
     workflow.add_edge("evaluate_response", END)
     
     # Set the entry point
     workflow.set_entry_point("planning")
     
     # Compile the graph
-    return workflow.compile()
-
-def execute_tools(state: Dict[str, Any]) -> Dict[str, Any]:
-    """
-    Execute the tools specified in the planning stage.
-    """
-    plan = state.get("plan", {})
-    tools_to_use = plan.get("tools", [])
-    
-    # If no tools (out of scope query), skip execution
-    if not tools_to_use:
-        return {
-            **state,
-            "tool_results": {},
-            "next": "thinking"
-        }
-    
-    # Get tool instances from their names
-    tool_dict = {
-        "DukeEventsSearchTool": DukeEventsSearchTool(
-            api_url=os.environ.get("DUKE_EVENTS_API_URL", "https://dukeevents-695116221974.us-central1.run.app"),
-            auth_token=os.environ.get("DUKE_API_AUTH_TOKEN")
-        ),
-        "DukeFutureEventsSearchTool": DukeFutureEventsSearchTool(
-            api_url=os.environ.get("DUKE_FUTURE_EVENTS_API_URL", "https://dukeeventsfuture-695116221974.us-central1.run.app"),
-            auth_token=os.environ.get("DUKE_API_AUTH_TOKEN")
-        ),
-        "DukeGeneralInfoTool": DukeGeneralInfoTool(
-            api_url=os.environ.get("DUKE_GENERAL_API_URL", "https://dukegeneral-695116221974.us-central1.run.app"),
-            auth_token=os.environ.get("DUKE_API_AUTH_TOKEN")
-        ),
-        "DukeAIMEngTool": DukeAIMEngTool(
-            api_key=os.environ.get("GOOGLE_API_KEY"),
-            cx="40ad5871d1ccf4b4e"  # Your Programmable Search Engine ID
-        )
-    }
-    
-    tool_results = {}
-    
-    # Execute each tool with its parameters
-    for tool_spec in tools_to_use:
-        tool_name = tool_spec.get("name")
-        parameters = tool_spec.get("parameters", {})
-        
-        if tool_name in tool_dict:
-            tool = tool_dict[tool_name]
-            try:
-                result = tool._run(**parameters)
-                tool_results[tool_name] = result
-            except Exception as e:
-                tool_results[tool_name] = {
-                    "status": "error",
-                    "message": f"Error executing tool: {str(e)}",
-                    "source": tool_name
-                }
-        else:
-            tool_results[tool_name] = {
-                "status": "error",
-                "message": f"Tool not found: {tool_name}",
-                "source": "execute_tools"
-            }
-    
-    return {
-        **state,
-        "tool_results": tool_results,
-        "next": "thinking"
-    }
\ No newline at end of file
+    return workflow.compile()
\ No newline at end of file
@@ -0,0 +1,189 @@
+# backend/graph/conversation_store.py
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Callable, Optional
+
+# A mutator receives the current record (or None) and returns the record to store
+Mutator = Callable[[Optional[Dict[str, Any]]], Dict[str, Any]]
+
+
+def record_size(record: Dict[str, Any]) -> int:
+    """
+    Approximate the memory held by a conversation record by its JSON size.
+    """
+    return len(json.dumps(record, default=str))
+
+
+class InMemoryConversationStore:
+    """
+    Conversation records held in this process, with TTL and LRU eviction.
+
+    A conversation expires ttl seconds after its last update. Once more than
+    max_conversations are stored, or their approximate size exceeds max_bytes,
+    the least recently used conversations are evicted.
+    """
+    def __init__(self, ttl: float = 21600, max_conversations: int = 5000, max_bytes: int = 64 * 1024 * 1024):
+        self.ttl = ttl
+        self.max_conversations = max_conversations
+        self.max_bytes = max_bytes
+        self._records: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._total_bytes = 0
+        self._evictions = 0
+        self._lock = threading.RLock()
+
+    def _drop(self, conversation_id: str) -> None:
+        self._records.pop(conversation_id, None)
+        self._total_bytes -= self._sizes.pop(conversation_id, 0)
+
+    def _live(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        record = self._records.get(conversation_id)
+        if record is None:
+            return None
+        if record["updated_at"] + self.ttl <= time.time():
+            self._drop(conversation_id)
+            return None
+        self._records.move_to_end(conversation_id)
+        return record
+
+    def get(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._live(conversation_id)
+
+    def update(self, conversation_id: str, mutator: Mutator) -> Dict[str, Any]:
+        with self._lock:
+            record = mutator(self._live(conversation_id))
+            record["updated_at"] = time.time()
+            self._total_bytes -= self._sizes.get(conversation_id, 0)
+            self._records[conversation_id] = record
+            self._records.move_to_end(conversation_id)
+            self._sizes[conversation_id] = record_size(record)
+            self._total_bytes += self._sizes[conversation_id]
+
+            while len(self._records) > 1 and (len(self._records) > self.max_conversations
+                                              or self._total_bytes > self.max_bytes):
+                self._drop(next(iter(self._records)))
+                self._evictions += 1
+            return record
+
+    def delete(self, conversation_id: str) -> None:
+        with self._lock:
+            self._drop(conversation_id)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "backend": "memory",
+                "conversations": len(self._records),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "evictions": self._evictions
+            }
+
+
+class SQLiteConversationStore:
+    """
+    Conversation records in a SQLite file shared by every worker on the host.
+
+    Runs in WAL mode, and updates take an immediate write lock so concurrent
+    read-modify-write cycles from different workers do not lose messages.
+    Expired conversations are purged periodically and the oldest are removed
+    once more than max_conversations are stored.
+    """
+    def __init__(self, path: str, ttl: float = 21600, max_conversations: int = 50000, purge_every: int = 100):
+        self.path = path
+        self.ttl = ttl
+        self.max_conversations = max_conversations
+        self.purge_every = purge_every
+        self._writes = 0
+        self._local = threading.local()
+        conn = self._connection()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS conversations ("
+            "id TEXT PRIMARY KEY, data TEXT NOT NULL, size INTEGER NOT NULL, updated_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS conversations_updated ON conversations (updated_at)")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _load(self, conn: sqlite3.Connection, conversation_id: str) -> Optional[Dict[str, Any]]:
+        row = conn.execute(
+            "SELECT data FROM conversations WHERE id = ? AND updated_at > ?",
+            (conversation_id, time.time() - self.ttl)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        return self._load(self._connection(), conversation_id)
+
+    def update(self, conversation_id: str, mutator: Mutator) -> Dict[str, Any]:
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            record = mutator(self._load(conn, conversation_id))
+            record["updated_at"] = time.time()
+            data = json.dumps(record, default=str)
+            conn.execute(
+                "INSERT OR REPLACE INTO conversations (id, data, size, updated_at) VALUES (?, ?, ?, ?)",
+                (conversation_id, data, len(data), record["updated_at"])
+            )
+            self._writes += 1
+            if self._writes % self.purge_every == 0:
+                self._purge(conn)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return record
+
+    def _purge(self, conn: sqlite3.Connection) -> None:
+        conn.execute("DELETE FROM conversations WHERE updated_at <= ?", (time.time() - self.ttl,))
+        conn.execute(
+            "DELETE FROM conversations WHERE id IN ("
+            "SELECT id FROM conversations ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_conversations,)
+        )
+
+    def delete(self, conversation_id: str) -> None:
+        self._connection().execute("DELETE FROM conversations WHERE id = ?", (conversation_id,))
+
+    def stats(self) -> Dict[str, Any]:
+        count, total = self._connection().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM conversations").fetchone()
+        return {
+            "backend": "sqlite",
+            "conversations": count,
+            "bytes": total
+        }
+
+
+def build_conversation_store():
+    """
+    Build the conversation store from the environment.
+
+    CONVERSATION_STORE selects "memory" (default) or "sqlite"; the SQLite file
+    at CONVERSATION_STORE_PATH is shared by every gunicorn worker, so a
+    conversation keeps its context whichever worker serves the next request.
+    """
+    ttl = float(os.environ.get("CONVERSATION_TTL_SECONDS", 21600))
+    if os.environ.get("CONVERSATION_STORE", "memory").lower() == "sqlite":
+        return SQLiteConversationStore(
+            os.environ.get("CONVERSATION_STORE_PATH", "/tmp/duke_conversations.db"),
+            ttl=ttl,
+            max_conversations=int(os.environ.get("CONVERSATION_MAX_COUNT", 50000))
+        )
+    return InMemoryConversationStore(
+        ttl=ttl,
+        max_conversations=int(os.environ.get("CONVERSATION_MAX_COUNT", 5000)),
+        max_bytes=int(os.environ.get("CONVERSATION_MAX_BYTES", 64 * 1024 * 1024))
+    )
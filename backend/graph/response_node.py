@@ -0,0 +1,101 @@
+# backend/graph/response_node.py
+import asyncio
+from typing import Dict, Any
+from agents.thinking_agent import ThinkingAgent
+from agents.evaluation_agent import EvaluationAgent
+
+
+class ResponseNode:
+    """
+    Workflow node that generates the thinking explanation and the response side by side.
+
+    Both only need the query, plan and tool results, so the explanation is
+    started in the thinking agent's pool while the response is generated on
+    the current thread, and the node joins on both before returning. In lazy
+    thinking mode only the inputs for the explanation are kept and it is
+    generated when the client asks for it, as it also is for requests admitted
+    in degraded mode. On the async serving path (acall) both run as coroutines
+    on the event loop instead.
+
+    This is a single node rather than a fan-out in the graph because the
+    workflow state is one untyped dict channel, which LangGraph cannot merge
+    concurrent writes into.
+    """
+    def __init__(self, thinking_agent: ThinkingAgent, evaluation_agent: EvaluationAgent):
+        self.thinking_agent = thinking_agent
+        self.evaluation_agent = evaluation_agent
+
+    def __call__(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Add the thinking explanation and the proposed response to the state.
+        """
+        query = state.get("message", "")
+        planning = state.get("plan", {})
+        tool_results = state.get("tool_results", {})
+
+        # Out of scope queries need no LLM call for either
+        if not planning.get("tools"):
+            return {
+                **state,
+                "thinking_explanation": self.thinking_agent.explain_thinking(query, planning, tool_results),
+                **self.evaluation_agent.out_of_scope_result(),
+                "next": "evaluate_response"
+            }
+
+        if self.thinking_agent.mode == "lazy" or state.get("degraded"):
+            self.thinking_agent.defer(state.get("message_id"), query, planning, tool_results)
+            thinking_future = None
+        else:
+            thinking_future = self.thinking_agent.explain_async(query, planning, tool_results)
+
+        proposed_response = self.evaluation_agent.generate_response(query, tool_results, state.get("context", ""))
+
+        thinking_updates = {"thinking_explanation": None, "thinking_status": "deferred"}
+        if thinking_future is not None:
+            thinking_updates = {"thinking_explanation": thinking_future.result(), "thinking_status": "complete"}
+
+        return {
+            **state,
+            **thinking_updates,
+            "proposed_response": proposed_response,
+            "response": proposed_response,
+            "next": "evaluate_response"
+        }
+
+    async def acall(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Async variant of __call__: the explanation and the response are generated as concurrent coroutines.
+        """
+        query = state.get("message", "")
+        planning = state.get("plan", {})
+        tool_results = state.get("tool_results", {})
+
+        if not planning.get("tools"):
+            return {
+                **state,
+                "thinking_explanation": self.thinking_agent.explain_thinking(query, planning, tool_results),
+                **self.evaluation_agent.out_of_scope_result(),
+                "next": "evaluate_response"
+            }
+
+        response = self.evaluation_agent.agenerate_response(query, tool_results, state.get("context", ""))
+        if self.thinking_agent.mode == "lazy" or state.get("degraded"):
+            self.thinking_agent.defer(state.get("message_id"), query, planning, tool_results)
+            thinking_updates = {"thinking_explanation": None, "thinking_status": "deferred"}
+            proposed_response = await response
+        else:
+            thinking = asyncio.ensure_future(self.thinking_agent.aexplain_thinking(query, planning, tool_results))
+            try:
+                proposed_response = await response
+            except BaseException:
+                thinking.cancel()
+                raise
+            thinking_updates = {"thinking_explanation": await thinking, "thinking_status": "complete"}
+
+        return {
+            **state,
+            **thinking_updates,
+            "proposed_response": proposed_response,
+            "response": proposed_response,
+            "next": "evaluate_response"
+        }
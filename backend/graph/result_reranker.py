@@ -0,0 +1,204 @@
+# backend/graph/result_reranker.py
+import os
+import re
+from typing import Dict, Any, List, Optional, Tuple
+import numpy as np
+from agents.rule_router import STOPWORDS
+from utils.prompt_context import LIST_KEYS
+
+# Fields that describe a record; other fields (dates, links, ids) are not ranked on
+RANK_FIELDS = ("title", "name", "snippet", "description", "summary", "location", "speaker", "organizer")
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in TOKEN_PATTERN.findall(text.lower()) if t not in STOPWORDS]
+
+
+def record_text(item: Any) -> str:
+    """
+    Get the text of a record that is ranked on.
+    """
+    if not isinstance(item, dict):
+        return str(item)
+    parts = [str(item[field]) for field in RANK_FIELDS if item.get(field)]
+    if not parts:
+        parts = [str(value) for value in item.values() if isinstance(value, str)]
+    return " ".join(parts)
+
+
+def term_matrix(documents: List[List[str]], vocabulary: Dict[str, int]) -> np.ndarray:
+    """
+    Count each vocabulary term in each document, as a (documents x terms) matrix.
+    """
+    counts = np.zeros((len(documents), len(vocabulary)), dtype=np.float64)
+    for row, tokens in enumerate(documents):
+        columns = [vocabulary[t] for t in tokens if t in vocabulary]
+        if columns:
+            np.add.at(counts[row], columns, 1.0)
+    return counts
+
+
+def bm25_scores(query_tokens: List[str], documents: List[List[str]], k1: float = 1.5, b: float = 0.75) -> np.ndarray:
+    """
+    Score every document against the query with Okapi BM25.
+    """
+    terms = list(dict.fromkeys(query_tokens))
+    if not terms or not documents:
+        return np.zeros(len(documents))
+
+    tf = term_matrix(documents, {term: i for i, term in enumerate(terms)})
+    lengths = np.array([len(tokens) for tokens in documents], dtype=np.float64)
+    average_length = lengths.mean() or 1.0
+
+    df = (tf > 0).sum(axis=0)
+    idf = np.log((len(documents) - df + 0.5) / (df + 0.5) + 1.0)
+    norm = tf + k1 * (1 - b + b * lengths / average_length)[:, None]
+    return (idf * tf * (k1 + 1) / norm).sum(axis=1)
+
+
+def tfidf_similarity(documents: List[List[str]]) -> np.ndarray:
+    """
+    Pairwise cosine similarity of documents' TF-IDF vectors.
+    """
+    vocabulary = {}
+    for tokens in documents:
+        for token in tokens:
+            vocabulary.setdefault(token, len(vocabulary))
+    if not vocabulary:
+        return np.zeros((len(documents), len(documents)))
+
+    tf = term_matrix(documents, vocabulary)
+    idf = np.log((1 + len(documents)) / (1 + (tf > 0).sum(axis=0))) + 1.0
+    vectors = tf * idf
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors = np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+    return vectors @ vectors.T
+
+
+def split_data(data: Any) -> Tuple[Optional[List[Any]], Optional[str]]:
+    """
+    Find the list of records in a tool's data.
+
+    Returns:
+        (records, key they are nested under or None for a bare list), or (None, None)
+        when the data is not a list of records
+    """
+    if isinstance(data, list):
+        return data, None
+    if isinstance(data, dict):
+        for key in LIST_KEYS:
+            if isinstance(data.get(key), list):
+                return data[key], key
+    return None, None
+
+
+class ResultReranker:
+    """
+    Workflow node that ranks tool results against the query before generation.
+
+    Records from every successful tool are scored with BM25 over their
+    descriptive fields, near-duplicates (e.g. the same event returned by both
+    event tools) are dropped by TF-IDF cosine similarity, and only the top_k
+    records overall are kept. Each tool result is replaced by a copy holding
+    its kept records in rank order and their "scores", so the cached results
+    are never modified; the scores are also recorded in "retrieval_scores".
+    """
+    def __init__(self, top_k: Optional[int] = None, duplicate_threshold: Optional[float] = None,
+                 enabled: Optional[bool] = None):
+        self.top_k = top_k or int(os.environ.get("RERANK_TOP_K", 8))
+        self.duplicate_threshold = duplicate_threshold or float(os.environ.get("RERANK_DUPLICATE_THRESHOLD", 0.9))
+        if enabled is None:
+            enabled = os.environ.get("RERANK_ENABLED", "true").lower() in ("1", "true", "yes")
+        self.enabled = enabled
+
+    def rerank(self, query: str, tool_results: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """
+        Rank, deduplicate and truncate the records of the tool results.
+
+        Returns:
+            (new tool results, retrieval scores per tool)
+        """
+        # (tool name, position in the tool's data, record)
+        entries = []
+        for tool_name, result in tool_results.items():
+            if not isinstance(result, dict) or result.get("status") != "success":
+                continue
+            records, _ = split_data(result.get("data"))
+            for position, item in enumerate(records or []):
+                entries.append((tool_name, position, item))
+
+        if not entries:
+            return tool_results, {}
+
+        documents = [tokenize(record_text(item)) for _, _, item in entries]
+        scores = bm25_scores(tokenize(query), documents)
+
+        # Best first; ties keep the tools' and the APIs' own order
+        order = sorted(range(len(entries)), key=lambda i: (-scores[i], i))
+
+        similarity = tfidf_similarity(documents)
+        kept: List[int] = []
+        duplicates = 0
+        for i in order:
+            if any(similarity[i, j] >= self.duplicate_threshold for j in kept):
+                duplicates += 1
+                continue
+            if len(kept) < self.top_k:
+                kept.append(i)
+
+        ranked: Dict[str, List[int]] = {}
+        for i in kept:
+            ranked.setdefault(entries[i][0], []).append(i)
+
+        reranked = dict(tool_results)
+        retrieval_scores = {}
+        for tool_name, result in tool_results.items():
+            if not isinstance(result, dict) or result.get("status") != "success":
+                continue
+            records, key = split_data(result.get("data"))
+            if records is None:
+                continue
+            indexes = ranked.get(tool_name, [])
+            items = [entries[i][2] for i in indexes]
+            data = items if key is None else {**result["data"], key: items}
+            reranked[tool_name] = {
+                **result,
+                "data": data,
+                "scores": [round(float(scores[i]), 4) for i in indexes]
+            }
+            retrieval_scores[tool_name] = {
+                "returned": len(records),
+                "kept": len(items),
+                "scores": reranked[tool_name]["scores"]
+            }
+
+        retrieval_scores["duplicates_dropped"] = duplicates
+        return reranked, retrieval_scores
+
+    def __call__(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Replace the state's tool results with their ranked, truncated copies.
+        """
+        if not self.enabled:
+            return {**state, "next": "respond"}
+
+        try:
+            tool_results, retrieval_scores = self.rerank(state.get("message", ""), state.get("tool_results", {}))
+        except Exception as e:
+            print(f"Warning: Could not rerank tool results: {str(e)}")
+            return {**state, "next": "respond"}
+
+        return {
+            **state,
+            "tool_results": tool_results,
+            "retrieval_scores": retrieval_scores,
+            "next": "respond"
+        }
+
+    async def acall(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Async variant of __call__; reranking is a few milliseconds of CPU, so it runs inline.
+        """
+        return self(state)
@@ -1,110 +1,320 @@
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, Callable, List, Optional
+import os
 import uuid
+import threading
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from graph.conversation_store import build_conversation_store
+from graph.tool_result_store import build_tool_result_store
+
+# Rough conversion used to hold the context to a token budget
+CHARS_PER_TOKEN = 4
 
 class ConversationState:
     """
     Manages conversation state across multiple turns.
+    
+    Conversations live in a pluggable store (in-process with TTL/LRU eviction,
+    or SQLite shared across workers); each conversation keeps at most
+    max_messages messages.
+    
+    The prompt context is built incrementally: every add_message updates a
+    rolling window of formatted recent turns and the ready-to-use context
+    string, so get_recent_context is a single lookup. Turns that leave the
+    window are folded into a running summary by a background summarizer, and
+    the whole context is held to a token budget.
+    
+    Tool results are not stored inline: each result is kept once in a
+    content-addressed store and messages hold only references, which are
+    dropped from messages older than tool_results_turns assistant turns.
     """
-    def __init__(self):
-        self.conversations = {}
+    def __init__(self, store=None, max_messages: Optional[int] = None, tool_result_store=None):
+        self.store = store or build_conversation_store()
+        self.tool_result_store = tool_result_store or build_tool_result_store()
+        self.tool_results_turns = int(os.environ.get("TOOL_RESULTS_KEEP_TURNS", 5))
+        self.max_messages = max_messages or int(os.environ.get("CONVERSATION_MAX_MESSAGES", 50))
+        self.window_messages = int(os.environ.get("CONTEXT_WINDOW_MESSAGES", 3))
+        self.message_chars = int(os.environ.get("CONTEXT_MESSAGE_CHARS", 200))
+        self.token_budget = int(os.environ.get("CONTEXT_TOKEN_BUDGET", 500))
+        self.summary_batch = int(os.environ.get("CONTEXT_SUMMARY_BATCH", 4))
+        self.summarizer: Optional[Callable[[str, List[str]], str]] = None
+        self.summary_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="summary")
+        self._summarizing = set()
+        self._summarizing_lock = threading.Lock()
     
-    def create_conversation(self) -> str:
-        """
-        Create a new conversation and return its ID.
-        """
-        conversation_id = str(uuid.uuid4())
-        self.conversations[conversation_id] = {
+    def new_record(self) -> Dict[str, Any]:
+        return {
             "messages": [],
             "context": {},
+            "window": [],
+            "pending_summary": [],
+            "summary": "",
+            "context_text": "",
             "created_at": datetime.now().isoformat()
         }
+    
+    def set_summarizer(self, summarizer: Callable[[str, List[str]], str]) -> None:
+        """
+        Set the function that folds older turns into the running summary.
+        
+        It is called in the background with the current summary and a list of
+        formatted turns, and returns the updated summary.
+        """
+        self.summarizer = summarizer
+    
+    def format_turn(self, message: Dict[str, Any]) -> str:
+        role = "User" if message["role"] == "user" else "Assistant"
+        content = message["content"]
+        if len(content) > self.message_chars:
+            content = content[:self.message_chars] + "..."
+        return f"{role}: {content}"
+    
+    def build_context_text(self, record: Dict[str, Any]) -> str:
+        """
+        Assemble the context string from the summary and recent turns within the token budget.
+        
+        The summary may use up to half the budget; the newest turns are kept
+        first, and turns still waiting to be summarized fill any space left.
+        """
+        budget = self.token_budget * CHARS_PER_TOKEN
+        
+        summary = record.get("summary", "")
+        if len(summary) > budget // 2:
+            summary = summary[:budget // 2] + "..."
+        remaining = budget - len(summary)
+        
+        recent_lines = []
+        for line in reversed(record.get("window", [])):
+            if len(line) + 1 > remaining:
+                break
+            recent_lines.insert(0, line)
+            remaining -= len(line) + 1
+        
+        older_lines = []
+        if len(recent_lines) == len(record.get("window", [])):
+            for line in reversed(record.get("pending_summary", [])):
+                if len(line) + 1 > remaining:
+                    break
+                older_lines.insert(0, line)
+                remaining -= len(line) + 1
+        
+        sections = []
+        if summary:
+            sections.append(f"Conversation summary: {summary}")
+        if older_lines or recent_lines:
+            sections.append("Recent conversation:\n" + "\n".join(older_lines + recent_lines))
+        return "\n".join(sections)
+    
+    def schedule_summary(self, conversation_id: str) -> None:
+        """
+        Fold the turns that left the window into the summary, in the background.
+        """
+        with self._summarizing_lock:
+            if conversation_id in self._summarizing:
+                return
+            self._summarizing.add(conversation_id)
+        self.summary_pool.submit(self.refresh_summary, conversation_id)
+    
+    def refresh_summary(self, conversation_id: str) -> None:
+        try:
+            record = self.store.get(conversation_id)
+            if record is None or not record.get("pending_summary"):
+                return
+            summary = record.get("summary", "")
+            turns = list(record["pending_summary"])
+            updated = self.summarizer(summary, turns)
+            
+            def apply(current):
+                current = current or self.new_record()
+                # Only drop the turns that were summarized; more may have arrived meanwhile
+                current["summary"] = updated
+                current["pending_summary"] = current.get("pending_summary", [])[len(turns):]
+                current["context_text"] = self.build_context_text(current)
+                return current
+            
+            self.store.update(conversation_id, apply)
+        except Exception as e:
+            print(f"Warning: Could not summarize conversation: {str(e)}")
+        finally:
+            with self._summarizing_lock:
+                self._summarizing.discard(conversation_id)
+    
+    def create_conversation(self, conversation_id: Optional[str] = None) -> str:
+        """
+        Create a new conversation and return its ID.
+        """
+        conversation_id = conversation_id or str(uuid.uuid4())
+        self.store.update(conversation_id, lambda record: self.new_record())
         return conversation_id
     
     def add_message(self, conversation_id: str, role: str, content: str,
                    thinking: Optional[str] = None, tool_results: Optional[Dict[str, Any]] = None,
-                   evaluation: Optional[Dict[str, Any]] = None) -> None:
+                   evaluation: Optional[Dict[str, Any]] = None, message_id: Optional[str] = None) -> None:
         """
         Add a message to the conversation history.
         """
-        if conversation_id not in self.conversations:
-            conversation_id = self.create_conversation()
-        
         message = {
             "role": role,
             "content": content,
             "timestamp": datetime.now().isoformat(),
         }
         
+        if message_id:
+            message["message_id"] = message_id
+        
         if thinking:
             message["thinking"] = thinking
-            
+        
         if tool_results:
-            message["tool_results"] = tool_results
-            
+            # Store each tool's result once, by content hash, and keep only references
+            message["tool_results"] = {
+                name: self.tool_result_store.put(result) for name, result in tool_results.items()
+            }
+        
         if evaluation:
             message["evaluation"] = evaluation
+        
+        def append(record):
+            record = record or self.new_record()
+            # Keep only the most recent messages
+            record["messages"] = (record["messages"] + [message])[-self.max_messages:]
+            if message.get("tool_results"):
+                self.drop_old_tool_results(record["messages"])
             
-        self.conversations[conversation_id]["messages"].append(message)
+            # Roll the context window; turns that leave it wait for the summarizer
+            window = record.get("window", []) + [self.format_turn(message)]
+            pending = record.get("pending_summary", []) + window[:-self.window_messages]
+            record["window"] = window[-self.window_messages:]
+            record["pending_summary"] = pending if self.summarizer else []
+            record["context_text"] = self.build_context_text(record)
+            return record
+        
+        record = self.store.update(conversation_id, append)
+        if self.summarizer and len(record["pending_summary"]) >= self.summary_batch:
+            self.schedule_summary(conversation_id)
+    
+    def drop_old_tool_results(self, messages: List[Dict[str, Any]]) -> None:
+        """
+        Remove tool result references from all but the most recent turns that have them.
+        """
+        seen = 0
+        for message in reversed(messages):
+            if "tool_results" not in message:
+                continue
+            seen += 1
+            if seen > self.tool_results_turns:
+                del message["tool_results"]
+                message["tool_results_dropped"] = True
+    
+    def get_tool_results(self, conversation_id: str, message_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Fetch the full tool results of a stored message on demand.
+        
+        Returns:
+            Tool name to result (None for a result that has been evicted), or None if the
+            message is unknown or its references were dropped
+        """
+        for message in reversed(self.get_conversation_history(conversation_id)):
+            if message.get("message_id") != message_id:
+                continue
+            refs = message.get("tool_results")
+            if refs is None:
+                return None
+            return {name: self.tool_result_store.get(ref) for name, ref in refs.items()}
+        return None
+    
+    def update_message_evaluation(self, conversation_id: str, message_id: str, evaluation: Dict[str, Any]) -> bool:
+        """
+        Attach an evaluation to a stored message, e.g. once a background evaluation finishes.
+        """
+        found = []
+        
+        def attach(record):
+            record = record or self.new_record()
+            for message in reversed(record["messages"]):
+                if message.get("message_id") == message_id:
+                    message["evaluation"] = evaluation
+                    found.append(True)
+                    break
+            return record
+        
+        if self.store.get(conversation_id) is None:
+            return False
+        self.store.update(conversation_id, attach)
+        return bool(found)
     
     def get_conversation_history(self, conversation_id: str) -> List[Dict[str, Any]]:
         """
         Get the conversation history.
         """
-        if conversation_id not in self.conversations:
+        record = self.store.get(conversation_id)
+        if record is None:
             return []
         
-        return self.conversations[conversation_id]["messages"]
+        return record["messages"]
     
     def update_context(self, conversation_id: str, key: str, value: Any) -> None:
         """
         Update the context information for a conversation.
         """
-        if conversation_id not in self.conversations:
-            conversation_id = self.create_conversation()
-            
-        self.conversations[conversation_id]["context"][key] = value
+        def set_value(record):
+            record = record or self.new_record()
+            record["context"][key] = value
+            return record
+        
+        self.store.update(conversation_id, set_value)
     
     def get_context(self, conversation_id: str, key: str) -> Any:
         """
         Get a specific context value.
         """
-        if conversation_id not in self.conversations:
-            return None
-            
-        return self.conversations[conversation_id]["context"].get(key)
+        return self.get_full_context(conversation_id).get(key)
     
     def get_full_context(self, conversation_id: str) -> Dict[str, Any]:
         """
         Get the full context dictionary.
         """
-        if conversation_id not in self.conversations:
+        record = self.store.get(conversation_id)
+        if record is None:
             return {}
-            
-        return self.conversations[conversation_id]["context"]
+        
+        return record["context"]
     
-    def get_recent_context(self, conversation_id: str, message_count: int = 3) -> str:
+    def get_recent_context(self, conversation_id: str, message_count: Optional[int] = None) -> str:
         """
         Get recent conversation context as a formatted string.
+        
+        The default context (summary plus rolling window) is precomputed on
+        add_message; passing a message_count rebuilds a plain window of that size.
         """
-        if conversation_id not in self.conversations:
+        record = self.store.get(conversation_id)
+        if record is None:
             return ""
         
+        if message_count is None and "context_text" in record:
+            return record["context_text"]
+        
         # Get the most recent messages
-        messages = self.conversations[conversation_id]["messages"]
-        recent_messages = messages[-message_count:] if len(messages) > 0 else []
+        messages = record["messages"]
+        recent_messages = messages[-(message_count or self.window_messages):] if len(messages) > 0 else []
         
         # Format as context string
-        context_lines = []
-        for msg in recent_messages:
-            role = "User" if msg["role"] == "user" else "Assistant"
-            content = msg["content"][:200] + "..." if len(msg["content"]) > 200 else msg["content"]
-            context_lines.append(f"{role}: {content}")
+        context_lines = [self.format_turn(msg) for msg in recent_messages]
         
         if not context_lines:
             return ""
-            
+        
         return "Recent conversation:\n" + "\n".join(context_lines)
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get conversation store statistics (count, approximate bytes, evictions).
+        """
+        return {
+            **self.store.stats(),
+            "max_messages": self.max_messages,
+            "tool_results": self.tool_result_store.stats()
+        }
 
 # Create an instance of the ConversationState class
 conversation_state = ConversationState()
\ No newline at end of file
@@ -0,0 +1,160 @@
+# backend/graph/streaming.py
+import asyncio
+from typing import Dict, Any, AsyncIterator, Iterator, Tuple
+from utils.tracing import tracer
+
+
+def stream_agent_workflow(agents: Dict[str, Any], initial_state: Dict[str, Any]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Run the agent workflow step by step, yielding (event, data) pairs as each stage finishes.
+
+    Planning, tool execution and reranking run exactly as in the compiled graph. The final
+    answer is then streamed token by token while the thinking explanation is
+    generated alongside it; the explanation and the evaluation - which the user
+    does not need to start reading - are yielded as trailing events. The last event is "final" with
+    the complete state, matching what agent_graph.invoke would return.
+
+    Each stage is recorded as a "node.*" span, as in the compiled graph.
+    """
+    planning_agent = agents["planning"]
+    tool_executor = agents["execute_tools"]
+    reranker = agents["rerank"]
+    thinking_agent = agents["thinking"]
+    evaluation_agent = agents["evaluate_response"]
+
+    with tracer.span("node.planning"):
+        state = planning_agent(initial_state)
+    yield "planning", {"plan": state.get("plan", {})}
+
+    with tracer.span("node.execute_tools"):
+        state = tool_executor(state)
+    yield "tools", {
+        "tools": {
+            name: result.get("status") if isinstance(result, dict) else None
+            for name, result in state.get("tool_results", {}).items()
+        }
+    }
+
+    with tracer.span("node.rerank"):
+        state = reranker(state)
+
+    query = state.get("message", "")
+    planning = state.get("plan", {})
+    tool_results = state.get("tool_results", {})
+
+    # Start the thinking explanation now so it is generated while the answer streams
+    thinking_future = None
+    if not planning.get("tools"):
+        state = {**state, **evaluation_agent.out_of_scope_result()}
+        state["thinking_explanation"] = thinking_agent.explain_thinking(query, planning, tool_results)
+        yield "token", {"text": state["response"]}
+    else:
+        if thinking_agent.mode == "lazy" or state.get("degraded"):
+            thinking_agent.defer(state.get("message_id"), query, planning, tool_results)
+            state = {**state, "thinking_explanation": None, "thinking_status": "deferred"}
+        else:
+            thinking_future = thinking_agent.explain_async(query, planning, tool_results)
+
+        chunks = []
+        with tracer.span("node.respond"):
+            for chunk in evaluation_agent.stream_response(query, tool_results, state.get("context", "")):
+                chunks.append(chunk)
+                yield "token", {"text": chunk}
+        response = "".join(chunks)
+        state = {**state, "proposed_response": response, "response": response}
+    yield "response", {"response": state["response"]}
+
+    if thinking_future is not None:
+        with tracer.span("node.thinking_wait"):
+            state = {**state, "thinking_explanation": thinking_future.result(), "thinking_status": "complete"}
+    yield "thinking", {
+        "thinking_explanation": state.get("thinking_explanation"),
+        "thinking_status": state.get("thinking_status", "complete")
+    }
+
+    if "evaluation" not in state:
+        with tracer.span("node.evaluate_response"):
+            state = {**state, **evaluation_agent.evaluate_or_schedule(state, state["response"])}
+    yield "evaluation", {
+        "evaluation": state["evaluation"],
+        "evaluation_status": state.get("evaluation_status", "complete"),
+        "message_id": state.get("message_id")
+    }
+
+    yield "final", {**state, "next": "final"}
+
+
+async def astream_agent_workflow(agents: Dict[str, Any], initial_state: Dict[str, Any]) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Async variant of stream_agent_workflow(), yielding the same events.
+    """
+    planning_agent = agents["planning"]
+    tool_executor = agents["execute_tools"]
+    reranker = agents["rerank"]
+    thinking_agent = agents["thinking"]
+    evaluation_agent = agents["evaluate_response"]
+
+    with tracer.span("node.planning"):
+        state = await planning_agent.acall(initial_state)
+    yield "planning", {"plan": state.get("plan", {})}
+
+    with tracer.span("node.execute_tools"):
+        state = await tool_executor.acall(state)
+    yield "tools", {
+        "tools": {
+            name: result.get("status") if isinstance(result, dict) else None
+            for name, result in state.get("tool_results", {}).items()
+        }
+    }
+
+    with tracer.span("node.rerank"):
+        state = await reranker.acall(state)
+
+    query = state.get("message", "")
+    planning = state.get("plan", {})
+    tool_results = state.get("tool_results", {})
+
+    thinking_task = None
+    try:
+        if not planning.get("tools"):
+            state = {**state, **evaluation_agent.out_of_scope_result()}
+            state["thinking_explanation"] = thinking_agent.explain_thinking(query, planning, tool_results)
+            yield "token", {"text": state["response"]}
+        else:
+            if thinking_agent.mode == "lazy" or state.get("degraded"):
+                thinking_agent.defer(state.get("message_id"), query, planning, tool_results)
+                state = {**state, "thinking_explanation": None, "thinking_status": "deferred"}
+            else:
+                thinking_task = asyncio.ensure_future(thinking_agent.aexplain_thinking(query, planning, tool_results))
+
+            chunks = []
+            with tracer.span("node.respond"):
+                async for chunk in evaluation_agent.astream_response(query, tool_results, state.get("context", "")):
+                    chunks.append(chunk)
+                    yield "token", {"text": chunk}
+            response = "".join(chunks)
+            state = {**state, "proposed_response": response, "response": response}
+        yield "response", {"response": state["response"]}
+
+        if thinking_task is not None:
+            with tracer.span("node.thinking_wait"):
+                state = {**state, "thinking_explanation": await thinking_task, "thinking_status": "complete"}
+    finally:
+        # The client went away or generation failed; do not leave the explanation running
+        if thinking_task is not None and not thinking_task.done():
+            thinking_task.cancel()
+    yield "thinking", {
+        "thinking_explanation": state.get("thinking_explanation"),
+        "thinking_status": state.get("thinking_status", "complete")
+    }
+
+    if "evaluation" not in state:
+        with tracer.span("node.evaluate_response"):
+            state = {**state, **await evaluation_agent.aevaluate_or_schedule(state, state["response"])}
+    yield "evaluation", {
+        "evaluation": state["evaluation"],
+        "evaluation_status": state.get("evaluation_status", "complete"),
+        "message_id": state.get("message_id")
+    }
+
+    yield "final", {**state, "next": "final"}
@@ -0,0 +1,316 @@
+# backend/graph/tool_executor.py
+import os
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from typing import Dict, Any, List, Optional, Tuple
+from tools.registry import ToolRegistry
+from utils.tool_cache import ToolResultCache, tool_call_key
+from utils.single_flight import SingleFlight, AsyncSingleFlight
+from utils.http_client import request_deadline
+from utils.circuit_breaker import CircuitBreakerSet, build_circuit_breakers
+from utils.tracing import tracer, propagate, run_in_pool
+
+
+def succeeded(result: Any) -> bool:
+    """Whether a tool result counts as a success for its circuit breaker."""
+    return not isinstance(result, dict) or result.get("status", "success") == "success"
+
+
+class ToolExecutor:
+    """
+    Workflow node that runs the tools selected by the planning agent concurrently.
+
+    Every tool in a plan is submitted to a shared thread pool at once, so the
+    latency of a plan is bounded by its slowest tool rather than the sum of all
+    of them. Each tool has its own deadline and the whole batch has an overall
+    deadline; a tool that misses either gets a structured "timeout" entry in the
+    results instead of holding up the request. Successful results are kept in
+    an optional TTL cache and cache hits never reach the thread pool. On the
+    async serving path (acall) the tools' _arun coroutines run as tasks on the
+    event loop instead, and late tools are cancelled rather than abandoned;
+    only the cache reads and writes use the pool there.
+
+    Identical calls (same tool, same normalized parameters) made by concurrent
+    requests share one in-flight run rather than each hitting the endpoint.
+    Each tool has a circuit breaker; while it is open the tool is not called
+    and the last good result for the same parameters is returned marked
+    "stale", or an error if there is none.
+    """
+    def __init__(self, registry: ToolRegistry, cache: Optional[ToolResultCache] = None, max_workers: int = None,
+                 tool_timeout: float = None, overall_timeout: float = None, coalesce: Optional[bool] = None,
+                 breakers: Optional[CircuitBreakerSet] = None):
+        """
+        Initialize the tool executor.
+
+        Args:
+            registry: The shared registry the tools are looked up in
+            cache: Optional cache for successful tool results
+            max_workers: Size of the shared thread pool (default: TOOL_EXECUTOR_MAX_WORKERS or 16)
+            tool_timeout: Seconds each tool may run (default: TOOL_TIMEOUT_SECONDS or 10)
+            overall_timeout: Seconds the whole plan may run (default: TOOL_OVERALL_TIMEOUT_SECONDS or 15)
+            coalesce: Share in-flight runs of identical calls (default: TOOL_COALESCING_ENABLED or true)
+            breakers: Per-tool circuit breakers (default: built from the CIRCUIT_BREAKER_* settings)
+        """
+        self.registry = registry
+        self.cache = cache
+        self.max_workers = max_workers or int(os.environ.get("TOOL_EXECUTOR_MAX_WORKERS", 16))
+        self.tool_timeout = tool_timeout or float(os.environ.get("TOOL_TIMEOUT_SECONDS", 10))
+        self.overall_timeout = overall_timeout or float(os.environ.get("TOOL_OVERALL_TIMEOUT_SECONDS", 15))
+        self.pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="tool")
+        if coalesce is None:
+            coalesce = os.environ.get("TOOL_COALESCING_ENABLED", "true").lower() == "true"
+        self.flights = SingleFlight() if coalesce else None
+        self.async_flights = AsyncSingleFlight() if coalesce else None
+        self.breakers = breakers if breakers is not None else build_circuit_breakers()
+
+    def error_result(self, tool_name: str, error: Exception) -> Dict[str, Any]:
+        return {
+            "status": "error",
+            "message": f"Error executing tool: {str(error)}",
+            "source": tool_name
+        }
+
+    def timeout_result(self, tool_name: str, start_time: float) -> Dict[str, Any]:
+        tracer.add("timeouts")
+        return {
+            "status": "timeout",
+            "message": f"Tool did not complete within {min(self.tool_timeout, self.overall_timeout):g} seconds",
+            "source": tool_name,
+            "elapsed_ms": int((time.monotonic() - start_time) * 1000)
+        }
+
+    def record_result(self, span: Any, tool_name: str, parameters: Dict[str, Any], result: Any,
+                      shared: bool = False) -> Any:
+        """Tag the tool's span with the outcome and cache the result (once, by the caller that ran it)."""
+        if span is not None and isinstance(result, dict):
+            span.set("status", result.get("status", "success"))
+        if self.cache is not None and not shared:
+            self.cache.set(tool_name, parameters, result)
+        return result
+
+    def circuit_open_result(self, tool_name: str, parameters: Dict[str, Any]) -> Dict[str, Any]:
+        """The result of a call refused by an open breaker: the last good result, or an error."""
+        tracer.set("circuit", "open")
+        stale = self.cache.get_stale(tool_name, parameters) if self.cache is not None else None
+        if stale is not None:
+            tracer.set("stale", True)
+            return {**stale, "stale": True}
+        return {
+            "status": "error",
+            "message": f"{tool_name} is temporarily unavailable",
+            "source": tool_name,
+            "circuit_open": True
+        }
+
+    def call_tool(self, tool: Any, tool_name: str, parameters: Dict[str, Any]) -> Any:
+        """
+        Call the tool's _run through its circuit breaker, recording the outcome and duration.
+        """
+        if self.breakers is None:
+            return tool._run(**parameters)
+        breaker = self.breakers.get(tool_name)
+        if not breaker.allow():
+            return self.circuit_open_result(tool_name, parameters)
+        start = time.monotonic()
+        success = False
+        try:
+            result = tool._run(**parameters)
+            success = succeeded(result)
+            return result
+        finally:
+            breaker.record(success, time.monotonic() - start)
+
+    async def acall_tool(self, tool: Any, tool_name: str, parameters: Dict[str, Any]) -> Any:
+        """
+        Async variant of call_tool(); a call cancelled at its deadline counts as a failure.
+        """
+        if self.breakers is None:
+            return await tool._arun(**parameters)
+        breaker = self.breakers.get(tool_name)
+        if not breaker.allow():
+            return await run_in_pool(self.pool, self.circuit_open_result, tool_name, parameters)
+        start = time.monotonic()
+        success = False
+        try:
+            result = await tool._arun(**parameters)
+            success = succeeded(result)
+            return result
+        finally:
+            breaker.record(success, time.monotonic() - start)
+
+    def run_tool(self, tool: Any, tool_name: str, parameters: Dict[str, Any],
+                 deadline: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Run a single tool, converting exceptions into an error result. The tool's
+        HTTP retries stop at deadline (time.monotonic()), when the caller stops waiting.
+        """
+        with tracer.span(f"tool.{tool_name}", cache_hit=False) as span, request_deadline(deadline):
+            try:
+                if self.flights is None:
+                    result, shared = self.call_tool(tool, tool_name, parameters), False
+                else:
+                    result, shared = self.flights.do(tool_call_key(tool_name, parameters),
+                                                     lambda: self.call_tool(tool, tool_name, parameters))
+                    if span is not None:
+                        span.set("coalesced", shared)
+            except Exception as e:
+                if span is not None:
+                    span.set("status", "error")
+                return self.error_result(tool_name, e)
+            return self.record_result(span, tool_name, parameters, result, shared)
+
+    async def arun_tool(self, tool: Any, tool_name: str, parameters: Dict[str, Any],
+                        deadline: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Async variant of run_tool(), using the tool's _arun.
+        """
+        with tracer.span(f"tool.{tool_name}", cache_hit=False) as span, request_deadline(deadline):
+            try:
+                if self.async_flights is None:
+                    result, shared = await self.acall_tool(tool, tool_name, parameters), False
+                else:
+                    result, shared = await self.async_flights.do(tool_call_key(tool_name, parameters),
+                                                                 lambda: self.acall_tool(tool, tool_name, parameters))
+                    if span is not None:
+                        span.set("coalesced", shared)
+            except Exception as e:
+                if span is not None:
+                    span.set("status", "error")
+                return self.error_result(tool_name, e)
+            return await run_in_pool(self.pool, self.record_result, span, tool_name, parameters, result, shared)
+
+    def resolve(self, tools_to_use: List[Dict[str, Any]]) -> Tuple[Dict[str, Any], List[Tuple[str, Any, Dict[str, Any]]]]:
+        """
+        Split a plan into results known without running anything (unknown
+        tools, cache hits) and the (name, tool, parameters) calls still to run.
+        """
+        tool_dict = self.registry.snapshot()
+        tool_results = {}
+        calls = []
+
+        for tool_spec in tools_to_use:
+            tool_name = tool_spec.get("name")
+            parameters = tool_spec.get("parameters", {}) or {}
+
+            if tool_name not in tool_dict:
+                tool_results[tool_name] = {
+                    "status": "error",
+                    "message": f"Tool not found: {tool_name}",
+                    "source": "execute_tools"
+                }
+                continue
+
+            if self.cache is not None:
+                cached = self.cache.get(tool_name, parameters)
+                if cached is not None:
+                    with tracer.span(f"tool.{tool_name}", cache_hit=True):
+                        tool_results[tool_name] = cached
+                    continue
+
+            calls.append((tool_name, tool_dict[tool_name], parameters))
+
+        return tool_results, calls
+
+    def execute(self, tools_to_use: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Execute every tool spec in the plan concurrently and collect the results.
+
+        Args:
+            tools_to_use: The "tools" list from the plan (name and parameters per tool)
+
+        Returns:
+            A dictionary of tool name to result
+        """
+        start_time = time.monotonic()
+        tool_results, calls = self.resolve(tools_to_use)
+        deadline = start_time + min(self.tool_timeout, self.overall_timeout)
+
+        # Carry the request's trace into the worker threads
+        futures = [(tool_name, self.pool.submit(propagate(self.run_tool), tool, tool_name, parameters, deadline))
+                   for tool_name, tool, parameters in calls]
+
+        for tool_name, future in futures:
+            remaining = deadline - time.monotonic()
+            try:
+                tool_results[tool_name] = future.result(timeout=max(remaining, 0))
+            except FuturesTimeoutError:
+                # The worker thread cannot be interrupted; drop it if it has not started yet
+                # and let it finish in the background otherwise.
+                future.cancel()
+                tool_results[tool_name] = self.timeout_result(tool_name, start_time)
+
+        return tool_results
+
+    async def aexecute(self, tools_to_use: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Async variant of execute(): the tools run as tasks on the event loop
+        instead of pool threads, and tools that miss the deadline are cancelled.
+        Tool cache reads and writes, which may hit SQLite, still run in the pool.
+        """
+        start_time = time.monotonic()
+        tool_results, calls = await run_in_pool(self.pool, self.resolve, tools_to_use)
+        if not calls:
+            return tool_results
+
+        deadline = start_time + min(self.tool_timeout, self.overall_timeout)
+        tasks = {
+            tool_name: asyncio.create_task(self.arun_tool(tool, tool_name, parameters, deadline))
+            for tool_name, tool, parameters in calls
+        }
+        await asyncio.wait(tasks.values(), timeout=max(deadline - time.monotonic(), 0))
+
+        for tool_name, task in tasks.items():
+            if task.done():
+                tool_results[tool_name] = task.result()
+            else:
+                task.cancel()
+                tool_results[tool_name] = self.timeout_result(tool_name, start_time)
+
+        return tool_results
+
+    def breaker_stats(self) -> Dict[str, Any]:
+        """
+        Get the state of each tool's circuit breaker.
+        """
+        return self.breakers.stats() if self.breakers is not None else {"enabled": False}
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get the in-flight coalescing counters (sync and async paths).
+        """
+        if self.flights is None:
+            return {"enabled": False}
+        return {"enabled": True, "sync": self.flights.stats(), "async": self.async_flights.stats()}
+
+    def __call__(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Execute the tools specified in the planning stage.
+        """
+        plan = state.get("plan", {})
+        tools_to_use = plan.get("tools", [])
+
+        # If no tools (out of scope query), skip execution
+        if not tools_to_use:
+            return {
+                **state,
+                "tool_results": {},
+                "next": "rerank"
+            }
+
+        return {
+            **state,
+            "tool_results": self.execute(tools_to_use),
+            "next": "rerank"
+        }
+
+    async def acall(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Async variant of __call__, for the async serving path.
+        """
+        tools_to_use = state.get("plan", {}).get("tools", [])
+        return {
+            **state,
+            "tool_results": await self.aexecute(tools_to_use) if tools_to_use else {},
+            "next": "rerank"
+        }
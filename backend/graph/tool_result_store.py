@@ -0,0 +1,151 @@
+# backend/graph/tool_result_store.py
+import os
+import json
+import time
+import zlib
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+
+def encode_payload(payload: Any, compress: bool) -> Tuple[str, bytes]:
+    """
+    Serialize a payload canonically and return its content hash and stored bytes.
+    """
+    data = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str).encode("utf-8")
+    digest = "sha256:" + hashlib.sha256(data).hexdigest()
+    # A one-byte prefix records whether the blob is compressed
+    blob = b"z" + zlib.compress(data, 6) if compress else b"j" + data
+    return digest, blob
+
+
+def decode_payload(blob: bytes) -> Any:
+    data = zlib.decompress(blob[1:]) if blob[:1] == b"z" else blob[1:]
+    return json.loads(data)
+
+
+class InMemoryToolResultStore:
+    """
+    Content-addressed store for tool results held in this process.
+
+    Identical payloads - across turns and across conversations - are stored
+    once under their SHA-256 hash. Blobs are evicted least recently used
+    first once their total size exceeds max_bytes, so a very old reference
+    may no longer resolve.
+    """
+    def __init__(self, compress: bool = True, max_bytes: int = 32 * 1024 * 1024):
+        self.compress = compress
+        self.max_bytes = max_bytes
+        self._blobs: "OrderedDict[str, bytes]" = OrderedDict()
+        self._total_bytes = 0
+        self._dedup_hits = 0
+        self._lock = threading.Lock()
+
+    def put(self, payload: Any) -> str:
+        """
+        Store a payload and return its reference.
+        """
+        digest, blob = encode_payload(payload, self.compress)
+        with self._lock:
+            if digest in self._blobs:
+                self._blobs.move_to_end(digest)
+                self._dedup_hits += 1
+                return digest
+            self._blobs[digest] = blob
+            self._total_bytes += len(blob)
+            while len(self._blobs) > 1 and self._total_bytes > self.max_bytes:
+                _, evicted = self._blobs.popitem(last=False)
+                self._total_bytes -= len(evicted)
+        return digest
+
+    def get(self, ref: str) -> Optional[Any]:
+        """
+        Resolve a reference, or return None if it has been evicted.
+        """
+        with self._lock:
+            blob = self._blobs.get(ref)
+            if blob is None:
+                return None
+            self._blobs.move_to_end(ref)
+        return decode_payload(blob)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "blobs": len(self._blobs),
+                "bytes": self._total_bytes,
+                "dedup_hits": self._dedup_hits,
+                "compressed": self.compress
+            }
+
+
+class SQLiteToolResultStore:
+    """
+    Content-addressed tool results in a SQLite file shared by every worker.
+
+    Blobs not referenced again within ttl seconds are purged periodically.
+    """
+    def __init__(self, path: str, compress: bool = True, ttl: float = 86400, purge_every: int = 200):
+        self.path = path
+        self.compress = compress
+        self.ttl = ttl
+        self.purge_every = purge_every
+        self._writes = 0
+        self._local = threading.local()
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS tool_results ("
+            "ref TEXT PRIMARY KEY, blob BLOB NOT NULL, size INTEGER NOT NULL, used_at REAL NOT NULL)"
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def put(self, payload: Any) -> str:
+        digest, blob = encode_payload(payload, self.compress)
+        conn = self._connection()
+        now = time.time()
+        updated = conn.execute("UPDATE tool_results SET used_at = ? WHERE ref = ?", (now, digest)).rowcount
+        if not updated:
+            conn.execute(
+                "INSERT OR IGNORE INTO tool_results (ref, blob, size, used_at) VALUES (?, ?, ?, ?)",
+                (digest, blob, len(blob), now)
+            )
+        self._writes += 1
+        if self._writes % self.purge_every == 0:
+            conn.execute("DELETE FROM tool_results WHERE used_at <= ?", (now - self.ttl,))
+        return digest
+
+    def get(self, ref: str) -> Optional[Any]:
+        row = self._connection().execute("SELECT blob FROM tool_results WHERE ref = ?", (ref,)).fetchone()
+        return decode_payload(bytes(row[0])) if row else None
+
+    def stats(self) -> Dict[str, Any]:
+        count, total = self._connection().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM tool_results"
+        ).fetchone()
+        return {"blobs": count, "bytes": total, "compressed": self.compress}
+
+
+def build_tool_result_store():
+    """
+    Build the tool result store to match the conversation store backend.
+    """
+    compress = os.environ.get("TOOL_RESULTS_COMPRESS", "true").lower() in ("1", "true", "yes")
+    if os.environ.get("CONVERSATION_STORE", "memory").lower() == "sqlite":
+        return SQLiteToolResultStore(
+            os.environ.get("CONVERSATION_STORE_PATH", "/tmp/duke_conversations.db"),
+            compress=compress,
+            ttl=float(os.environ.get("CONVERSATION_TTL_SECONDS", 21600))
+        )
+    return InMemoryToolResultStore(
+        compress=compress,
+        max_bytes=int(os.environ.get("TOOL_RESULTS_MAX_BYTES", 32 * 1024 * 1024))
+    )
@@ -0,0 +1,57 @@
+# backend/tests/test_admission.py
+import asyncio
+import pytest
+from utils.admission import AdmissionController, AdmissionRejected, client_ip
+
+
+def test_client_ip_ignores_forwarded_header_without_trusted_proxies():
+    headers = {"X-Forwarded-For": "203.0.113.9"}
+    assert client_ip(headers, "10.0.0.1", trusted_proxies=0) == "10.0.0.1"
+
+
+def test_client_ip_takes_the_entry_added_by_the_trusted_proxy():
+    # The client controls everything left of what the proxy appended
+    headers = {"X-Forwarded-For": "1.2.3.4, 198.51.100.7"}
+    assert client_ip(headers, "10.0.0.1", trusted_proxies=1) == "198.51.100.7"
+    assert client_ip(headers, "10.0.0.1", trusted_proxies=2) == "1.2.3.4"
+
+
+def test_client_ip_falls_back_when_the_header_is_short():
+    assert client_ip({"X-Forwarded-For": "198.51.100.7"}, "10.0.0.1", trusted_proxies=2) == "10.0.0.1"
+    assert client_ip({}, "10.0.0.1", trusted_proxies=1) == "10.0.0.1"
+
+
+def test_check_rate_limits_each_conversation():
+    controller = AdmissionController(conversation_rpm=1, ip_rpm=0)
+    controller.check_rate("conv-1", "10.0.0.1")
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.check_rate("conv-1", "10.0.0.1")
+    assert rejected.value.status == 429
+    assert rejected.value.retry_after >= 1
+    controller.check_rate("conv-2", "10.0.0.1")
+
+
+def test_admit_sheds_when_the_queue_is_full():
+    controller = AdmissionController(max_in_flight=1, max_queue=0)
+    with controller.admit():
+        with pytest.raises(AdmissionRejected) as rejected:
+            with controller.admit():
+                pass
+    assert rejected.value.status == 503
+    assert controller.stats()["shed_queue_full"] == 1
+    assert controller.stats()["in_flight"] == 0
+
+
+def test_aadmit_times_out_and_frees_its_queue_place():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_queue=1, queue_timeout=0.05)
+        async with controller.aadmit():
+            with pytest.raises(AdmissionRejected):
+                async with controller.aadmit():
+                    pass
+        stats = controller.stats()
+        assert stats["shed_queue_timeout"] == 1
+        assert stats["queue_depth"] == 0
+        assert stats["in_flight"] == 0
+
+    asyncio.run(scenario())
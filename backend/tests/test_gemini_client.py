@@ -0,0 +1,57 @@
+# backend/tests/test_gemini_client.py
+import asyncio
+import pytest
+from utils.gemini_client import GeminiClient, GeminiError
+from utils.rate_limiter import GeminiRateLimiter
+
+
+@pytest.fixture
+def limiter():
+    return GeminiRateLimiter(max_concurrency=2, requests_per_minute=0, tokens_per_minute=0, acquire_timeout=1)
+
+
+@pytest.fixture
+def client(limiter, monkeypatch):
+    monkeypatch.setenv("GEMINI_MAX_RETRIES", "1")
+    monkeypatch.setenv("GEMINI_RETRY_BASE_DELAY", "0.01")
+    return GeminiClient(api_key="test", limiter=limiter)
+
+
+def test_cancelled_acall_releases_its_slot(client, limiter):
+    async def scenario():
+        async def hang():
+            await asyncio.sleep(10)
+
+        calls = [asyncio.ensure_future(client.acall(hang, 10)) for _ in range(2)]
+        await asyncio.sleep(0.1)
+        assert limiter.stats()["in_flight"] == 2
+        for call in calls:
+            call.cancel()
+        await asyncio.gather(*calls, return_exceptions=True)
+        assert limiter.stats()["in_flight"] == 0
+        assert await limiter.aacquire(10)
+
+    asyncio.run(scenario())
+
+
+def test_failed_acall_releases_its_slot(client, limiter):
+    async def scenario():
+        async def fail():
+            raise ValueError("bad request")
+
+        with pytest.raises(GeminiError):
+            await client.acall(fail, 10)
+        assert limiter.stats()["in_flight"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_acall_returns_the_response(client, limiter):
+    async def scenario():
+        async def ok():
+            return "response"
+
+        assert await client.acall(ok, 10) == "response"
+        assert limiter.stats()["in_flight"] == 0
+
+    asyncio.run(scenario())
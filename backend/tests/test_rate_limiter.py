@@ -0,0 +1,72 @@
+# backend/tests/test_rate_limiter.py
+import asyncio
+import time
+from utils.rate_limiter import GeminiRateLimiter, TokenBucket
+
+
+def test_token_bucket_takes_until_empty():
+    bucket = TokenBucket(per_minute=60, capacity=2)
+    assert bucket.try_take(1) == 0
+    assert bucket.try_take(1) == 0
+    wait = bucket.try_take(1)
+    assert 0 < wait <= 1.0
+
+
+def test_zero_rate_bucket_is_unlimited():
+    bucket = TokenBucket(per_minute=0)
+    assert all(bucket.try_take(1000) == 0 for _ in range(100))
+
+
+def test_acquire_times_out_when_slots_are_taken():
+    limiter = GeminiRateLimiter(max_concurrency=1, requests_per_minute=0, tokens_per_minute=0, acquire_timeout=0.05)
+    assert limiter.acquire(10)
+    assert not limiter.acquire(10)
+    limiter.release()
+    assert limiter.acquire(10)
+    assert limiter.stats()["throttled"] == 1
+
+
+def test_aacquire_cancelled_waiting_for_a_slot_takes_nothing():
+    async def scenario():
+        limiter = GeminiRateLimiter(max_concurrency=1, requests_per_minute=0, tokens_per_minute=0, acquire_timeout=10)
+        assert await limiter.aacquire(10)
+        waiter = asyncio.ensure_future(limiter.aacquire(10))
+        await asyncio.sleep(0.1)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        limiter.release()
+        assert limiter.stats()["in_flight"] == 0
+        assert limiter.semaphore.acquire(blocking=False)
+
+    asyncio.run(scenario())
+
+
+def test_aacquire_cancelled_waiting_for_tokens_releases_the_slot():
+    async def scenario():
+        limiter = GeminiRateLimiter(max_concurrency=1, requests_per_minute=1, tokens_per_minute=0, acquire_timeout=120)
+        assert await limiter.aacquire(10)
+        limiter.release()
+        # The request bucket is now empty for a minute, so this waits holding the slot
+        waiter = asyncio.ensure_future(limiter.aacquire(10))
+        await asyncio.sleep(0.1)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        assert limiter.stats()["in_flight"] == 0
+        assert limiter.semaphore.acquire(blocking=False)
+
+    asyncio.run(scenario())
+
+
+def test_aacquire_gives_up_when_tokens_come_after_the_timeout():
+    async def scenario():
+        limiter = GeminiRateLimiter(max_concurrency=2, requests_per_minute=1, tokens_per_minute=0, acquire_timeout=0.1)
+        assert await limiter.aacquire(10)
+        limiter.release()
+        start = time.monotonic()
+        assert not await limiter.aacquire(10)
+        assert time.monotonic() - start < 0.5
+        # The slot was handed back
+        assert limiter.semaphore.acquire(blocking=False)
+        assert limiter.semaphore.acquire(blocking=False)
+
+    asyncio.run(scenario())
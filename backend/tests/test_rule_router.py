@@ -0,0 +1,54 @@
+# backend/tests/test_rule_router.py
+import pytest
+from agents.rule_router import RuleBasedRouter, normalize
+
+
+@pytest.fixture
+def router():
+    return RuleBasedRouter()
+
+
+@pytest.mark.parametrize("query, tool", [
+    ("Tell me about the AI MEng program", "DukeAIMEngTool"),
+    ("dining options on East Campus", "DukeGeneralInfoTool"),
+    ("What's happening today?", "DukeEventsSearchTool"),
+])
+def test_in_scope_queries_take_the_fast_path(router, query, tool):
+    plan = router.try_route(query)
+    assert plan is not None
+    assert plan["tools"][0]["name"] == tool
+
+
+@pytest.mark.parametrize("query", [
+    "Is there a bus from NYC to Boston?",
+    "best gym workout for abs",
+    "What is Harvard tuition?",
+    "Where can I park at Duke?",
+])
+def test_out_of_scope_queries_fall_through(router, query):
+    assert router.try_route(query) is None
+
+
+def test_events_query_without_topic_omits_it(router):
+    plan = router.try_route("What's happening today?")
+    assert plan["tools"][0]["parameters"] == {"days": 1}
+
+
+def test_events_query_keeps_its_topic(router):
+    plan = router.route("career events today")
+    parameters = plan["tools"][0]["parameters"]
+    assert parameters["days"] == 1
+    assert parameters["topic"] == "career"
+
+
+def test_normalize_drops_possessives_and_punctuation():
+    assert normalize("What's on at Duke's East Campus?") == "what on at duke east campus"
+
+
+def test_stats_count_fast_path_and_fallthrough(router):
+    router.try_route("Tell me about the AI MEng program")
+    router.try_route("What is Harvard tuition?")
+    stats = router.stats()
+    assert stats["total"] == 2
+    assert stats["fast_path"] == 1
+    assert stats["fallthrough"] == 1
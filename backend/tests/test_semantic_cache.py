@@ -0,0 +1,81 @@
+# backend/tests/test_semantic_cache.py
+import time
+import pytest
+from utils.semantic_cache import SemanticAnswerCache, content_tokens
+
+
+@pytest.fixture
+def cache():
+    return SemanticAnswerCache()
+
+
+def answer(text):
+    return {"response": text, "thinking_explanation": None, "evaluation": None, "plan": {}}
+
+
+@pytest.mark.parametrize("stored, asked", [
+    ("What are the dining options on East Campus?", "What are the dining options on West Campus?"),
+    ("How much is tuition for the AI MEng program?", "How much is tuition for the ECE MEng program?"),
+    ("What events are on today?", "What events are on tomorrow?"),
+    ("Where is the Perkins library?", "Where is the Lilly library?"),
+])
+def test_different_entities_miss(cache, stored, asked):
+    cache.store(stored, answer("stored"))
+    assert cache.lookup(asked) is None
+
+
+@pytest.mark.parametrize("stored, asked", [
+    ("dining options", "what are the dining options"),
+    ("What are the dining options?", "Duke dining options"),
+    ("Where can I park at Duke?", "where can i park"),
+    ("Tell me about the AI MEng program", "What is the AI MEng program?"),
+    ("library hours", "What are the library hours?"),
+])
+def test_paraphrases_hit(cache, stored, asked):
+    cache.store(stored, answer("stored"))
+    hit = cache.lookup(asked)
+    assert hit is not None
+    assert hit["response"] == "stored"
+    assert hit["cached_query"] == stored
+
+
+def test_best_match_among_same_content(cache):
+    cache.store("East Campus dining", answer("east"))
+    cache.store("West Campus dining", answer("west"))
+    assert cache.lookup("dining on West Campus")["response"] == "west"
+    assert cache.lookup("dining on East Campus")["response"] == "east"
+
+
+def test_stopword_only_query_is_not_cached(cache):
+    cache.store("what is it", answer("stored"))
+    assert cache.stats()["entries"] == 0
+    assert cache.lookup("what is it") is None
+
+
+def test_identical_query_replaces_entry(cache):
+    cache.store("Duke dining options", answer("old"))
+    cache.store("duke dining options?", answer("new"))
+    assert cache.stats()["entries"] == 1
+    assert cache.lookup("Duke dining options")["response"] == "new"
+
+
+def test_expired_entry_misses(cache):
+    cache.store("library hours", answer("stored"), ttl=0.01)
+    time.sleep(0.02)
+    assert cache.lookup("library hours") is None
+
+
+def test_persisted_entries_reload(tmp_path):
+    path = str(tmp_path / "answers.json")
+    first = SemanticAnswerCache(path=path)
+    first.store("East Campus dining", answer("east"))
+    first.save()
+    second = SemanticAnswerCache(path=path)
+    assert second.lookup("dining on East Campus")["response"] == "east"
+    assert second.lookup("dining on West Campus") is None
+
+
+def test_content_tokens_fold_plurals_and_stopwords():
+    assert content_tokens("What are the dining options at Duke?") == ["dining", "option"]
+    assert content_tokens("Which libraries are open?") == ["library", "open"]
+    assert content_tokens("campus bus") == ["bus", "campus"]
@@ -3,6 +3,7 @@ import requests
 import os
 from langchain_core.tools import BaseTool
 from typing import Dict, Any, Optional
+from utils.http_client import ASYNC_REQUEST_ERRORS, get_http_client, get_async_http_client
 from pydantic import Field  # Add this import
 
 class DukeAIMEngTool(BaseTool):
@@ -12,8 +13,10 @@ class DukeAIMEngTool(BaseTool):
     description: str = "Search for specific information about Duke's AI MEng program"
     api_key: str = Field(default="")  # Define field with default
     cx: str = Field(default="40ad5871d1ccf4b4e")  # Define field with default
+    search_url: str = Field(default="https://www.googleapis.com/customsearch/v1")
     
-    def __init__(self, api_key: Optional[str] = None, cx: Optional[str] = None, **kwargs: Any):
+    def __init__(self, api_key: Optional[str] = None, cx: Optional[str] = None, search_url: Optional[str] = None,
+                 **kwargs: Any):
         """Initialize the Duke AI MEng Tool."""
         api_key_val = api_key or os.environ.get("GOOGLE_API_KEY")
         cx_val = cx or "40ad5871d1ccf4b4e"  # Your PSE ID
@@ -22,48 +25,61 @@ class DukeAIMEngTool(BaseTool):
             raise ValueError("Google API key not provided or found in environment")
         
         # Pass the values to the parent class constructor
+        if search_url:
+            kwargs["search_url"] = search_url
         super().__init__(api_key=api_key_val, cx=cx_val, **kwargs)
     
-    def _run(self, query: str) -> Dict[str, Any]:
-        """Search for information about Duke's AI MEng program using Google PSE."""
+    def build_params(self, query: str) -> Dict[str, str]:
+        """Build the Custom Search query parameters."""
         # Format query to specifically target Duke AI MEng content
         enhanced_query = f"Duke University AI MEng {query}"
         
-        # Build URL for Google Custom Search API
-        url = "https://www.googleapis.com/customsearch/v1"
-        
-        params = {
+        return {
             "q": enhanced_query,
             "key": self.api_key,
             "cx": self.cx
         }
+    
+    def format_results(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Extract and format the search results."""
+        results = []
+        if "items" in data:
+            results = [{
+                "title": item.get("title", ""),
+                "link": item.get("link", ""),
+                "snippet": item.get("snippet", "")
+            } for item in data["items"]]
         
+        return {
+            "status": "success",
+            "data": {
+                "results": results,
+                "total": len(results)
+            },
+            "source": "DukeAIMEngTool"
+        }
+    
+    def error_result(self, error: Exception) -> Dict[str, Any]:
+        return {
+            "status": "error",
+            "message": str(error),
+            "source": "DukeAIMEngTool"
+        }
+    
+    def _run(self, query: str) -> Dict[str, Any]:
+        """Search for information about Duke's AI MEng program using Google PSE."""
         try:
-            response = requests.get(url, params=params)
+            # Google Custom Search API
+            response = get_http_client().get(self.search_url, params=self.build_params(query))
             response.raise_for_status()
             
-            data = response.json()
-            
-            # Extract and format results
-            results = []
-            if "items" in data:
-                results = [{
-                    "title": item.get("title", ""),
-                    "link": item.get("link", ""),
-                    "snippet": item.get("snippet", "")
-                } for item in data["items"]]
-            
-            return {
-                "status": "success",
-                "data": {
-                    "results": results,
-                    "total": len(results)
-                },
-                "source": "DukeAIMEngTool"
-            }
+            return self.format_results(response.json())
         except requests.exceptions.RequestException as e:
-            return {
-                "status": "error",
-                "message": str(e),
-                "source": "DukeAIMEngTool"
-            }
\ No newline at end of file
+            return self.error_result(e)
+    
+    async def _arun(self, query: str) -> Dict[str, Any]:
+        """Async implementation of the tool, on the shared aiohttp session."""
+        try:
+            return self.format_results(await get_async_http_client().get_json(self.search_url, params=self.build_params(query)))
+        except ASYNC_REQUEST_ERRORS as e:
+            return self.error_result(e)
@@ -1,6 +1,7 @@
 import requests
 from langchain_core.tools import BaseTool
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
+from utils.http_client import ASYNC_REQUEST_ERRORS, get_http_client, get_async_http_client
 import json
 
 class DukeEventsSearchTool(BaseTool):
@@ -22,18 +23,8 @@ class DukeEventsSearchTool(BaseTool):
         super().__init__(api_url=api_url, auth_token=auth_token, **kwargs)
         # Pydantic/BaseModel handles assigning api_url and auth_token now
     
-    def _run(self, topic: str, days: int = 7, limit: int = 5) -> Dict[str, Any]:
-        """
-        Search for current events at Duke University.
-        
-        Args:
-            topic: The topic to search for (e.g., 'career', 'academic', 'social')
-            days: Number of days to look ahead (default: 7)
-            limit: Maximum number of events to return (default: 5)
-            
-        Returns:
-            A dictionary containing the search results
-        """
+    def build_request(self, topic: Optional[str], days: int, limit: int) -> Tuple[Dict[str, str], Dict[str, Any]]:
+        """Build the headers and JSON payload for a search."""
         headers = {
             "Content-Type": "application/json"
         }
@@ -42,32 +33,59 @@ class DukeEventsSearchTool(BaseTool):
             headers["Authorization"] = f"Bearer {self.auth_token}"
         
         payload = {
-            "topic": topic,
             "days": days,
             "limit": limit
         }
+        # Without a topic the API returns events of every topic
+        if topic:
+            payload["topic"] = topic
+        return headers, payload
+    
+    def success_result(self, results: Any, payload: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "status": "success",
+            "data": results,
+            "source": "DukeEventsSearchTool",
+            "query_params": payload
+        }
+    
+    def error_result(self, error: Exception, payload: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "status": "error",
+            "message": str(error),
+            "source": "DukeEventsSearchTool",
+            "query_params": payload
+        }
+    
+    def _run(self, topic: Optional[str] = None, days: int = 7, limit: int = 5) -> Dict[str, Any]:
+        """
+        Search for current events at Duke University.
+        
+        Args:
+            topic: The topic to search for (e.g., 'career', 'academic', 'social'); all topics if omitted
+            days: Number of days to look ahead (default: 7)
+            limit: Maximum number of events to return (default: 5)
+            
+        Returns:
+            A dictionary containing the search results
+        """
+        headers, payload = self.build_request(topic, days, limit)
         
         try:
-            response = requests.post(self.api_url, headers=headers, json=payload)
+            response = get_http_client().post(self.api_url, headers=headers, json=payload)
             response.raise_for_status()
             
             results = response.json()
-            return {
-                "status": "success",
-                "data": results,
-                "source": "DukeEventsSearchTool",
-                "query_params": payload
-            }
+            return self.success_result(results, payload)
         except requests.exceptions.RequestException as e:
-            return {
-                "status": "error",
-                "message": str(e),
-                "source": "DukeEventsSearchTool",
-                "query_params": payload
-            }
+            return self.error_result(e, payload)
     
-    def _arun(self, topic: str, days: int = 7, limit: int = 5) -> Dict[str, Any]:
-        """Async implementation of the tool."""
-        # This would be an async implementation in a real application
-        # For simplicity, we're just calling the sync method
-        return self._run(topic, days, limit)
\ No newline at end of file
+    async def _arun(self, topic: Optional[str] = None, days: int = 7, limit: int = 5) -> Dict[str, Any]:
+        """Async implementation of the tool, on the shared aiohttp session."""
+        headers, payload = self.build_request(topic, days, limit)
+        
+        try:
+            results = await get_async_http_client().post_json(self.api_url, headers=headers, json=payload)
+            return self.success_result(results, payload)
+        except ASYNC_REQUEST_ERRORS as e:
+            return self.error_result(e, payload)
@@ -1,6 +1,7 @@
 import requests
 from langchain_core.tools import BaseTool
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
+from utils.http_client import ASYNC_REQUEST_ERRORS, get_http_client, get_async_http_client
 import json
 from datetime import datetime, timedelta
 
@@ -23,19 +24,9 @@ class DukeFutureEventsSearchTool(BaseTool):
         super().__init__(api_url=api_url, auth_token=auth_token, **kwargs)
         # Pydantic/BaseModel handles assigning api_url and auth_token now
     
-    def _run(self, keyword: str, start_date: Optional[str] = None, end_date: Optional[str] = None, limit: int = 5) -> Dict[str, Any]:
-        """
-        Search for future events at Duke University.
-        
-        Args:
-            keyword: The keyword to search for (e.g., 'career', 'seminar')
-            start_date: Start date in 'YYYY-MM-DD' format (default: today)
-            end_date: End date in 'YYYY-MM-DD' format (default: 30 days from start_date)
-            limit: Maximum number of events to return (default: 5)
-            
-        Returns:
-            A dictionary containing the search results
-        """
+    def build_request(self, keyword: Optional[str], start_date: Optional[str], end_date: Optional[str],
+                      limit: int) -> Tuple[Dict[str, str], Dict[str, Any]]:
+        """Build the headers and JSON payload for a search, filling in the default dates."""
         headers = {
             "Content-Type": "application/json"
         }
@@ -52,33 +43,61 @@ class DukeFutureEventsSearchTool(BaseTool):
             end_date = end_date_obj.strftime("%Y-%m-%d")
         
         payload = {
-            "keyword": keyword,
             "startDate": start_date,
             "endDate": end_date,
             "limit": limit
         }
+        # Without a keyword the API returns every event in the date range
+        if keyword:
+            payload["keyword"] = keyword
+        return headers, payload
+    
+    def success_result(self, results: Any, payload: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "status": "success",
+            "data": results,
+            "source": "DukeFutureEventsSearchTool",
+            "query_params": payload
+        }
+    
+    def error_result(self, error: Exception, payload: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "status": "error",
+            "message": str(error),
+            "source": "DukeFutureEventsSearchTool",
+            "query_params": payload
+        }
+    
+    def _run(self, keyword: Optional[str] = None, start_date: Optional[str] = None, end_date: Optional[str] = None, limit: int = 5) -> Dict[str, Any]:
+        """
+        Search for future events at Duke University.
+        
+        Args:
+            keyword: The keyword to search for (e.g., 'career', 'seminar'); any event if omitted
+            start_date: Start date in 'YYYY-MM-DD' format (default: today)
+            end_date: End date in 'YYYY-MM-DD' format (default: 30 days from start_date)
+            limit: Maximum number of events to return (default: 5)
+            
+        Returns:
+            A dictionary containing the search results
+        """
+        headers, payload = self.build_request(keyword, start_date, end_date, limit)
         
         try:
-            response = requests.post(self.api_url, headers=headers, json=payload)
+            response = get_http_client().post(self.api_url, headers=headers, json=payload)
             response.raise_for_status()
             
             results = response.json()
-            return {
-                "status": "success",
-                "data": results,
-                "source": "DukeFutureEventsSearchTool",
-                "query_params": payload
-            }
+            return self.success_result(results, payload)
         except requests.exceptions.RequestException as e:
-            return {
-                "status": "error",
-                "message": str(e),
-                "source": "DukeFutureEventsSearchTool",
-                "query_params": payload
-            }
+            return self.error_result(e, payload)
     
-    def _arun(self, keyword: str, start_date: Optional[str] = None, end_date: Optional[str] = None, limit: int = 5) -> Dict[str, Any]:
-        """Async implementation of the tool."""
-        # This would be an async implementation in a real application
-        # For simplicity, we're just calling the sync method
-        return self._run(keyword, start_date, end_date, limit)
\ No newline at end of file
+    async def _arun(self, keyword: Optional[str] = None, start_date: Optional[str] = None, end_date: Optional[str] = None, limit: int = 5) -> Dict[str, Any]:
+        """Async implementation of the tool, on the shared aiohttp session."""
+        headers, payload = self.build_request(keyword, start_date, end_date, limit)
+        
+        try:
+            results = await get_async_http_client().post_json(self.api_url, headers=headers, json=payload)
+            return self.success_result(results, payload)
+        except ASYNC_REQUEST_ERRORS as e:
+            return self.error_result(e, payload)
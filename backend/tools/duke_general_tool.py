@@ -1,6 +1,7 @@
 import requests
 from langchain_core.tools import BaseTool
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
+from utils.http_client import ASYNC_REQUEST_ERRORS, get_http_client, get_async_http_client
 
 class DukeGeneralInfoTool(BaseTool):
     """Tool for searching general information about Duke University."""
@@ -21,16 +22,8 @@ class DukeGeneralInfoTool(BaseTool):
         super().__init__(api_url=api_url, auth_token=auth_token, **kwargs)
         # Pydantic/BaseModel handles assigning api_url and auth_token now
     
-    def _run(self, query: str) -> Dict[str, Any]:
-        """
-        Search for general information about Duke University.
-        
-        Args:
-            query: The query to search for (e.g., 'AI MEng program', 'dining options')
-            
-        Returns:
-            A dictionary containing the search results
-        """
+    def build_request(self, query: str) -> Tuple[Dict[str, str], Dict[str, Any]]:
+        """Build the headers and JSON payload for a search."""
         headers = {
             "Content-Type": "application/json"
         }
@@ -41,28 +34,51 @@ class DukeGeneralInfoTool(BaseTool):
         payload = {
             "query": query
         }
+        return headers, payload
+    
+    def success_result(self, results: Any, payload: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "status": "success",
+            "data": results,
+            "source": "DukeGeneralInfoTool",
+            "query_params": payload
+        }
+    
+    def error_result(self, error: Exception, payload: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "status": "error",
+            "message": str(error),
+            "source": "DukeGeneralInfoTool",
+            "query_params": payload
+        }
+    
+    def _run(self, query: str) -> Dict[str, Any]:
+        """
+        Search for general information about Duke University.
+        
+        Args:
+            query: The query to search for (e.g., 'AI MEng program', 'dining options')
+            
+        Returns:
+            A dictionary containing the search results
+        """
+        headers, payload = self.build_request(query)
         
         try:
-            response = requests.post(self.api_url, headers=headers, json=payload)
+            response = get_http_client().post(self.api_url, headers=headers, json=payload)
             response.raise_for_status()
             
             results = response.json()
-            return {
-                "status": "success",
-                "data": results,
-                "source": "DukeGeneralInfoTool",
-                "query_params": payload
-            }
+            return self.success_result(results, payload)
         except requests.exceptions.RequestException as e:
-            return {
-                "status": "error",
-                "message": str(e),
-                "source": "DukeGeneralInfoTool",
-                "query_params": payload
-            }
+            return self.error_result(e, payload)
     
-    def _arun(self, query: str) -> Dict[str, Any]:
-        """Async implementation of the tool."""
-        # This would be an async implementation in a real application
-        # For simplicity, we're just calling the sync method
-        return self._run(query)
\ No newline at end of file
+    async def _arun(self, query: str) -> Dict[str, Any]:
+        """Async implementation of the tool, on the shared aiohttp session."""
+        headers, payload = self.build_request(query)
+        
+        try:
+            results = await get_async_http_client().post_json(self.api_url, headers=headers, json=payload)
+            return self.success_result(results, payload)
+        except ASYNC_REQUEST_ERRORS as e:
+            return self.error_result(e, payload)
@@ -0,0 +1,102 @@
+# backend/tools/registry.py
+import os
+import threading
+from langchain_core.tools import BaseTool
+from typing import Dict, List, Optional
+from tools.duke_events_tool import DukeEventsSearchTool
+from tools.duke_future_events_tool import DukeFutureEventsSearchTool
+from tools.duke_general_tool import DukeGeneralInfoTool
+from tools.duke_ai_meng_tool import DukeAIMEngTool
+
+
+class ToolRegistry:
+    """
+    Thread-safe registry of tool instances shared across requests.
+
+    The registry is built once at startup and handed to the planning agent and
+    the tool execution node, so tools (and any connection pools or caches they
+    hold) live for the lifetime of the process.
+    """
+    def __init__(self, tools: Optional[List[BaseTool]] = None):
+        self._lock = threading.RLock()
+        self._tools: Dict[str, BaseTool] = {}
+        for tool in tools or []:
+            self.register(tool)
+
+    def register(self, tool: BaseTool, replace: bool = False) -> None:
+        """
+        Register a tool under its name.
+
+        Args:
+            tool: The tool instance to register
+            replace: Whether an existing tool with the same name may be replaced
+        """
+        with self._lock:
+            if tool.name in self._tools and not replace:
+                raise ValueError(f"Tool already registered: {tool.name}")
+            self._tools[tool.name] = tool
+
+    def unregister(self, name: str) -> Optional[BaseTool]:
+        """
+        Remove a tool from the registry and return it, if present.
+        """
+        with self._lock:
+            return self._tools.pop(name, None)
+
+    def get(self, name: str) -> Optional[BaseTool]:
+        """
+        Get a tool by name.
+        """
+        with self._lock:
+            return self._tools.get(name)
+
+    def __contains__(self, name: str) -> bool:
+        with self._lock:
+            return name in self._tools
+
+    def names(self) -> List[str]:
+        """
+        Get the names of all registered tools.
+        """
+        with self._lock:
+            return list(self._tools)
+
+    def tools(self) -> List[BaseTool]:
+        """
+        Get all registered tool instances.
+        """
+        with self._lock:
+            return list(self._tools.values())
+
+    def snapshot(self) -> Dict[str, BaseTool]:
+        """
+        Get a point-in-time copy of the name to tool mapping.
+        """
+        with self._lock:
+            return dict(self._tools)
+
+
+def build_default_registry() -> ToolRegistry:
+    """
+    Build the registry of Duke tools from the environment.
+    """
+    auth_token = os.environ.get("DUKE_API_AUTH_TOKEN")
+    return ToolRegistry([
+        DukeEventsSearchTool(
+            api_url=os.environ.get("DUKE_EVENTS_API_URL", "https://dukeevents-695116221974.us-central1.run.app"),
+            auth_token=auth_token
+        ),
+        DukeFutureEventsSearchTool(
+            api_url=os.environ.get("DUKE_FUTURE_EVENTS_API_URL", "https://dukeeventsfuture-695116221974.us-central1.run.app"),
+            auth_token=auth_token
+        ),
+        DukeGeneralInfoTool(
+            api_url=os.environ.get("DUKE_GENERAL_API_URL", "https://dukegeneral-695116221974.us-central1.run.app"),
+            auth_token=auth_token
+        ),
+        DukeAIMEngTool(
+            api_key=os.environ.get("GOOGLE_API_KEY"),
+            cx="40ad5871d1ccf4b4e",  # Your Programmable Search Engine ID
+            search_url=os.environ.get("GOOGLE_PSE_URL")
+        )
+    ])
@@ -0,0 +1,273 @@
+# backend/utils/admission.py
+import os
+import math
+import time
+import asyncio
+import threading
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict, Any, AsyncIterator, Iterator, Mapping, Optional
+from utils.rate_limiter import TokenBucket
+
+# Proxies in front of the app that append to X-Forwarded-For (0: use the peer address)
+TRUSTED_PROXY_COUNT = int(os.environ.get("TRUSTED_PROXY_COUNT", 0))
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is shed (503) or over a client's rate limit (429)."""
+
+    def __init__(self, message: str, status: int, reason: str, retry_after: float):
+        super().__init__(message)
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def client_ip(headers: Mapping[str, str], remote_addr: Optional[str],
+              trusted_proxies: Optional[int] = None) -> Optional[str]:
+    """
+    The client's IP address for the per-IP rate limit.
+
+    Clients can put anything at the start of X-Forwarded-For, so only the entry
+    appended by our outermost trusted proxy is used: the trusted_proxies-th from
+    the right (default: TRUSTED_PROXY_COUNT, 1 behind Cloud Run's front end).
+    Without a trusted proxy, or when the header is shorter than that, the peer
+    address is used.
+    """
+    if trusted_proxies is None:
+        trusted_proxies = TRUSTED_PROXY_COUNT
+    if trusted_proxies <= 0:
+        return remote_addr
+    forwarded = [entry.strip() for entry in headers.get("X-Forwarded-For", "").split(",") if entry.strip()]
+    if len(forwarded) < trusted_proxies:
+        return remote_addr
+    return forwarded[-trusted_proxies]
+
+
+class KeyedRateLimiter:
+    """
+    One token bucket per key (conversation, client IP), LRU-bounded so idle keys are dropped.
+    """
+    def __init__(self, per_minute: float, burst: Optional[float] = None, max_keys: int = 10000):
+        self.per_minute = per_minute
+        self.burst = burst or per_minute
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def try_take(self, key: str) -> float:
+        """
+        Returns:
+            0 if the request is allowed, otherwise the seconds until it would be
+        """
+        if not self.per_minute or not key:
+            return 0.0
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(self.per_minute, self.burst)
+                while len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            self._buckets.move_to_end(key)
+        return bucket.try_take(1)
+
+    def size(self) -> int:
+        with self._lock:
+            return len(self._buckets)
+
+
+class AdmissionController:
+    """
+    Admission control in front of the agent workflow.
+
+    At most max_in_flight requests run the workflow at once; up to max_queue
+    more wait up to queue_timeout seconds for a slot, and anything beyond that
+    is rejected immediately with a Retry-After estimate instead of slowing
+    every request down. Requests admitted while the pod is under pressure
+    (slots in use plus queued at or above degrade_at of max_in_flight) are
+    marked degraded, which skips the thinking explanation and the evaluation.
+    Per-conversation and per-IP token buckets reject clients sending faster
+    than their share with 429.
+    """
+    def __init__(self, max_in_flight: int = 16, max_queue: int = 32, queue_timeout: float = 5.0,
+                 degrade_at: float = 0.75, conversation_rpm: float = 20, ip_rpm: float = 120):
+        """
+        Initialize the controller.
+
+        Args:
+            max_in_flight: Requests allowed to run the workflow at once
+            max_queue: Requests allowed to wait for a slot; 0 rejects as soon as all slots are taken
+            queue_timeout: Seconds a queued request waits before it is rejected
+            degrade_at: Load (in flight plus queued, as a fraction of max_in_flight) from which
+                        requests are admitted in degraded mode; 0 disables degraded mode
+            conversation_rpm: Requests per minute allowed per conversation (0 for no limit)
+            ip_rpm: Requests per minute allowed per client IP (0 for no limit)
+        """
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.degrade_at = degrade_at
+        self.conversations = KeyedRateLimiter(conversation_rpm)
+        self.ips = KeyedRateLimiter(ip_rpm)
+        self._in_flight = 0
+        self._queued = 0
+        self._condition = threading.Condition()
+        # Moving average of how long an admitted request holds its slot, for Retry-After
+        self._avg_service_s = 2.0
+        self._stats = {"admitted": 0, "degraded": 0, "queued": 0, "shed_queue_full": 0,
+                       "shed_queue_timeout": 0, "rate_limited_conversation": 0, "rate_limited_ip": 0}
+
+    def check_rate(self, conversation_id: Optional[str], client_ip: Optional[str]) -> None:
+        """
+        Apply the per-conversation and per-IP rate limits.
+
+        Raises:
+            AdmissionRejected: With status 429 when either limit is exceeded
+        """
+        for limiter, key, name in ((self.conversations, conversation_id, "conversation"), (self.ips, client_ip, "ip")):
+            wait = limiter.try_take(key)
+            if wait:
+                self._count(f"rate_limited_{name}")
+                raise AdmissionRejected(f"Too many requests for this {name}", 429, f"rate_limited_{name}",
+                                        retry_after=math.ceil(wait))
+
+    @contextmanager
+    def admit(self) -> Iterator[bool]:
+        """
+        Hold a workflow slot for the duration of the block.
+
+        Yields:
+            Whether the request should run in degraded mode
+
+        Raises:
+            AdmissionRejected: With status 503 when the queue is full or the wait times out
+        """
+        with self._condition:
+            if self._must_queue():
+                self._enqueue()
+                try:
+                    admitted = self._condition.wait_for(lambda: self._in_flight < self.max_in_flight,
+                                                        timeout=self.queue_timeout)
+                finally:
+                    self._queued -= 1
+                if not admitted:
+                    raise self._shed("shed_queue_timeout")
+            degraded = self._take_slot()
+        start = time.monotonic()
+        try:
+            yield degraded
+        finally:
+            self._release(start)
+
+    @asynccontextmanager
+    async def aadmit(self) -> AsyncIterator[bool]:
+        """
+        Async variant of admit() that waits without blocking the event loop.
+        """
+        with self._condition:
+            queued = self._must_queue()
+            if queued:
+                self._enqueue()
+            else:
+                degraded = self._take_slot()
+        if queued:
+            deadline = time.monotonic() + self.queue_timeout
+            try:
+                # Slots are shared with threads, so poll rather than wait on the condition
+                while True:
+                    with self._condition:
+                        if self._in_flight < self.max_in_flight:
+                            degraded = self._take_slot()
+                            break
+                    if time.monotonic() >= deadline:
+                        raise self._shed("shed_queue_timeout")
+                    await asyncio.sleep(0.02)
+            finally:
+                with self._condition:
+                    self._queued -= 1
+        start = time.monotonic()
+        try:
+            yield degraded
+        finally:
+            self._release(start)
+
+    def _must_queue(self) -> bool:
+        # Called with the condition held; new arrivals do not jump ahead of waiting requests
+        return self._in_flight >= self.max_in_flight or self._queued > 0
+
+    def _enqueue(self) -> None:
+        # Called with the condition held
+        if self._queued >= self.max_queue:
+            raise self._shed("shed_queue_full")
+        self._queued += 1
+        self._stats["queued"] += 1
+
+    def _take_slot(self) -> bool:
+        # Called with the condition held
+        load = (self._in_flight + self._queued) / self.max_in_flight
+        degraded = bool(self.degrade_at) and load >= self.degrade_at
+        self._in_flight += 1
+        self._stats["admitted"] += 1
+        if degraded:
+            self._stats["degraded"] += 1
+        return degraded
+
+    def _release(self, start: float) -> None:
+        with self._condition:
+            self._in_flight -= 1
+            self._avg_service_s = 0.9 * self._avg_service_s + 0.1 * (time.monotonic() - start)
+            self._condition.notify()
+
+    def _shed(self, reason: str) -> AdmissionRejected:
+        self._count(reason)
+        return AdmissionRejected("The assistant is overloaded, please try again shortly", 503, reason,
+                                 retry_after=self.retry_after())
+
+    def _count(self, field: str) -> None:
+        # The condition's lock is reentrant, so this is safe from code already holding it
+        with self._condition:
+            self._stats[field] += 1
+
+    def retry_after(self) -> int:
+        """
+        Estimate the seconds until a new request could get a slot: the queue ahead of
+        it drained at max_in_flight requests per average service time.
+        """
+        waves = (self._queued + 1) / self.max_in_flight
+        return max(1, min(60, math.ceil(waves * self._avg_service_s)))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._condition:
+            return {
+                **self._stats,
+                "in_flight": self._in_flight,
+                "queue_depth": self._queued,
+                "max_in_flight": self.max_in_flight,
+                "max_queue": self.max_queue,
+                "avg_service_ms": int(self._avg_service_s * 1000),
+                "rate_limited_keys": {"conversations": self.conversations.size(), "ips": self.ips.size()}
+            }
+
+
+def build_admission_controller(default_max_in_flight: int = 16) -> Optional[AdmissionController]:
+    """
+    Build an admission controller from the environment, or None when ADMISSION_ENABLED=false.
+
+    ADMISSION_MAX_IN_FLIGHT (default: default_max_in_flight, which should match the
+    server's concurrency, e.g. gunicorn's --threads) and ADMISSION_MAX_QUEUE bound
+    the workflow slots and waiting requests; ADMISSION_QUEUE_TIMEOUT is how long a
+    request may wait; ADMISSION_DEGRADE_AT is the load fraction from which thinking
+    and evaluation are skipped; ADMISSION_CONVERSATION_RPM and ADMISSION_IP_RPM are
+    the per-client rate limits.
+    """
+    if os.environ.get("ADMISSION_ENABLED", "true").lower() != "true":
+        return None
+    max_in_flight = int(os.environ.get("ADMISSION_MAX_IN_FLIGHT", default_max_in_flight))
+    return AdmissionController(
+        max_in_flight=max_in_flight,
+        max_queue=int(os.environ.get("ADMISSION_MAX_QUEUE", max_in_flight * 2)),
+        queue_timeout=float(os.environ.get("ADMISSION_QUEUE_TIMEOUT", 5)),
+        degrade_at=float(os.environ.get("ADMISSION_DEGRADE_AT", 0.75)),
+        conversation_rpm=float(os.environ.get("ADMISSION_CONVERSATION_RPM", 20)),
+        ip_rpm=float(os.environ.get("ADMISSION_IP_RPM", 120))
+    )
@@ -0,0 +1,162 @@
+# backend/utils/circuit_breaker.py
+import os
+import time
+import threading
+from collections import deque
+from typing import Dict, Any, Optional
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker for one upstream (a Duke tool endpoint).
+
+    Outcomes of the last window calls are kept; once at least min_calls are
+    recorded and the share of failures reaches failure_rate, or the share of
+    calls slower than slow_call_seconds reaches slow_call_rate, the breaker
+    opens and calls are refused for open_seconds. It then lets
+    half_open_probes calls through: a successful probe closes it again, a
+    failed or slow one reopens it.
+    """
+    def __init__(self, name: str, failure_rate: float = 0.5, slow_call_seconds: float = 5.0,
+                 slow_call_rate: float = 0.8, window: int = 20, min_calls: int = 5,
+                 open_seconds: float = 30.0, half_open_probes: int = 1):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        # (failed, slow) per call, newest last
+        self._calls: "deque[tuple]" = deque(maxlen=window)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        self._lock = threading.Lock()
+        self._stats = {"opened": 0, "rejected": 0}
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state(time.monotonic())
+
+    def _current_state(self, now: float) -> str:
+        # Called with the lock held
+        if self._state == OPEN and now - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._probes = 0
+        return self._state
+
+    def allow(self) -> bool:
+        """
+        Whether a call may go to the upstream now. Every allowed call must be
+        followed by record().
+        """
+        with self._lock:
+            state = self._current_state(time.monotonic())
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and self._probes < self.half_open_probes:
+                self._probes += 1
+                return True
+            self._stats["rejected"] += 1
+            return False
+
+    def record(self, success: bool, duration: float) -> None:
+        """
+        Record the outcome of an allowed call.
+
+        Args:
+            success: Whether the upstream returned a usable result
+            duration: Seconds the call took
+        """
+        slow = duration >= self.slow_call_seconds
+        with self._lock:
+            state = self._current_state(time.monotonic())
+            if state == OPEN:
+                # A call that started before the breaker opened
+                return
+            if state == HALF_OPEN:
+                self._probes = max(0, self._probes - 1)
+                if success and not slow:
+                    self._state = CLOSED
+                    self._calls.clear()
+                else:
+                    self._open()
+                return
+            self._calls.append((not success, slow))
+            if self._state == CLOSED and len(self._calls) >= self.min_calls:
+                failures = sum(1 for failed, _ in self._calls if failed) / len(self._calls)
+                slow_calls = sum(1 for _, was_slow in self._calls if was_slow) / len(self._calls)
+                if failures >= self.failure_rate or slow_calls >= self.slow_call_rate:
+                    self._open()
+
+    def _open(self) -> None:
+        # Called with the lock held
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self._calls.clear()
+        self._stats["opened"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            now = time.monotonic()
+            state = self._current_state(now)
+            calls = len(self._calls)
+            return {
+                "state": state,
+                "failure_rate": round(sum(1 for failed, _ in self._calls if failed) / calls, 3) if calls else 0.0,
+                "slow_call_rate": round(sum(1 for _, slow in self._calls if slow) / calls, 3) if calls else 0.0,
+                "calls_in_window": calls,
+                "retry_in_s": round(max(0.0, self.open_seconds - (now - self._opened_at)), 1) if state == OPEN else 0.0,
+                **self._stats
+            }
+
+
+class CircuitBreakerSet:
+    """
+    One CircuitBreaker per upstream name, created on first use with shared settings.
+    """
+    def __init__(self, **settings: Any):
+        self.settings = settings
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(name)
+            if breaker is None:
+                breaker = self._breakers[name] = CircuitBreaker(name, **self.settings)
+            return breaker
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return {breaker.name: breaker.stats() for breaker in breakers}
+
+
+def build_circuit_breakers() -> Optional[CircuitBreakerSet]:
+    """
+    Build the per-tool circuit breakers from the environment, or None when
+    CIRCUIT_BREAKER_ENABLED=false.
+
+    CIRCUIT_BREAKER_FAILURE_RATE and CIRCUIT_BREAKER_SLOW_CALL_RATE (with
+    CIRCUIT_BREAKER_SLOW_CALL_SECONDS) are the thresholds over the last
+    CIRCUIT_BREAKER_WINDOW calls, of which at least CIRCUIT_BREAKER_MIN_CALLS
+    are needed; an open breaker probes again after CIRCUIT_BREAKER_OPEN_SECONDS.
+    """
+    if os.environ.get("CIRCUIT_BREAKER_ENABLED", "true").lower() != "true":
+        return None
+    return CircuitBreakerSet(
+        failure_rate=float(os.environ.get("CIRCUIT_BREAKER_FAILURE_RATE", 0.5)),
+        slow_call_seconds=float(os.environ.get("CIRCUIT_BREAKER_SLOW_CALL_SECONDS", 5)),
+        slow_call_rate=float(os.environ.get("CIRCUIT_BREAKER_SLOW_CALL_RATE", 0.8)),
+        window=int(os.environ.get("CIRCUIT_BREAKER_WINDOW", 20)),
+        min_calls=int(os.environ.get("CIRCUIT_BREAKER_MIN_CALLS", 5)),
+        open_seconds=float(os.environ.get("CIRCUIT_BREAKER_OPEN_SECONDS", 30)),
+        half_open_probes=int(os.environ.get("CIRCUIT_BREAKER_HALF_OPEN_PROBES", 1))
+    )
@@ -0,0 +1,164 @@
+# backend/utils/context_cache.py
+import os
+import time
+import atexit
+import hashlib
+import threading
+from concurrent.futures import Future
+import google.generativeai as genai
+from google.generativeai import caching
+from datetime import timedelta
+from typing import Dict, Any, Optional
+
+# Rough conversion used to decide whether an instruction is large enough to cache
+CHARS_PER_TOKEN = 4
+
+
+class ContextCacheManager:
+    """
+    Provider-side context caches for static system instructions.
+
+    A system instruction of at least min_tokens is uploaded once per model as
+    a Gemini CachedContent, so later calls send only their dynamic input and
+    are billed the cached rate for the instruction. Each cache lives for ttl
+    seconds and is extended when it is used within refresh_margin seconds of
+    expiring. Instructions below the provider's minimum, or caches that could
+    not be created, return None so the caller falls back to a model
+    configured with the plain system instruction.
+    """
+    def __init__(self, enabled: bool = True, min_tokens: int = 32768, ttl: float = 3600,
+                 refresh_margin: float = 300, retry_after: float = 600):
+        self.enabled = enabled
+        self.min_tokens = min_tokens
+        self.ttl = ttl
+        self.refresh_margin = refresh_margin
+        self.retry_after = retry_after
+        self._entries: Dict[tuple, Dict[str, Any]] = {}
+        self._failed: Dict[tuple, float] = {}
+        # Key -> Future of the entry being created or refreshed by one caller
+        self._pending: Dict[tuple, Future] = {}
+        self._lock = threading.Lock()
+        self._stats = {"created": 0, "refreshed": 0, "hits": 0, "failures": 0}
+
+    def cacheable(self, system_instruction: Optional[str]) -> bool:
+        return bool(self.enabled and system_instruction
+                    and len(system_instruction) // CHARS_PER_TOKEN >= self.min_tokens)
+
+    def model_for(self, model_name: str, system_instruction: Optional[str],
+                  generation_config: Optional[Dict[str, Any]] = None) -> Optional[Any]:
+        """
+        Get a model bound to the cached instruction, creating or refreshing the cache as needed.
+
+        The create and refresh calls go to the provider without the lock held;
+        one caller per instruction makes them while callers with no usable
+        cache wait for its outcome, and callers with a usable one carry on.
+
+        Returns:
+            A GenerativeModel, or None if the instruction is not (or could not be) cached
+        """
+        if not self.cacheable(system_instruction):
+            return None
+
+        key = (model_name, hashlib.sha256(system_instruction.encode("utf-8")).hexdigest())
+        now = time.time()
+        with self._lock:
+            if self._failed.get(key, 0) > now:
+                return None
+            entry = self._entries.get(key)
+            usable = entry is not None and entry["expires_at"] > now
+            if usable and entry["expires_at"] - self.refresh_margin > now:
+                self._stats["hits"] += 1
+                return self._model(entry, generation_config)
+            pending = self._pending.get(key)
+            leader = pending is None
+            if leader:
+                pending = self._pending[key] = Future()
+            elif usable:
+                # Being refreshed by another caller; this one is still valid
+                self._stats["hits"] += 1
+                return self._model(entry, generation_config)
+
+        if not leader:
+            entry = pending.result()
+            if entry is None:
+                return None
+            with self._lock:
+                return self._model(entry, generation_config)
+
+        try:
+            if usable:
+                entry["cache"].update(ttl=timedelta(seconds=self.ttl))
+                entry = {**entry, "expires_at": now + self.ttl}
+            else:
+                entry = {"cache": self._create(key, model_name, system_instruction), "expires_at": now + self.ttl,
+                         "models": {}}
+        except Exception as e:
+            print(f"Warning: Could not use a Gemini context cache for {model_name}: {str(e)}")
+            with self._lock:
+                self._entries.pop(key, None)
+                self._failed[key] = now + self.retry_after
+                self._stats["failures"] += 1
+                del self._pending[key]
+            pending.set_result(None)
+            return None
+
+        with self._lock:
+            self._entries[key] = entry
+            self._stats["refreshed" if usable else "created"] += 1
+            del self._pending[key]
+            model = self._model(entry, generation_config)
+        pending.set_result(entry)
+        return model
+
+    def _model(self, entry: Dict[str, Any], generation_config: Optional[Dict[str, Any]]) -> Any:
+        # Called with the lock held
+        config_key = repr(sorted(generation_config.items())) if generation_config else None
+        if config_key not in entry["models"]:
+            entry["models"][config_key] = genai.GenerativeModel.from_cached_content(
+                entry["cache"], generation_config=generation_config
+            )
+        return entry["models"][config_key]
+
+    def _create(self, key: tuple, model_name: str, system_instruction: str) -> Any:
+        return caching.CachedContent.create(
+            model=model_name,
+            display_name=f"duke-chatbot-{key[1][:12]}",
+            system_instruction=system_instruction,
+            ttl=timedelta(seconds=self.ttl)
+        )
+
+    def close(self) -> None:
+        """
+        Delete this process's caches so they stop accruing storage cost.
+        """
+        with self._lock:
+            entries, self._entries = list(self._entries.values()), {}
+        for entry in entries:
+            try:
+                entry["cache"].delete()
+            except Exception as e:
+                print(f"Warning: Could not delete Gemini context cache: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._stats, "enabled": self.enabled, "active": len(self._entries)}
+
+
+def build_context_cache() -> ContextCacheManager:
+    """
+    Build the context cache manager from the environment.
+
+    GEMINI_CONTEXT_CACHE turns provider-side caching on or off;
+    GEMINI_CONTEXT_CACHE_MIN_TOKENS is the provider's minimum cacheable size,
+    and GEMINI_CONTEXT_CACHE_TTL / GEMINI_CONTEXT_CACHE_REFRESH set the cache
+    lifetime and how long before expiry it is extended. Context caching needs
+    a versioned model name (e.g. gemini-1.5-flash-002).
+    """
+    manager = ContextCacheManager(
+        enabled=os.environ.get("GEMINI_CONTEXT_CACHE", "true").lower() in ("1", "true", "yes"),
+        min_tokens=int(os.environ.get("GEMINI_CONTEXT_CACHE_MIN_TOKENS", 32768)),
+        ttl=float(os.environ.get("GEMINI_CONTEXT_CACHE_TTL", 3600)),
+        refresh_margin=float(os.environ.get("GEMINI_CONTEXT_CACHE_REFRESH", 300))
+    )
+    atexit.register(manager.close)
+    return manager
@@ -0,0 +1,99 @@
+# backend/utils/evaluation_store.py
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+
+class EvaluationStore:
+    """
+    Bounded store of evaluation results keyed by message ID.
+
+    Used when evaluation runs in the background: the chat response returns a
+    message ID with a pending status and the client fetches the scores later.
+    Entries expire after ttl seconds and the oldest are evicted past max_entries.
+    A message that shares another's response (a coalesced request) can follow
+    that message's evaluation under its own ID.
+    """
+    def __init__(self, max_entries: int = 5000, ttl: float = 3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        # Message ID -> [(follower message ID, follower conversation ID)] while its evaluation is pending
+        self._followers: Dict[str, List[Tuple[str, Optional[str]]]] = {}
+        self._lock = threading.Lock()
+
+    def _put_locked(self, message_id: str, entry: Dict[str, Any]) -> None:
+        # Called with the lock held
+        self._entries[message_id] = {**entry, "updated_at": time.time()}
+        self._entries.move_to_end(message_id)
+        while len(self._entries) > self.max_entries:
+            evicted, _ = self._entries.popitem(last=False)
+            self._followers.pop(evicted, None)
+
+    def _settle(self, message_id: str, entry: Dict[str, Any]) -> List[Tuple[str, Optional[str]]]:
+        with self._lock:
+            self._put_locked(message_id, entry)
+            followers = self._followers.pop(message_id, [])
+            for follower_id, follower_conversation_id in followers:
+                self._put_locked(follower_id, {**entry, "conversation_id": follower_conversation_id})
+        return followers
+
+    def mark_pending(self, message_id: str, conversation_id: Optional[str] = None) -> None:
+        with self._lock:
+            self._put_locked(message_id, {"status": "pending", "conversation_id": conversation_id, "evaluation": None})
+
+    def complete(self, message_id: str, evaluation: Dict[str, Any],
+                 conversation_id: Optional[str] = None) -> List[Tuple[str, Optional[str]]]:
+        """
+        Record a finished evaluation, for the message and any following it.
+
+        Returns:
+            The (message ID, conversation ID) of each follower that received it
+        """
+        return self._settle(message_id, {"status": "complete", "conversation_id": conversation_id,
+                                         "evaluation": evaluation})
+
+    def fail(self, message_id: str, error: str,
+             conversation_id: Optional[str] = None) -> List[Tuple[str, Optional[str]]]:
+        return self._settle(message_id, {"status": "failed", "conversation_id": conversation_id,
+                                         "evaluation": None, "error": error})
+
+    def follow(self, message_id: str, source_id: str, conversation_id: Optional[str] = None) -> None:
+        """
+        Give message_id the evaluation of source_id, now if it has finished or
+        when it does.
+
+        Args:
+            message_id: The message sharing source_id's response
+            source_id: The message whose evaluation was scheduled
+            conversation_id: The conversation message_id belongs to
+        """
+        with self._lock:
+            source = self._entries.get(source_id)
+            if source is None:
+                return
+            self._put_locked(message_id, {**source, "conversation_id": conversation_id})
+            if source["status"] == "pending":
+                self._followers.setdefault(source_id, []).append((message_id, conversation_id))
+
+    def get(self, message_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the evaluation entry for a message, or None if unknown or expired.
+        """
+        with self._lock:
+            entry = self._entries.get(message_id)
+            if entry is None:
+                return None
+            if entry["updated_at"] + self.ttl <= time.time():
+                del self._entries[message_id]
+                return None
+            return dict(entry)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            pending = sum(1 for entry in self._entries.values() if entry["status"] == "pending")
+            return {"entries": len(self._entries), "pending": pending}
+
+
+evaluation_store = EvaluationStore()
@@ -1,49 +1,492 @@
 import os
 import json
+import time
+import random
+import asyncio
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import google.generativeai as genai
-from typing import List, Dict, Any, Optional
+from google.api_core import exceptions as google_exceptions
+from typing import List, Dict, Any, AsyncIterator, Awaitable, Callable, Iterator, Optional, Tuple, Type
+from pydantic import BaseModel, ValidationError
+from utils.rate_limiter import GeminiRateLimiter, get_gemini_limiter
+from utils.context_cache import ContextCacheManager, build_context_cache
+from utils.json_extraction import JSONExtractionError, extract_json
+from utils.prompt_templates import JSON_REPAIR_PROMPT
+from utils.tracing import tracer, run_in_pool
+
+# Rough conversion used to estimate a prompt's token cost before sending it
+CHARS_PER_TOKEN = 4
+
+# Quota errors, and transient server errors worth retrying
+RATE_LIMIT_ERRORS = (google_exceptions.ResourceExhausted, google_exceptions.TooManyRequests)
+TRANSIENT_ERRORS = (google_exceptions.ServiceUnavailable, google_exceptions.InternalServerError,
+                    google_exceptions.DeadlineExceeded)
+
+# Model tiers call sites choose between; "pro" is used when no tier is given
+DEFAULT_MODEL_TIERS = {
+    "fast": "gemini-1.5-flash",
+    "pro": "gemini-1.5-pro"
+}
+
+
+class GeminiError(Exception):
+    """Raised when a Gemini call fails."""
+    
+    def __init__(self, message: str, retryable: bool = False):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class GeminiRateLimitError(GeminiError):
+    """Raised when the Gemini quota, or the local rate limit, is exhausted after retries."""
+    
+    def __init__(self, message: str, retry_after: float = 1.0):
+        super().__init__(message, retryable=True)
+        self.retry_after = retry_after
+
+
+class GeminiOutputError(GeminiError):
+    """Raised when a model's output does not match the expected schema, even after a repair call."""
+
+
+async def iterate_in_thread(pool: ThreadPoolExecutor, iterator: Iterator[Any]) -> AsyncIterator[Any]:
+    """Consume a blocking iterator from async code, one item per worker-thread hop."""
+    done = object()
+    while True:
+        item = await run_in_pool(pool, next, iterator, done)
+        if item is done:
+            return
+        yield item
+
 
 class GeminiClient:
-    """Client for interacting with Google's Gemini API."""
+    """
+    Client for interacting with Google's Gemini API.
+    
+    Every call goes through the process-wide limiter (concurrency, requests
+    and tokens per minute) and is retried with jittered exponential backoff
+    on quota and transient server errors. Failures raise GeminiError, or
+    GeminiRateLimitError when the quota is still exhausted after the retries.
+    
+    Configured GenerativeModel instances are cached by (model name, system
+    instruction, generation config), and each call can pick a model tier
+    ("fast" or "pro", set with GEMINI_MODEL_FAST / GEMINI_MODEL_PRO) or a
+    model name. Large system instructions are served from provider-side
+    context caches when possible.
+    
+    Each generation is recorded as a "gemini.*" span with the model, the
+    estimated and reported tokens, the time spent waiting on the limiter and
+    the number of retries.
+    """
     
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, limiter: Optional[GeminiRateLimiter] = None,
+                 context_cache: Optional[ContextCacheManager] = None):
         """Initialize the Gemini client with API key."""
         self.api_key = api_key or os.environ.get("GEMINI_API_KEY")
         if not self.api_key:
             raise ValueError("Gemini API key not provided")
         
-        genai.configure(api_key=self.api_key)
-        self.model = genai.GenerativeModel('gemini-1.5-pro')
+        # GEMINI_API_ENDPOINT points the SDK at another host over REST, e.g. the benchmark stub
+        endpoint = os.environ.get("GEMINI_API_ENDPOINT")
+        if endpoint:
+            genai.configure(api_key=self.api_key, transport="rest", client_options={"api_endpoint": endpoint})
+        else:
+            genai.configure(api_key=self.api_key)
+        # The SDK's async methods need the gRPC transport; over REST they run the sync call in a thread
+        self.native_async = not endpoint
+        # Sized separately from asyncio's default executor, which is only a few threads on a small pod
+        self.rest_pool = None if self.native_async else ThreadPoolExecutor(
+            max_workers=int(os.environ.get("GEMINI_REST_WORKERS", 64)),
+            thread_name_prefix="gemini-rest"
+        )
+        self.model_tiers = {
+            tier: os.environ.get(f"GEMINI_MODEL_{tier.upper()}", name) for tier, name in DEFAULT_MODEL_TIERS.items()
+        }
+        self.max_cached_models = int(os.environ.get("GEMINI_MODEL_CACHE_SIZE", 32))
+        self._models: "OrderedDict[tuple, Any]" = OrderedDict()
+        self._models_lock = threading.Lock()
+        self._output_stats = {"parse_failures": 0, "repaired": 0, "repair_failures": 0}
+        self.context_cache = context_cache or build_context_cache()
+        self.model = self.get_model("pro")
+        self.limiter = limiter or get_gemini_limiter()
+        self.max_retries = int(os.environ.get("GEMINI_MAX_RETRIES", 3))
+        self.retry_base_delay = float(os.environ.get("GEMINI_RETRY_BASE_DELAY", 1.0))
+        self.retry_max_delay = float(os.environ.get("GEMINI_RETRY_MAX_DELAY", 20.0))
+        self.expected_output_tokens = int(os.environ.get("GEMINI_EXPECTED_OUTPUT_TOKENS", 512))
+    
+    def get_model(self, tier: Optional[str] = None, system_instruction: Optional[str] = None,
+                  generation_config: Optional[Dict[str, Any]] = None) -> Any:
+        """
+        Get a configured GenerativeModel, creating and caching it on first use.
         
-    def generate_text(self, prompt: str, system_instruction: Optional[str] = None) -> str:
-        """Generate a response using Gemini API."""
-        try:
-            if system_instruction:
-                chat = self.model.start_chat(system_instruction=system_instruction)
-                response = chat.send_message(prompt)
+        Args:
+            tier: A model tier ("fast", "pro") or a model name (default: "pro")
+            system_instruction: System instruction the model is created with
+            generation_config: Generation config the model is created with
+        """
+        model_name = self.model_name(tier)
+        if system_instruction:
+            model = self.context_cache.model_for(model_name, system_instruction, generation_config)
+            if model is not None:
+                return model
+        
+        key = (model_name, system_instruction, json.dumps(generation_config, sort_keys=True) if generation_config else None)
+        
+        with self._models_lock:
+            model = self._models.get(key)
+            if model is not None:
+                self._models.move_to_end(key)
+                return model
+        
+        kwargs = {}
+        if system_instruction:
+            kwargs["system_instruction"] = system_instruction
+        if generation_config:
+            kwargs["generation_config"] = generation_config
+        model = genai.GenerativeModel(model_name, **kwargs)
+        
+        with self._models_lock:
+            model = self._models.setdefault(key, model)
+            while len(self._models) > self.max_cached_models:
+                self._models.popitem(last=False)
+        return model
+    
+    def model_name(self, tier: Optional[str] = None) -> str:
+        """Resolve a model tier ("fast", "pro") or model name to a model name."""
+        return self.model_tiers.get(tier or "pro", tier)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Get the limiter statistics and the configured models."""
+        with self._models_lock:
+            cached_models = len(self._models)
+            output_stats = dict(self._output_stats)
+        return {**self.limiter.stats(), "model_tiers": self.model_tiers, "cached_models": cached_models,
+                "context_cache": self.context_cache.stats(), "structured_output": output_stats}
+    
+    def estimate_tokens(self, prompt: Any, system_instruction: Optional[str] = None) -> int:
+        """Estimate the tokens a call will use: the prompt and instruction plus a typical response."""
+        return (len(str(prompt)) + len(system_instruction or "")) // CHARS_PER_TOKEN + self.expected_output_tokens
+    
+    def classify_error(self, error: Exception) -> GeminiError:
+        """Convert an exception from the Gemini SDK into a GeminiError."""
+        if isinstance(error, GeminiError):
+            return error
+        if isinstance(error, RATE_LIMIT_ERRORS):
+            return GeminiRateLimitError(f"Gemini quota exhausted: {str(error)}", retry_after=self.retry_base_delay)
+        if isinstance(error, TRANSIENT_ERRORS):
+            return GeminiError(f"Gemini is temporarily unavailable: {str(error)}", retryable=True)
+        return GeminiError(f"Gemini call failed: {str(error)}")
+    
+    def backoff_delay(self, attempt: int) -> float:
+        """Full-jitter exponential backoff for the given retry attempt."""
+        return random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * (2 ** attempt)))
+    
+    def retry_or_raise(self, error: Exception, attempt: int) -> float:
+        """Return the delay before the next attempt, or raise if the error is final."""
+        gemini_error = self.classify_error(error)
+        if not gemini_error.retryable or attempt >= self.max_retries:
+            if isinstance(gemini_error, GeminiRateLimitError):
+                gemini_error.retry_after = max(gemini_error.retry_after, self.backoff_delay(attempt + 1), 1.0)
+            raise gemini_error from error
+        delay = self.backoff_delay(attempt)
+        print(f"Warning: Gemini call failed ({str(error)}), retrying in {delay:.1f}s")
+        return delay
+    
+    def usage_tokens(self, response: Any) -> Optional[int]:
+        usage = getattr(response, "usage_metadata", None)
+        return getattr(usage, "total_token_count", None) if usage is not None else None
+    
+    def record_usage(self, estimated_tokens: int, response: Any) -> None:
+        """Record a successful call's token usage with the limiter and on the current span."""
+        tokens = self.usage_tokens(response)
+        self.limiter.record_usage(estimated_tokens, tokens)
+        tracer.set("estimated_tokens", estimated_tokens)
+        if tokens is not None:
+            tracer.set("tokens", tokens)
+    
+    def acquire(self, estimated_tokens: int) -> None:
+        """Wait for limiter capacity, recording the wait on the current span."""
+        waiting_since = time.monotonic()
+        acquired = self.limiter.acquire(estimated_tokens)
+        tracer.add("wait_ms", round((time.monotonic() - waiting_since) * 1000, 2))
+        if not acquired:
+            raise GeminiRateLimitError("Gemini rate limit reached",
+                                       retry_after=self.limiter.retry_after(estimated_tokens))
+    
+    async def aacquire(self, estimated_tokens: int) -> None:
+        """Async variant of acquire()."""
+        waiting_since = time.monotonic()
+        acquired = await self.limiter.aacquire(estimated_tokens)
+        tracer.add("wait_ms", round((time.monotonic() - waiting_since) * 1000, 2))
+        if not acquired:
+            raise GeminiRateLimitError("Gemini rate limit reached",
+                                       retry_after=self.limiter.retry_after(estimated_tokens))
+    
+    def async_request(self, model: Any, prompt: Any, stream: bool = False) -> Callable[[], Awaitable[Any]]:
+        """Build an awaitable generate_content request for acall()."""
+        if self.native_async:
+            return lambda: model.generate_content_async(prompt, stream=stream)
+        return lambda: run_in_pool(self.rest_pool, model.generate_content, prompt, stream=stream)
+    
+    def call(self, request: Callable[[], Any], estimated_tokens: int) -> Any:
+        """
+        Run a Gemini request under the limiter, retrying quota and transient errors.
+        
+        Raises:
+            GeminiRateLimitError: No capacity within the limiter's timeout, or quota still exhausted
+            GeminiError: Any other failure
+        """
+        attempt = 0
+        while True:
+            self.acquire(estimated_tokens)
+            try:
+                response = request()
+            except Exception as e:
+                self.limiter.release()
+                time.sleep(self.retry_or_raise(e, attempt))
+                attempt += 1
+                tracer.add("retries")
+                continue
+            self.limiter.release()
+            self.record_usage(estimated_tokens, response)
+            return response
+    
+    async def acall(self, request: Callable[[], Any], estimated_tokens: int) -> Any:
+        """
+        Async variant of call(); request returns an awaitable. The limiter slot
+        is released however the request ends, including by cancellation.
+        """
+        attempt = 0
+        while True:
+            await self.aacquire(estimated_tokens)
+            try:
+                response = await request()
+            except Exception as e:
+                delay = self.retry_or_raise(e, attempt)
             else:
-                response = self.model.generate_content(prompt)
-            
+                self.record_usage(estimated_tokens, response)
+                return response
+            finally:
+                self.limiter.release()
+            await asyncio.sleep(delay)
+            attempt += 1
+            tracer.add("retries")
+    
+    def response_text(self, response: Any) -> str:
+        """Get a response's text; blocked or empty responses raise GeminiError."""
+        try:
             return response.text
-        except Exception as e:
-            print(f"Error generating text with Gemini: {str(e)}")
-            return f"Error: {str(e)}"
+        except ValueError as e:
+            raise GeminiError(f"Gemini returned no text: {str(e)}") from e
+        
+    def generate_text(self, prompt: str, system_instruction: Optional[str] = None, tier: Optional[str] = None) -> str:
+        """Generate a response using Gemini API."""
+        with tracer.span("gemini.generate", model=self.model_name(tier)):
+            model = self.get_model(tier, system_instruction)
+            response = self.call(lambda: model.generate_content(prompt), self.estimate_tokens(prompt, system_instruction))
+            return self.response_text(response)
+    
+    async def agenerate_text(self, prompt: str, system_instruction: Optional[str] = None,
+                             tier: Optional[str] = None) -> str:
+        """Generate a response without blocking the event loop."""
+        with tracer.span("gemini.generate", model=self.model_name(tier)):
+            model = self.get_model(tier, system_instruction)
+            response = await self.acall(self.async_request(model, prompt), self.estimate_tokens(prompt, system_instruction))
+            return self.response_text(response)
+    
+    def stream_text(self, prompt: str, system_instruction: Optional[str] = None,
+                    tier: Optional[str] = None) -> Iterator[str]:
+        """
+        Stream a response from Gemini API, yielding text chunks as they arrive.
+        
+        Quota errors are retried until the first chunk arrives; after that a
+        failure raises GeminiError mid-stream.
+        """
+        with tracer.span("gemini.stream", model=self.model_name(tier)) as span:
+            model = self.get_model(tier, system_instruction)
+            estimated_tokens = self.estimate_tokens(prompt, system_instruction)
+            attempt = 0
+            while True:
+                self.acquire(estimated_tokens)
+                started = False
+                try:
+                    response = model.generate_content(prompt, stream=True)
+                    for chunk in response:
+                        text = self.response_text(chunk)
+                        if text:
+                            if not started and span is not None:
+                                span.set("first_chunk_ms", span.duration_ms)
+                            started = True
+                            yield text
+                    self.record_usage(estimated_tokens, response)
+                    return
+                except Exception as e:
+                    if started:
+                        raise self.classify_error(e) from e
+                    delay = self.retry_or_raise(e, attempt)
+                finally:
+                    self.limiter.release()
+                time.sleep(delay)
+                attempt += 1
+                tracer.add("retries")
+    
+    async def astream_text(self, prompt: str, system_instruction: Optional[str] = None,
+                           tier: Optional[str] = None) -> AsyncIterator[str]:
+        """
+        Async variant of stream_text().
+        """
+        with tracer.span("gemini.stream", model=self.model_name(tier)) as span:
+            model = self.get_model(tier, system_instruction)
+            estimated_tokens = self.estimate_tokens(prompt, system_instruction)
+            attempt = 0
+            while True:
+                await self.aacquire(estimated_tokens)
+                started = False
+                try:
+                    response = await self.async_request(model, prompt, stream=True)()
+                    chunks = response if self.native_async else iterate_in_thread(self.rest_pool, iter(response))
+                    async for chunk in chunks:
+                        text = self.response_text(chunk)
+                        if text:
+                            if not started and span is not None:
+                                span.set("first_chunk_ms", span.duration_ms)
+                            started = True
+                            yield text
+                    self.record_usage(estimated_tokens, response)
+                    return
+                except Exception as e:
+                    if started:
+                        raise self.classify_error(e) from e
+                    delay = self.retry_or_raise(e, attempt)
+                finally:
+                    self.limiter.release()
+                await asyncio.sleep(delay)
+                attempt += 1
+                tracer.add("retries")
+    
+    def json_generation_config(self, response_schema: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        generation_config = {"response_mime_type": "application/json"}
+        if response_schema:
+            generation_config["response_schema"] = response_schema
+        return generation_config
+    
+    def generate_json_text(self, prompt: str, response_schema: Optional[Dict[str, Any]] = None,
+                           system_instruction: Optional[str] = None, tier: Optional[str] = None) -> str:
+        """Generate raw text in Gemini's JSON response MIME type, optionally schema-constrained."""
+        with tracer.span("gemini.generate_json", model=self.model_name(tier)):
+            model = self.get_model(tier, system_instruction, self.json_generation_config(response_schema))
+            response = self.call(lambda: model.generate_content(prompt), self.estimate_tokens(prompt, system_instruction))
+            return self.response_text(response)
+    
+    async def agenerate_json_text(self, prompt: str, response_schema: Optional[Dict[str, Any]] = None,
+                                  system_instruction: Optional[str] = None, tier: Optional[str] = None) -> str:
+        """Async variant of generate_json_text()."""
+        with tracer.span("gemini.generate_json", model=self.model_name(tier)):
+            model = self.get_model(tier, system_instruction, self.json_generation_config(response_schema))
+            response = await self.acall(self.async_request(model, prompt), self.estimate_tokens(prompt, system_instruction))
+            return self.response_text(response)
+    
+    def generate_json(self, prompt: str, response_schema: Optional[Dict[str, Any]] = None,
+                      system_instruction: Optional[str] = None, tier: Optional[str] = None) -> Dict[str, Any]:
+        """Generate a schema-constrained JSON response using Gemini's JSON response MIME type."""
+        return self.parse_json_response(self.generate_json_text(prompt, response_schema, system_instruction, tier))
+    
+    def generate_structured(self, prompt: str, schema: Type[BaseModel], system_instruction: Optional[str] = None,
+                            tier: Optional[str] = None, response_schema: Optional[Dict[str, Any]] = None) -> BaseModel:
+        """
+        Generate output and validate it against a pydantic model.
+        
+        Output that cannot be extracted or validated gets one targeted repair
+        call on the fast tier, given the schema and the validation error,
+        rather than re-running the whole prompt.
+        
+        Args:
+            schema: The pydantic model the output must match
+            response_schema: Optional Gemini response schema; when given the call uses JSON mode
+        
+        Raises:
+            GeminiOutputError: If the output is still invalid after the repair call
+        """
+        if response_schema:
+            text = self.generate_json_text(prompt, response_schema, system_instruction, tier)
+        else:
+            text = self.generate_text(prompt, system_instruction, tier)
+        
+        parsed, error = self.validate_output(text, schema)
+        if parsed is not None:
+            return parsed
+        
+        repair_prompt = self.repair_prompt(schema, text, error)
+        return self.check_repair(schema, self.generate_json_text(repair_prompt, tier="fast"))
+    
+    async def agenerate_structured(self, prompt: str, schema: Type[BaseModel], system_instruction: Optional[str] = None,
+                                   tier: Optional[str] = None, response_schema: Optional[Dict[str, Any]] = None) -> BaseModel:
+        """Async variant of generate_structured()."""
+        if response_schema:
+            text = await self.agenerate_json_text(prompt, response_schema, system_instruction, tier)
+        else:
+            text = await self.agenerate_text(prompt, system_instruction, tier)
+        
+        parsed, error = self.validate_output(text, schema)
+        if parsed is not None:
+            return parsed
+        
+        repair_prompt = self.repair_prompt(schema, text, error)
+        return self.check_repair(schema, await self.agenerate_json_text(repair_prompt, tier="fast"))
+    
+    def repair_prompt(self, schema: Type[BaseModel], text: str, error: str) -> str:
+        """Record an invalid output and build the prompt asking the model to fix it."""
+        self.count_output("parse_failures")
+        print(f"Warning: Invalid {schema.__name__} output ({error}), requesting a repair")
+        return JSON_REPAIR_PROMPT.format(
+            schema=json.dumps(schema.model_json_schema()),
+            error=error,
+            output=text[:4000]
+        )
+    
+    def check_repair(self, schema: Type[BaseModel], text: str) -> BaseModel:
+        """
+        Validate the output of a repair call.
+        
+        Raises:
+            GeminiOutputError: If it is still invalid
+        """
+        repaired, error = self.validate_output(text, schema)
+        if repaired is None:
+            self.count_output("repair_failures")
+            raise GeminiOutputError(f"Invalid {schema.__name__} output after repair: {error}")
+        self.count_output("repaired")
+        return repaired
+    
+    def validate_output(self, text: str, schema: Type[BaseModel]) -> Tuple[Optional[BaseModel], Optional[str]]:
+        """
+        Extract and validate a model's output.
+        
+        Returns:
+            (validated model, None) or (None, description of the problem)
+        """
+        try:
+            return schema.model_validate(extract_json(text)), None
+        except JSONExtractionError as e:
+            return None, str(e)
+        except ValidationError as e:
+            return None, "; ".join(
+                f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in e.errors()
+            )
+    
+    def count_output(self, outcome: str) -> None:
+        with self._models_lock:
+            self._output_stats[outcome] += 1
     
     def parse_json_response(self, response: str) -> Dict[str, Any]:
         """Attempt to parse a JSON response."""
         try:
-            # Extract JSON if it's wrapped in markdown code blocks
-            if "```json" in response:
-                json_content = response.split("```json")[1].split("```")[0].strip()
-                return json.loads(json_content)
-            elif "```" in response:
-                json_content = response.split("```")[1].split("```")[0].strip()
-                return json.loads(json_content)
-            else:
-                return json.loads(response)
-        except json.JSONDecodeError:
-            # If JSON parsing fails, try to extract a JSON-like structure
-            print(f"Failed to parse JSON response: {response}")
+            # Finds the first balanced object, skipping code fences and surrounding prose
+            return extract_json(response)
+        except JSONExtractionError as e:
+            print(f"Failed to parse JSON response ({str(e)}): {response[:200]}")
             return {"error": "Failed to parse response as JSON"}
     
     def evaluate_response(self, query: str, response: str, criteria: List[str]) -> Dict[str, float]:
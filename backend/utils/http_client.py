@@ -0,0 +1,286 @@
+# backend/utils/http_client.py
+import os
+import time
+import random
+import asyncio
+import weakref
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import MaxRetryError, ResponseError
+from urllib3.util.retry import Retry
+from typing import Any, Iterator, Optional, Tuple
+
+# Failures the async tools report as error results: transport errors, timeouts and bad JSON
+ASYNC_REQUEST_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError, ValueError)
+
+# time.monotonic() by which the caller stops waiting for the current HTTP calls, if any
+_deadline: ContextVar[Optional[float]] = ContextVar("http_deadline", default=None)
+
+
+@contextmanager
+def request_deadline(deadline: Optional[float]) -> Iterator[None]:
+    """
+    Bound the HTTP calls made in the block, retries included, by a time.monotonic()
+    deadline: no retry is started that could not finish its wait before it, and
+    each attempt's timeouts are cut to the time left.
+    """
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def time_left() -> Optional[float]:
+    """Seconds until the current request_deadline(), or None without one."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+class JitteredRetry(Retry):
+    """
+    Retry policy whose exponential backoff is randomized to avoid synchronized
+    retries, whose Retry-After waits are capped at backoff_max, and which gives
+    up rather than wait past the current request_deadline().
+    """
+
+    def get_backoff_time(self) -> float:
+        backoff = super().get_backoff_time()
+        if backoff <= 0:
+            return 0
+        return random.uniform(0, backoff)
+
+    def get_retry_after(self, response: Any) -> Optional[float]:
+        retry_after = super().get_retry_after(response)
+        return None if retry_after is None else min(retry_after, self.backoff_max)
+
+    def increment(self, method: Optional[str] = None, url: Optional[str] = None, response: Any = None,
+                  error: Optional[Exception] = None, _pool: Any = None, _stacktrace: Any = None) -> "JitteredRetry":
+        retry = super().increment(method, url, response, error, _pool, _stacktrace)
+        left = time_left()
+        if left is not None:
+            wait = retry.get_retry_after(response) if response is not None and self.respect_retry_after_header else None
+            if wait is None:
+                # The longest the jittered backoff could be
+                wait = Retry.get_backoff_time(retry)
+            if wait >= left:
+                raise MaxRetryError(_pool, url, error or ResponseError("retry would pass the request deadline"))
+        return retry
+
+
+class HttpClient:
+    """
+    Shared HTTP transport for the Duke API tools.
+
+    Wraps a single requests.Session whose adapters keep a pool of keep-alive
+    connections per host, so tool calls to the Cloud Run endpoints and
+    googleapis.com reuse TCP/TLS connections instead of handshaking per query.
+    Requests get connect/read timeouts and are retried with jittered
+    exponential backoff on 429 and 5xx responses.
+    """
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+    def __init__(self, pool_size: Optional[int] = None, connect_timeout: Optional[float] = None,
+                 read_timeout: Optional[float] = None, max_retries: Optional[int] = None,
+                 backoff_factor: Optional[float] = None, backoff_max: Optional[float] = None):
+        """
+        Initialize the HTTP client.
+
+        Args:
+            pool_size: Connections kept per host; should be at least the number of ToolExecutor
+                       threads, which make the tool calls (default: HTTP_POOL_SIZE, else
+                       TOOL_EXECUTOR_MAX_WORKERS or 16)
+            connect_timeout: Seconds to establish a connection (default: HTTP_CONNECT_TIMEOUT or 3.05)
+            read_timeout: Seconds to wait for a response (default: HTTP_READ_TIMEOUT or 10)
+            max_retries: Retries on connection errors, 429 and 5xx (default: HTTP_MAX_RETRIES or 2)
+            backoff_factor: Base of the exponential backoff in seconds (default: HTTP_BACKOFF_FACTOR or 0.3)
+            backoff_max: Longest wait before a retry, including a server's Retry-After
+                         (default: HTTP_BACKOFF_MAX or 5)
+        """
+        self.pool_size = pool_size or int(os.environ.get("HTTP_POOL_SIZE",
+                                                         os.environ.get("TOOL_EXECUTOR_MAX_WORKERS", 16)))
+        self.timeout: Tuple[float, float] = (
+            connect_timeout or float(os.environ.get("HTTP_CONNECT_TIMEOUT", 3.05)),
+            read_timeout or float(os.environ.get("HTTP_READ_TIMEOUT", 10)),
+        )
+        retries = max_retries if max_retries is not None else int(os.environ.get("HTTP_MAX_RETRIES", 2))
+        backoff = backoff_factor if backoff_factor is not None else float(os.environ.get("HTTP_BACKOFF_FACTOR", 0.3))
+        backoff_max = backoff_max if backoff_max is not None else float(os.environ.get("HTTP_BACKOFF_MAX", 5))
+
+        retry = JitteredRetry(
+            total=retries,
+            connect=retries,
+            read=retries,
+            status=retries,
+            backoff_factor=backoff,
+            backoff_max=backoff_max,
+            status_forcelist=self.RETRY_STATUSES,
+            # The Duke endpoints are read-only searches, so POST is safe to retry
+            allowed_methods=frozenset(["GET", "POST"]),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size,
+                              max_retries=retry, pool_block=False)
+
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def request_timeout(self) -> Tuple[float, float]:
+        """The (connect, read) timeouts for an attempt, cut to the time left before the request deadline."""
+        left = time_left()
+        if left is None:
+            return self.timeout
+        left = max(left, 0.01)
+        return min(self.timeout[0], left), min(self.timeout[1], left)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """Send a GET request through the pooled session."""
+        kwargs.setdefault("timeout", self.request_timeout())
+        return self.session.get(url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        """Send a POST request through the pooled session."""
+        kwargs.setdefault("timeout", self.request_timeout())
+        return self.session.post(url, **kwargs)
+
+    def close(self) -> None:
+        """Close all pooled connections."""
+        self.session.close()
+
+
+_http_client: Optional[HttpClient] = None
+_http_client_lock = threading.Lock()
+
+
+def get_http_client() -> HttpClient:
+    """
+    Get the process-wide HTTP client, creating it on first use.
+    """
+    global _http_client
+    if _http_client is None:
+        with _http_client_lock:
+            if _http_client is None:
+                _http_client = HttpClient()
+    return _http_client
+
+
+class AsyncHttpClient:
+    """
+    Async counterpart of HttpClient for the async serving path.
+
+    Wraps an aiohttp.ClientSession with a bounded connection pool, the same
+    connect/read timeouts, and the same jittered exponential backoff on
+    connection errors, 429 and 5xx. A session belongs to the event loop it
+    was created on, so each loop gets its own on first use, which stays open
+    until close() is called on that loop (the app's cleanup hook).
+    """
+    RETRY_STATUSES = HttpClient.RETRY_STATUSES
+
+    def __init__(self, pool_size: Optional[int] = None, connect_timeout: Optional[float] = None,
+                 read_timeout: Optional[float] = None, max_retries: Optional[int] = None,
+                 backoff_factor: Optional[float] = None, backoff_max: Optional[float] = None):
+        """
+        Initialize the async HTTP client.
+
+        Args:
+            pool_size: Connections kept open in total (default: ASYNC_HTTP_POOL_SIZE or 100)
+            connect_timeout: Seconds to establish a connection (default: HTTP_CONNECT_TIMEOUT or 3.05)
+            read_timeout: Seconds to wait for a response (default: HTTP_READ_TIMEOUT or 10)
+            max_retries: Retries on connection errors, 429 and 5xx (default: HTTP_MAX_RETRIES or 2)
+            backoff_factor: Base of the exponential backoff in seconds (default: HTTP_BACKOFF_FACTOR or 0.3)
+            backoff_max: Longest wait before a retry, including a server's Retry-After
+                         (default: HTTP_BACKOFF_MAX or 5)
+        """
+        self.pool_size = pool_size or int(os.environ.get("ASYNC_HTTP_POOL_SIZE", 100))
+        self.timeout = aiohttp.ClientTimeout(
+            sock_connect=connect_timeout or float(os.environ.get("HTTP_CONNECT_TIMEOUT", 3.05)),
+            sock_read=read_timeout or float(os.environ.get("HTTP_READ_TIMEOUT", 10)),
+        )
+        self.max_retries = max_retries if max_retries is not None else int(os.environ.get("HTTP_MAX_RETRIES", 2))
+        self.backoff_factor = backoff_factor if backoff_factor is not None else float(os.environ.get("HTTP_BACKOFF_FACTOR", 0.3))
+        self.backoff_max = backoff_max if backoff_max is not None else float(os.environ.get("HTTP_BACKOFF_MAX", 5))
+        # One session per event loop; a loop that is discarded takes its entry with it
+        self._sessions: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, aiohttp.ClientSession]" = \
+            weakref.WeakKeyDictionary()
+
+    def session(self) -> aiohttp.ClientSession:
+        """Get the session for the running event loop, creating it on first use."""
+        loop = asyncio.get_running_loop()
+        session = self._sessions.get(loop)
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, limit_per_host=self.pool_size)
+            session = self._sessions[loop] = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        return session
+
+    def backoff(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_factor * (2 ** attempt)))
+
+    def may_retry(self, attempt: int, delay: float) -> bool:
+        """Whether another attempt is allowed after waiting delay seconds."""
+        left = time_left()
+        return attempt < self.max_retries and (left is None or delay < left)
+
+    async def request_json(self, method: str, url: str, **kwargs: Any) -> Any:
+        """
+        Send a request and decode its JSON body, retrying like HttpClient.
+
+        Raises:
+            aiohttp.ClientResponseError: On an error status once retries are exhausted
+            aiohttp.ClientError, asyncio.TimeoutError: On connection errors and timeouts
+            ValueError: If the body is not JSON
+        """
+        attempt = 0
+        while True:
+            left = time_left()
+            if left is not None:
+                kwargs["timeout"] = aiohttp.ClientTimeout(total=max(left, 0.01), sock_connect=self.timeout.sock_connect,
+                                                          sock_read=self.timeout.sock_read)
+            try:
+                async with self.session().request(method, url, **kwargs) as response:
+                    delay = self.backoff(attempt, response.headers.get("Retry-After"))
+                    if response.status not in self.RETRY_STATUSES or not self.may_retry(attempt, delay):
+                        response.raise_for_status()
+                        return await response.json(content_type=None)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                delay = self.backoff(attempt)
+                if not self.may_retry(attempt, delay):
+                    raise
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def get_json(self, url: str, **kwargs: Any) -> Any:
+        """Send a GET request through the pooled session and decode the JSON response."""
+        return await self.request_json("GET", url, **kwargs)
+
+    async def post_json(self, url: str, **kwargs: Any) -> Any:
+        """Send a POST request through the pooled session and decode the JSON response."""
+        return await self.request_json("POST", url, **kwargs)
+
+    async def close(self) -> None:
+        """Close the running event loop's session and its pooled connections."""
+        session = self._sessions.pop(asyncio.get_running_loop(), None)
+        if session is not None and not session.closed:
+            await session.close()
+
+
+_async_http_client: Optional[AsyncHttpClient] = None
+
+
+def get_async_http_client() -> AsyncHttpClient:
+    """
+    Get the process-wide async HTTP client, creating it on first use.
+    """
+    global _async_http_client
+    if _async_http_client is None:
+        with _http_client_lock:
+            if _async_http_client is None:
+                _async_http_client = AsyncHttpClient()
+    return _async_http_client
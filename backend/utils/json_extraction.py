@@ -0,0 +1,135 @@
+# backend/utils/json_extraction.py
+import re
+import json
+from typing import Any, Optional, Tuple
+
+# Python literals models sometimes emit in place of JSON ones
+PYTHON_LITERALS = {"True": "true", "False": "false", "None": "null"}
+TRAILING_COMMA = re.compile(r",(\s*[}\]])")
+
+
+class JSONExtractionError(ValueError):
+    """Raised when no JSON value can be recovered from a model's output."""
+
+
+def find_balanced(text: str, start: int = 0) -> Optional[Tuple[int, int]]:
+    """
+    Find the first balanced JSON object or array at or after start, in one pass.
+
+    Brackets inside single- or double-quoted strings are ignored, so prose,
+    markdown code fences and anything after the closing bracket are skipped.
+
+    Returns:
+        (start, end) of the value, or None if no balanced value is found
+    """
+    depth = 0
+    begin = None
+    quote = None
+    escaped = False
+
+    for i in range(start, len(text)):
+        char = text[i]
+        if quote:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == quote:
+                quote = None
+            continue
+        if begin is None:
+            if char in "{[":
+                begin, depth = i, 1
+            continue
+        if char in "\"'":
+            # An apostrophe inside a word ("Duke's") does not open a string
+            if char == "'" and text[i - 1].isalnum():
+                continue
+            quote = char
+        elif char in "{[":
+            depth += 1
+        elif char in "}]":
+            depth -= 1
+            if depth == 0:
+                return begin, i + 1
+    return None
+
+
+def normalize_json(candidate: str) -> str:
+    """
+    Rewrite common near-JSON into JSON: single-quoted strings, Python
+    literals and trailing commas.
+    """
+    out = []
+    quote = None
+    escaped = False
+    i = 0
+    while i < len(candidate):
+        char = candidate[i]
+        if quote:
+            if escaped:
+                escaped = False
+                out.append(char)
+            elif char == "\\":
+                escaped = True
+                # \' is not a valid JSON escape
+                if quote == "'" and i + 1 < len(candidate) and candidate[i + 1] == "'":
+                    out.append("'")
+                    escaped = False
+                    i += 2
+                    continue
+                out.append(char)
+            elif char == quote:
+                quote = None
+                out.append('"')
+            elif char == '"' and quote == "'":
+                out.append('\\"')
+            else:
+                out.append(char)
+            i += 1
+            continue
+
+        if char in "\"'" and not (char == "'" and i > 0 and candidate[i - 1].isalnum()):
+            quote = char
+            out.append('"')
+            i += 1
+            continue
+
+        match = re.match(r"True|False|None", candidate[i:])
+        if match and not (i > 0 and candidate[i - 1].isalnum()):
+            out.append(PYTHON_LITERALS[match.group(0)])
+            i += len(match.group(0))
+            continue
+
+        out.append(char)
+        i += 1
+
+    return TRAILING_COMMA.sub(r"\1", "".join(out))
+
+
+def extract_json(text: str) -> Any:
+    """
+    Extract the first JSON object or array from a model's output.
+
+    Tries each balanced candidate in turn, first as strict JSON and then
+    normalized, so a stray bracket in leading prose does not hide the payload.
+
+    Raises:
+        JSONExtractionError: If no candidate parses
+    """
+    if not isinstance(text, str):
+        raise JSONExtractionError("Model output is not text")
+
+    position = 0
+    last_error = "no JSON object found"
+    while True:
+        span = find_balanced(text, position)
+        if span is None:
+            raise JSONExtractionError(f"Could not extract JSON: {last_error}")
+        candidate = text[span[0]:span[1]]
+        for attempt in (candidate, normalize_json(candidate)):
+            try:
+                return json.loads(attempt)
+            except json.JSONDecodeError as e:
+                last_error = str(e)
+        position = span[0] + 1
@@ -0,0 +1,44 @@
+# backend/utils/metrics.py
+import os
+import sys
+import json
+import time
+import threading
+from typing import Dict, Any, Optional
+
+
+class MetricsSink:
+    """
+    Writes metric records as JSON lines to stdout or a file.
+
+    Each record carries a metric name, a timestamp and arbitrary fields, which
+    keeps it easy to ship to Cloud Logging or load into a notebook.
+    """
+    def __init__(self, path: Optional[str] = None):
+        """
+        Initialize the sink.
+
+        Args:
+            path: File to append records to; None or "console" writes to stdout
+        """
+        self.path = None if path in (None, "", "console") else path
+        self._lock = threading.Lock()
+
+    def emit(self, name: str, fields: Dict[str, Any]) -> None:
+        """
+        Write one metric record.
+        """
+        line = json.dumps({"metric": name, "timestamp": time.time(), **fields}, default=str)
+        with self._lock:
+            try:
+                if self.path:
+                    with open(self.path, "a") as f:
+                        f.write(line + "\n")
+                else:
+                    sys.stdout.write(line + "\n")
+                    sys.stdout.flush()
+            except OSError as e:
+                print(f"Warning: Could not write metric {name}: {str(e)}")
+
+
+metrics_sink = MetricsSink(os.environ.get("METRICS_SINK", "console"))
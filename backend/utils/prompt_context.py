@@ -0,0 +1,223 @@
+# backend/utils/prompt_context.py
+import os
+import re
+from typing import Dict, Any, List, Optional, Tuple
+
+# Rough conversion used to hold prompt sections to a token budget
+CHARS_PER_TOKEN = 4
+
+# Default token budget for the tool information in each prompt; the evaluator
+# and the thinking explanation only need an outline of what was found
+DEFAULT_BUDGETS = {
+    "response": 1500,
+    "evaluation": 300,
+    "thinking": 250
+}
+
+# Fields that only matter to the API call, not to the model
+DROPPED_FIELDS = {"query_params", "id", "uuid", "guid", "image", "image_url", "thumbnail", "raw", "html"}
+LINK_FIELDS = {"link", "url", "href", "event_url"}
+
+# Keys under which the APIs nest their list of records
+LIST_KEYS = ("results", "events", "items", "data")
+
+# Longest text kept for a single field
+MAX_FIELD_CHARS = 300
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def budget_for(consumer: str) -> int:
+    """
+    Get the token budget for a prompt consumer, overridable with PROMPT_BUDGET_<CONSUMER>.
+    """
+    default = DEFAULT_BUDGETS.get(consumer, DEFAULT_BUDGETS["response"])
+    return int(os.environ.get(f"PROMPT_BUDGET_{consumer.upper()}", default))
+
+
+def extract_items(data: Any) -> List[Any]:
+    """
+    Get the list of records from a tool's data, whichever key the API nests them under.
+    """
+    if isinstance(data, list):
+        return data
+    if isinstance(data, dict):
+        for key in LIST_KEYS:
+            if isinstance(data.get(key), list):
+                return data[key]
+        return [data]
+    return [data] if data not in (None, "") else []
+
+
+def format_value(value: Any) -> str:
+    if isinstance(value, dict):
+        return ", ".join(f"{k}: {format_value(v)}" for k, v in value.items() if v not in (None, "", [], {}))
+    if isinstance(value, list):
+        return ", ".join(format_value(v) for v in value if v not in (None, "", [], {}))
+    text = re.sub(r"\s+", " ", str(value)).strip()
+    if len(text) > MAX_FIELD_CHARS:
+        text = text[:MAX_FIELD_CHARS] + "..."
+    return text
+
+
+def format_item(item: Any, include_links: bool = True) -> str:
+    """
+    Render one record as a compact "field: value | field: value" line.
+    """
+    if not isinstance(item, dict):
+        return format_value(item)
+
+    parts = []
+    for key, value in item.items():
+        if key in DROPPED_FIELDS or value in (None, "", [], {}):
+            continue
+        if key in LINK_FIELDS and not include_links:
+            continue
+        parts.append(f"{key}: {format_value(value)}")
+    return " | ".join(parts)
+
+
+def dedupe_key(item: Any, line: str) -> str:
+    """
+    Identify duplicate records, e.g. the same event returned by both event tools.
+    """
+    if isinstance(item, dict):
+        title = item.get("title") or item.get("name")
+        if title:
+            when = item.get("start_date") or item.get("date") or item.get("start") or ""
+            return " ".join(WORD_PATTERN.findall(f"{title} {when}".lower()))
+    return " ".join(WORD_PATTERN.findall(line.lower()))
+
+
+def relevance(query_words: set, line: str) -> float:
+    if not query_words:
+        return 0.0
+    words = set(WORD_PATTERN.findall(line.lower()))
+    return len(query_words & words) / len(query_words)
+
+
+def collect_lines(tool_results: Dict[str, Any], query: str,
+                  include_links: bool = True) -> Tuple[List[str], List[Tuple[float, int, str, str]]]:
+    """
+    Turn tool results into status lines and deduplicated, relevance-scored record lines.
+
+    Returns:
+        (status lines for failed tools, [(score, original position, tool name, line)])
+    """
+    query_words = set(WORD_PATTERN.findall(query.lower()))
+    status_lines = []
+    records = []
+    seen = set()
+
+    for tool_name, result in (tool_results or {}).items():
+        if not isinstance(result, dict):
+            continue
+        if result.get("status") != "success":
+            status_lines.append(f"[{tool_name}] {result.get('status', 'error')}: {format_value(result.get('message', ''))}")
+            continue
+
+        # Scores from the reranker take precedence over plain word overlap
+        scores = result.get("scores")
+        for position, item in enumerate(extract_items(result.get("data"))):
+            line = format_item(item, include_links)
+            if not line:
+                continue
+            key = dedupe_key(item, line)
+            if key in seen:
+                continue
+            seen.add(key)
+            # Keep the API's own ordering as the tie-breaker
+            score = scores[position] if scores and position < len(scores) else relevance(query_words, line)
+            records.append((score, len(records), tool_name, line))
+
+    return status_lines, records
+
+
+def format_tool_results(tool_results: Dict[str, Any], query: str = "", consumer: str = "response",
+                        max_tokens: Optional[int] = None) -> str:
+    """
+    Format tool results as compact text for a prompt, within a token budget.
+
+    Records are deduplicated across tools, ranked by their reranker scores (or
+    by overlap with the query when they were not reranked) and added best first until the budget is used; the number left out is noted.
+
+    Args:
+        tool_results: Tool name to tool result, as produced by the tool executor
+        query: The user's query, used to rank records
+        consumer: Which prompt the text is for ("response", "evaluation", "thinking")
+        max_tokens: Budget override (default: budget_for(consumer))
+
+    Returns:
+        The formatted text
+    """
+    budget = (max_tokens or budget_for(consumer)) * CHARS_PER_TOKEN
+    status_lines, records = collect_lines(tool_results, query, include_links=consumer == "response")
+
+    if not records and not status_lines:
+        return "No information was found."
+
+    lines = list(status_lines)
+    remaining = budget - sum(len(line) + 1 for line in lines)
+
+    ranked = sorted(records, key=lambda record: (-record[0], record[1]))
+    kept = []
+    for record in ranked:
+        line = f"[{record[2]}] {record[3]}"
+        if len(line) + 1 > remaining:
+            if not kept and remaining > 40:
+                # Always keep a truncated best record rather than nothing
+                line = line[:remaining - 4] + "..."
+            else:
+                continue
+        kept.append(line)
+        remaining -= len(line) + 1
+
+    lines.extend(kept)
+    omitted = len(records) - len(kept)
+    if omitted:
+        lines.append(f"({omitted} more results omitted)")
+    return "\n".join(lines)
+
+
+def summarize_tool_results(tool_results: Dict[str, Any], query: str = "", consumer: str = "evaluation",
+                           max_tokens: Optional[int] = None) -> str:
+    """
+    Summarize tool results as one line per tool: its status, how many records
+    it returned and the titles of the most relevant ones, within a token budget.
+    """
+    budget = (max_tokens or budget_for(consumer)) * CHARS_PER_TOKEN
+    status_lines, records = collect_lines(tool_results, query, include_links=False)
+
+    lines = list(status_lines)
+    for tool_name in (tool_results or {}):
+        tool_records = sorted((r for r in records if r[2] == tool_name), key=lambda record: (-record[0], record[1]))
+        result = tool_results[tool_name]
+        if not isinstance(result, dict) or result.get("status") != "success":
+            continue
+        if tool_records:
+            # The first field of a record is usually its title
+            titles = [record[3].split(" | ")[0].split(": ", 1)[-1] for record in tool_records[:3]]
+            lines.append(f"[{tool_name}] success: {len(tool_records)} results, e.g. " + "; ".join(titles))
+        elif extract_items(result.get("data")):
+            lines.append(f"[{tool_name}] success: only results already returned by another tool")
+        else:
+            lines.append(f"[{tool_name}] success: no results")
+
+    text = "\n".join(lines) or "No information was found."
+    if len(text) > budget:
+        text = text[:budget - 3] + "..."
+    return text
+
+
+def format_plan(planning: Dict[str, Any]) -> str:
+    """
+    Format a plan as its reasoning and a compact list of tool calls.
+    """
+    calls = []
+    for tool in planning.get("tools", []):
+        parameters = ", ".join(f"{k}={v!r}" for k, v in tool.get("parameters", {}).items())
+        calls.append(f"{tool.get('name')}({parameters})")
+    text = "Tools: " + ("; ".join(calls) if calls else "none")
+    if planning.get("reasoning"):
+        text += f"\nReasoning: {format_value(planning['reasoning'])}"
+    return text
@@ -0,0 +1,221 @@
+# backend/utils/rate_limiter.py
+import os
+import time
+import asyncio
+import threading
+from typing import Dict, Any, Optional
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled continuously at a per-minute rate.
+
+    A bucket with a per-minute rate of 0 is unlimited.
+    """
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        self.per_minute = per_minute
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_take(self, amount: float) -> float:
+        """
+        Take amount tokens if available.
+
+        Returns:
+            0 if the tokens were taken, otherwise the seconds until they will be available
+        """
+        if not self.per_minute:
+            return 0.0
+        # A single request larger than the bucket waits for a full bucket instead of forever
+        amount = min(amount, self.capacity)
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= amount:
+                self._tokens -= amount
+                return 0.0
+            return (amount - self._tokens) / self.rate
+
+    def wait_time(self, amount: float) -> float:
+        """
+        Seconds until amount tokens will be available, without taking them.
+        """
+        if not self.per_minute:
+            return 0.0
+        amount = min(amount, self.capacity)
+        with self._lock:
+            self._refill(time.monotonic())
+            return max(0.0, (amount - self._tokens) / self.rate)
+
+    def give_back(self, amount: float) -> None:
+        """
+        Return tokens taken for a request that was not sent.
+        """
+        if not self.per_minute:
+            return
+        with self._lock:
+            self._tokens = min(self.capacity, self._tokens + amount)
+
+    def adjust(self, delta: float) -> None:
+        """
+        Charge (positive) or refund (negative) tokens once the actual cost is known.
+
+        The balance may go negative, which delays later requests until it is repaid.
+        """
+        if not self.per_minute:
+            return
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self.capacity, self._tokens - delta)
+
+
+class GeminiRateLimiter:
+    """
+    Process-wide limiter for Gemini calls.
+
+    Bounds the number of concurrent calls with a semaphore, and the request
+    and token throughput with two token buckets sized to the project's quota
+    (requests and tokens per minute). Callers wait up to acquire_timeout
+    seconds for capacity; the token cost of a call is estimated up front and
+    corrected with the actual usage once the response arrives.
+    """
+    def __init__(self, max_concurrency: int = 8, requests_per_minute: float = 60,
+                 tokens_per_minute: float = 1000000, acquire_timeout: float = 30):
+        self.max_concurrency = max_concurrency
+        self.acquire_timeout = acquire_timeout
+        self.semaphore = threading.BoundedSemaphore(max_concurrency)
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "in_flight": 0, "throttled": 0, "waited_ms": 0}
+
+    def reserve(self, tokens: float) -> float:
+        """
+        Take one request and the given tokens from the buckets.
+
+        Returns:
+            0 on success, otherwise the seconds to wait before trying again
+        """
+        wait = self.requests.try_take(1)
+        if wait:
+            return wait
+        wait = self.tokens.try_take(tokens)
+        if wait:
+            self.requests.give_back(1)
+        return wait
+
+    def acquire(self, tokens: float) -> bool:
+        """
+        Wait for a concurrency slot and rate capacity for one call.
+
+        Returns:
+            True once acquired (release() must then be called), False on timeout
+        """
+        start = time.monotonic()
+        deadline = start + self.acquire_timeout
+        if not self.semaphore.acquire(timeout=self.acquire_timeout):
+            return self._throttled()
+        while True:
+            wait = self.reserve(tokens)
+            if not wait:
+                return self._acquired(start)
+            if time.monotonic() + wait > deadline:
+                self.semaphore.release()
+                return self._throttled()
+            time.sleep(wait)
+
+    async def aacquire(self, tokens: float) -> bool:
+        """
+        Async variant of acquire() that waits without blocking the event loop.
+        """
+        start = time.monotonic()
+        deadline = start + self.acquire_timeout
+        # The semaphore is shared with threads, so poll it rather than block the loop
+        while not self.semaphore.acquire(blocking=False):
+            if time.monotonic() >= deadline:
+                return self._throttled()
+            await asyncio.sleep(0.05)
+        try:
+            while True:
+                wait = self.reserve(tokens)
+                if not wait:
+                    return self._acquired(start)
+                if time.monotonic() + wait > deadline:
+                    self.semaphore.release()
+                    return self._throttled()
+                await asyncio.sleep(wait)
+        except BaseException:
+            # Cancelled while waiting for tokens: hand the slot back
+            self.semaphore.release()
+            raise
+
+    def release(self) -> None:
+        with self._lock:
+            self._stats["in_flight"] -= 1
+        self.semaphore.release()
+
+    def record_usage(self, estimated_tokens: float, actual_tokens: Optional[float]) -> None:
+        """
+        Correct the token bucket with a call's actual token usage.
+        """
+        if actual_tokens:
+            self.tokens.adjust(actual_tokens - estimated_tokens)
+
+    def retry_after(self, tokens: float) -> float:
+        """
+        Estimate how long until a call of this size could be admitted.
+        """
+        wait = max(self.requests.wait_time(1), self.tokens.wait_time(tokens))
+        return max(1.0, round(min(wait, 60.0), 1))
+
+    def _acquired(self, start: float) -> bool:
+        with self._lock:
+            self._stats["calls"] += 1
+            self._stats["in_flight"] += 1
+            self._stats["waited_ms"] += int((time.monotonic() - start) * 1000)
+        return True
+
+    def _throttled(self) -> bool:
+        with self._lock:
+            self._stats["throttled"] += 1
+        return False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self._stats,
+                "max_concurrency": self.max_concurrency,
+                "requests_per_minute": self.requests.per_minute,
+                "tokens_per_minute": self.tokens.per_minute
+            }
+
+
+_gemini_limiter: Optional[GeminiRateLimiter] = None
+_gemini_limiter_lock = threading.Lock()
+
+
+def get_gemini_limiter() -> GeminiRateLimiter:
+    """
+    Get the process-wide Gemini limiter, creating it from the environment on first use.
+
+    GEMINI_MAX_CONCURRENCY bounds concurrent calls; GEMINI_RPM and GEMINI_TPM
+    set the request and token quotas per minute (0 disables either);
+    GEMINI_ACQUIRE_TIMEOUT is how long a call waits for capacity.
+    """
+    global _gemini_limiter
+    if _gemini_limiter is None:
+        with _gemini_limiter_lock:
+            if _gemini_limiter is None:
+                _gemini_limiter = GeminiRateLimiter(
+                    max_concurrency=int(os.environ.get("GEMINI_MAX_CONCURRENCY", 8)),
+                    requests_per_minute=float(os.environ.get("GEMINI_RPM", 60)),
+                    tokens_per_minute=float(os.environ.get("GEMINI_TPM", 1000000)),
+                    acquire_timeout=float(os.environ.get("GEMINI_ACQUIRE_TIMEOUT", 30))
+                )
+    return _gemini_limiter
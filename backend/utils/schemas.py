@@ -0,0 +1,42 @@
+# backend/utils/schemas.py
+from typing import Dict, Any, List
+from pydantic import BaseModel, Field, field_validator
+
+
+class ToolCall(BaseModel):
+    """A tool the planner decided to call."""
+    name: str
+    parameters: Dict[str, Any] = Field(default_factory=dict)
+
+    @field_validator("parameters", mode="before")
+    @classmethod
+    def drop_empty_parameters(cls, value: Any) -> Dict[str, Any]:
+        # Schema-constrained output fills every parameter of every tool; keep only the set ones
+        return {k: v for k, v in (value or {}).items() if v not in (None, "")}
+
+
+class Plan(BaseModel):
+    """Output of the planning agent."""
+    in_scope: bool = True
+    tools: List[ToolCall] = Field(default_factory=list)
+    reasoning: str = ""
+
+
+class Evaluation(BaseModel):
+    """Output of the evaluation agent; each score is 0-10."""
+    accuracy: int = Field(ge=0, le=10)
+    relevance: int = Field(ge=0, le=10)
+    completeness: int = Field(ge=0, le=10)
+    clarity: int = Field(ge=0, le=10)
+    feedback: str = ""
+
+    @field_validator("accuracy", "relevance", "completeness", "clarity", mode="before")
+    @classmethod
+    def round_score(cls, value: Any) -> Any:
+        # Models occasionally answer "8/10" or 8.5
+        if isinstance(value, str):
+            value = value.split("/")[0].strip()
+        try:
+            return int(round(float(value)))
+        except (TypeError, ValueError):
+            return value
@@ -0,0 +1,271 @@
+# backend/utils/semantic_cache.py
+import os
+import re
+import json
+import math
+import time
+import uuid
+import atexit
+import threading
+from collections import Counter, OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+
+def normalize_query(text: str) -> str:
+    """
+    Lowercase a query and strip punctuation and repeated whitespace.
+    """
+    text = re.sub(r"[^\w\s]", " ", text.lower())
+    return re.sub(r"\s+", " ", text).strip()
+
+
+# Question and function words that do not change what a query is about. Every
+# query is about Duke, so the name itself carries no information either.
+STOPWORDS = frozenset("""
+a about all an and any are as at be can could did do does duke for from get give has have how i
+in is it its know list me my of on or our please should show some tell that the their there these
+this those to was we were what when where which who why will with would you your
+""".split())
+
+
+def content_tokens(text: str) -> List[str]:
+    """
+    The sorted, distinct content words of a query, with plurals folded to the singular.
+    """
+    tokens = set()
+    for word in normalize_query(text).split():
+        if word in STOPWORDS:
+            continue
+        if len(word) > 4 and word.endswith("ies"):
+            word = word[:-3] + "y"
+        elif len(word) > 3 and word.endswith("s") and not word.endswith(("ss", "us", "is")):
+            word = word[:-1]
+        tokens.add(word)
+    return sorted(tokens)
+
+
+def query_features(text: str) -> Dict[str, float]:
+    """
+    Build an L2-normalized sparse vector of word unigrams, word bigrams and
+    character trigrams for a query.
+
+    Character trigrams make the match tolerant to typos and plurals; word
+    bigrams keep "events today" and "today events" from being identical.
+    """
+    normalized = normalize_query(text)
+    words = normalized.split()
+    features = Counter()
+    features.update(f"w:{w}" for w in words)
+    features.update(f"b:{a}_{b}" for a, b in zip(words, words[1:]))
+    padded = f" {normalized} "
+    features.update(f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2))
+
+    norm = math.sqrt(sum(v * v for v in features.values()))
+    if not norm:
+        return {}
+    return {k: v / norm for k, v in features.items()}
+
+
+class SemanticAnswerCache:
+    """
+    Front cache of complete answers keyed on query similarity.
+
+    Stored answers are grouped by the content words of their query, and a
+    lookup only scores entries with exactly the same content words: queries
+    naming a different campus, program or date never match, however similar
+    the rest of the wording. Within that group a hit requires n-gram cosine
+    similarity at or above the threshold and an unexpired entry, so rephrasing
+    ("dining options" / "what are the dining options") still hits. The entries
+    can be persisted to a JSON file and reloaded on startup.
+    """
+    def __init__(self, threshold: float = 0.6, ttl: float = 3600, max_entries: int = 2000,
+                 path: Optional[str] = None, save_every: int = 20):
+        """
+        Initialize the semantic cache.
+
+        Args:
+            threshold: Minimum cosine similarity for a hit among entries with the same content words (0-1)
+            ttl: Default lifetime of an entry in seconds
+            max_entries: Entries kept before the least recently used are evicted
+            path: Optional JSON file the index is loaded from and saved to
+            save_every: Number of writes between automatic saves to path
+        """
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.path = path
+        self.save_every = save_every
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        # Content words (space-joined) -> IDs of the entries whose query has exactly those words
+        self._groups: Dict[str, set] = {}
+        self._lock = threading.RLock()
+        self._writes_since_save = 0
+        self.hits = 0
+        self.misses = 0
+
+        if self.path:
+            self.load()
+
+    def _add(self, entry_id: str, entry: Dict[str, Any]) -> None:
+        self._entries[entry_id] = entry
+        self._groups.setdefault(entry["content"], set()).add(entry_id)
+
+    def _remove(self, entry_id: str) -> None:
+        entry = self._entries.pop(entry_id, None)
+        if entry is None:
+            return
+        ids = self._groups.get(entry["content"])
+        if ids is not None:
+            ids.discard(entry_id)
+            if not ids:
+                del self._groups[entry["content"]]
+
+    def _best_match(self, content: str, features: Dict[str, float]) -> Tuple[Optional[str], float]:
+        best_id, best_score = None, 0.0
+        for entry_id in self._groups.get(content, ()):
+            entry_features = self._entries[entry_id]["features"]
+            score = sum(weight * entry_features.get(feature, 0.0) for feature, weight in features.items())
+            if best_id is None or score > best_score:
+                best_id, best_score = entry_id, score
+        return best_id, best_score
+
+    def lookup(self, query: str) -> Optional[Dict[str, Any]]:
+        """
+        Find a stored answer for a similar query.
+
+        Returns:
+            The stored payload plus "similarity" and "cached_query", or None on a miss
+        """
+        features = query_features(query)
+        content = " ".join(content_tokens(query))
+        if not features or not content:
+            return None
+
+        with self._lock:
+            entry_id, similarity = self._best_match(content, features)
+            entry = self._entries.get(entry_id) if entry_id else None
+            if entry is not None and entry["expires_at"] <= time.time():
+                self._remove(entry_id)
+                entry = None
+
+            if entry is None or similarity < self.threshold:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(entry_id)
+            self.hits += 1
+            return {
+                **entry["payload"],
+                "similarity": round(similarity, 4),
+                "cached_query": entry["query"]
+            }
+
+    def store(self, query: str, payload: Dict[str, Any], ttl: Optional[float] = None) -> None:
+        """
+        Store an answer for a query.
+
+        Args:
+            query: The user message the answer was generated for
+            payload: JSON-serializable answer fields (response, thinking, evaluation)
+            ttl: Lifetime in seconds, defaulting to the cache TTL
+        """
+        features = query_features(query)
+        content = " ".join(content_tokens(query))
+        if not features or not content:
+            return
+
+        with self._lock:
+            # Replace an existing answer for an effectively identical query
+            existing_id, similarity = self._best_match(content, features)
+            if existing_id and similarity >= 0.999:
+                self._remove(existing_id)
+
+            self._add(uuid.uuid4().hex, {
+                "query": query,
+                "content": content,
+                "features": features,
+                "payload": payload,
+                "expires_at": time.time() + (self.ttl if ttl is None else ttl)
+            })
+
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+            self._writes_since_save += 1
+            should_save = self.path and self._writes_since_save >= self.save_every
+
+        if should_save:
+            self.save()
+
+    def save(self) -> None:
+        """
+        Persist the unexpired entries to the configured path.
+        """
+        if not self.path:
+            return
+        now = time.time()
+        with self._lock:
+            entries = [entry for entry in self._entries.values() if entry["expires_at"] > now]
+            self._writes_since_save = 0
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump([{k: v for k, v in e.items() if k not in ("features", "content")} for e in entries], f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Warning: Could not save semantic cache: {str(e)}")
+
+    def load(self) -> None:
+        """
+        Load entries from the configured path, skipping expired ones.
+        """
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                stored: List[Dict[str, Any]] = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Warning: Could not load semantic cache: {str(e)}")
+            return
+
+        now = time.time()
+        with self._lock:
+            for entry in stored:
+                if entry.get("expires_at", 0) <= now:
+                    continue
+                content = " ".join(content_tokens(entry["query"]))
+                if not content:
+                    continue
+                self._add(uuid.uuid4().hex, {**entry, "content": content,
+                                             "features": query_features(entry["query"])})
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+                "threshold": self.threshold
+            }
+
+
+def build_semantic_cache() -> Optional[SemanticAnswerCache]:
+    """
+    Build the answer cache from the environment, or None if SEMANTIC_CACHE_ENABLED is false.
+    """
+    if os.environ.get("SEMANTIC_CACHE_ENABLED", "true").lower() not in ("1", "true", "yes"):
+        return None
+
+    cache = SemanticAnswerCache(
+        threshold=float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", 0.6)),
+        ttl=float(os.environ.get("SEMANTIC_CACHE_TTL", 3600)),
+        max_entries=int(os.environ.get("SEMANTIC_CACHE_MAX_ENTRIES", 2000)),
+        path=os.environ.get("SEMANTIC_CACHE_PATH") or None
+    )
+    if cache.path:
+        atexit.register(cache.save)
+    return cache
@@ -0,0 +1,134 @@
+# backend/utils/single_flight.py
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+
+class _Call:
+    """
+    One in-flight call and the outcome its waiters receive.
+    """
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Deduplicates identical concurrent calls across threads.
+
+    The first caller for a key runs the function; callers arriving with the
+    same key while it is running wait for it and receive the same result, or
+    the same exception. The key is forgotten as soon as the call finishes, so
+    nothing is cached beyond the in-flight window.
+    """
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "shared": 0, "errors": 0}
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Run fn, or wait for the identical call already running.
+
+        Returns:
+            (result, shared), where shared is True if the result came from another caller's run
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            shared = call is not None
+            if shared:
+                self._stats["shared"] += 1
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self._stats["calls"] += 1
+        if shared:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            with self._lock:
+                self._stats["errors"] += 1
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._stats, "in_flight": len(self._calls)}
+
+
+class _AsyncCall:
+    """
+    One in-flight coroutine call and the number of callers awaiting it.
+    """
+    def __init__(self, task: "asyncio.Future[Any]"):
+        self.task = task
+        self.waiters = 0
+
+
+class AsyncSingleFlight:
+    """
+    Async variant of SingleFlight, for coroutines on one event loop.
+
+    The shared call runs as its own task, so a caller that is cancelled (a
+    client disconnecting, a tool deadline) stops waiting without cancelling
+    the call for the others; the call itself is cancelled only once every
+    caller waiting on it has gone.
+    """
+    def __init__(self):
+        self._calls: Dict[str, _AsyncCall] = {}
+        self._stats = {"calls": 0, "shared": 0, "errors": 0, "cancelled": 0}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Await fn(), or the identical call already running.
+
+        Returns:
+            (result, shared), where shared is True if the result came from another caller's run
+        """
+        call = self._calls.get(key)
+        shared = call is not None
+        if shared:
+            self._stats["shared"] += 1
+        else:
+            call = _AsyncCall(asyncio.ensure_future(fn()))
+            self._calls[key] = call
+            self._stats["calls"] += 1
+            call.task.add_done_callback(lambda task: self._finish(key, call))
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task), shared
+        except asyncio.CancelledError:
+            if call.waiters == 1 and not call.task.done():
+                # Nobody else is waiting for the result; later callers start a fresh call
+                self._forget(key, call)
+                call.task.cancel()
+            raise
+        finally:
+            call.waiters -= 1
+
+    def _forget(self, key: str, call: _AsyncCall) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def _finish(self, key: str, call: _AsyncCall) -> None:
+        self._forget(key, call)
+        if call.task.cancelled():
+            self._stats["cancelled"] += 1
+        elif call.task.exception() is not None:
+            self._stats["errors"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._stats, "in_flight": len(self._calls)}
@@ -0,0 +1,276 @@
+# backend/utils/tool_cache.py
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+
+class MemoryCacheBackend:
+    """
+    In-process LRU cache with per-entry expiry, bounded by entry count.
+    """
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def size(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class SQLiteCacheBackend:
+    """
+    Cache stored in a SQLite file so every gunicorn worker on a host shares it.
+
+    Uses WAL mode so readers in one worker do not block writers in another, and
+    evicts the least recently used rows once the table exceeds max_entries.
+    """
+    def __init__(self, path: str, max_entries: int = 10000):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        conn = self._connection()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS tool_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS tool_cache_accessed ON tool_cache (accessed_at)")
+        conn.commit()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[Any]:
+        conn = self._connection()
+        now = time.time()
+        row = conn.execute("SELECT value, expires_at FROM tool_cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        if row[1] <= now:
+            conn.execute("DELETE FROM tool_cache WHERE key = ?", (key,))
+            conn.commit()
+            return None
+        conn.execute("UPDATE tool_cache SET accessed_at = ? WHERE key = ?", (now, key))
+        conn.commit()
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        conn = self._connection()
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO tool_cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+            (key, json.dumps(value), now + ttl, now)
+        )
+        conn.execute(
+            "DELETE FROM tool_cache WHERE key IN ("
+            "SELECT key FROM tool_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+        conn.commit()
+
+    def size(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM tool_cache").fetchone()[0]
+
+    def clear(self) -> None:
+        conn = self._connection()
+        conn.execute("DELETE FROM tool_cache")
+        conn.commit()
+
+
+def normalize_parameters(value: Any) -> Any:
+    """
+    Normalize tool parameters so equivalent calls share a cache key.
+
+    Strings are lowercased and have whitespace collapsed; dictionaries lose
+    keys whose value is None so omitted and defaulted parameters match.
+    """
+    if isinstance(value, str):
+        return re.sub(r"\s+", " ", value.strip().lower())
+    if isinstance(value, dict):
+        return {str(k): normalize_parameters(v) for k, v in value.items() if v is not None}
+    if isinstance(value, (list, tuple)):
+        return [normalize_parameters(v) for v in value]
+    return value
+
+
+def tool_call_key(tool_name: str, parameters: Dict[str, Any]) -> str:
+    """
+    Key identifying a tool call: the tool name plus a hash of its normalized parameters.
+    """
+    normalized = json.dumps(normalize_parameters(parameters or {}), sort_keys=True, default=str)
+    return f"{tool_name}:{hashlib.sha256(normalized.encode('utf-8')).hexdigest()}"
+
+
+class ToolResultCache:
+    """
+    TTL cache for tool results, keyed on tool name plus normalized parameters.
+
+    Only successful results are stored; errors and timeouts are always
+    retried on the next request. Each successful result is also kept as the
+    "last good" result for its parameters for stale_ttl seconds, which is
+    served (marked stale) while the tool's circuit breaker is open.
+    """
+    DEFAULT_TTLS = {
+        "DukeGeneralInfoTool": 3600,
+        "DukeAIMEngTool": 3600,
+        "DukeEventsSearchTool": 300,
+        "DukeFutureEventsSearchTool": 600,
+    }
+
+    def __init__(self, backend: Any, ttls: Optional[Dict[str, float]] = None, default_ttl: float = 300,
+                 stale_ttl: float = 86400):
+        """
+        Initialize the cache.
+
+        Args:
+            backend: Storage backend (MemoryCacheBackend or SQLiteCacheBackend)
+            ttls: Per-tool TTLs in seconds, merged over DEFAULT_TTLS
+            default_ttl: TTL for tools without an explicit entry
+            stale_ttl: Seconds a last good result is kept for serve-stale (0 disables it)
+        """
+        self.backend = backend
+        self.ttls = {**self.DEFAULT_TTLS, **(ttls or {})}
+        self.default_ttl = default_ttl
+        self.stale_ttl = stale_ttl
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._stats_lock = threading.Lock()
+
+    def make_key(self, tool_name: str, parameters: Dict[str, Any]) -> str:
+        """
+        Build the cache key for a tool call.
+        """
+        return tool_call_key(tool_name, parameters)
+
+    def ttl_for(self, tool_name: str) -> float:
+        return self.ttls.get(tool_name, self.default_ttl)
+
+    def _count(self, tool_name: str, field: str) -> None:
+        with self._stats_lock:
+            counters = self._stats.setdefault(tool_name, {"hits": 0, "misses": 0})
+            counters[field] += 1
+
+    def get(self, tool_name: str, parameters: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Get a cached result for a tool call, or None on a miss.
+        """
+        if self.ttl_for(tool_name) <= 0:
+            return None
+        try:
+            value = self.backend.get(self.make_key(tool_name, parameters))
+        except Exception as e:
+            print(f"Warning: Tool cache read failed: {str(e)}")
+            value = None
+        self._count(tool_name, "hits" if value is not None else "misses")
+        return value
+
+    def set(self, tool_name: str, parameters: Dict[str, Any], result: Dict[str, Any]) -> None:
+        """
+        Store a tool result if it was successful (and not itself served stale).
+        """
+        ttl = self.ttl_for(tool_name)
+        if ttl <= 0 or not isinstance(result, dict) or result.get("status") != "success" or result.get("stale"):
+            return
+        try:
+            key = self.make_key(tool_name, parameters)
+            self.backend.set(key, result, ttl)
+            if self.stale_ttl > 0:
+                self.backend.set(f"stale:{key}", result, self.stale_ttl)
+        except Exception as e:
+            print(f"Warning: Tool cache write failed: {str(e)}")
+
+    def get_stale(self, tool_name: str, parameters: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Get the last good result for a tool call, even if its normal TTL has passed.
+        """
+        if self.stale_ttl <= 0:
+            return None
+        try:
+            return self.backend.get(f"stale:{self.make_key(tool_name, parameters)}")
+        except Exception as e:
+            print(f"Warning: Tool cache read failed: {str(e)}")
+            return None
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get hit/miss counters per tool for this process.
+        """
+        with self._stats_lock:
+            per_tool = {name: dict(counters) for name, counters in self._stats.items()}
+        hits = sum(c["hits"] for c in per_tool.values())
+        misses = sum(c["misses"] for c in per_tool.values())
+        try:
+            size = self.backend.size()
+        except Exception:
+            size = None
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / (hits + misses), 3) if hits + misses else 0.0,
+            "entries": size,
+            "tools": per_tool
+        }
+
+
+def build_tool_cache() -> Optional[ToolResultCache]:
+    """
+    Build the tool result cache from the environment.
+
+    TOOL_CACHE_BACKEND selects "memory" (default), "sqlite" (shared across
+    workers via TOOL_CACHE_PATH) or "none". TOOL_CACHE_TTLS may hold a JSON
+    object of per-tool TTL overrides in seconds; TOOL_CACHE_STALE_TTL is how
+    long last good results are kept for serve-stale.
+    """
+    backend_name = os.environ.get("TOOL_CACHE_BACKEND", "memory").lower()
+    if backend_name == "none":
+        return None
+
+    max_entries = int(os.environ.get("TOOL_CACHE_MAX_ENTRIES", 2048))
+    if backend_name == "sqlite":
+        backend = SQLiteCacheBackend(os.environ.get("TOOL_CACHE_PATH", "/tmp/duke_tool_cache.db"), max_entries)
+    else:
+        backend = MemoryCacheBackend(max_entries)
+
+    ttls = {}
+    if os.environ.get("TOOL_CACHE_TTLS"):
+        try:
+            ttls = {k: float(v) for k, v in json.loads(os.environ["TOOL_CACHE_TTLS"]).items()}
+        except (ValueError, AttributeError) as e:
+            print(f"Warning: Ignoring invalid TOOL_CACHE_TTLS: {str(e)}")
+
+    return ToolResultCache(backend, ttls, default_ttl=float(os.environ.get("TOOL_CACHE_DEFAULT_TTL", 300)),
+                           stale_ttl=float(os.environ.get("TOOL_CACHE_STALE_TTL", 86400)))
@@ -0,0 +1,253 @@
+# backend/utils/tracing.py
+import os
+import sys
+import asyncio
+import json
+import time
+import secrets
+import threading
+import contextvars
+from concurrent.futures import Executor
+from contextlib import contextmanager
+from typing import Dict, Any, Awaitable, Callable, Iterator, List, Optional
+
+# The span the current request (or worker thread running on its behalf) is in
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+
+
+class Trace:
+    """
+    The spans recorded for one request.
+    """
+    def __init__(self):
+        self.trace_id = secrets.token_hex(16)
+        self.spans: List["Span"] = []
+        self._lock = threading.Lock()
+
+    def add(self, span: "Span") -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def finished(self) -> List["Span"]:
+        with self._lock:
+            return [span for span in self.spans if span.end_ns is not None]
+
+
+class Span:
+    """
+    A timed operation with attributes (model, tokens, cache hit, retries, ...).
+    """
+    def __init__(self, name: str, trace: Trace, parent: Optional["Span"], attributes: Dict[str, Any]):
+        self.name = name
+        self.trace = trace
+        self.span_id = secrets.token_hex(8)
+        self.parent = parent
+        self.attributes = dict(attributes)
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.error: Optional[str] = None
+
+    def set(self, key: str, value: Any) -> None:
+        """Set an attribute."""
+        self.attributes[key] = value
+
+    def add(self, key: str, amount: float = 1) -> None:
+        """Increment a numeric attribute, e.g. a retry count."""
+        self.attributes[key] = self.attributes.get(key, 0) + amount
+
+    @property
+    def duration_ms(self) -> float:
+        end_ns = self.end_ns if self.end_ns is not None else time.time_ns()
+        return round((end_ns - self.start_ns) / 1e6, 2)
+
+    def to_otel(self) -> Dict[str, Any]:
+        """
+        Render the span in the OpenTelemetry (OTLP JSON) span layout.
+        """
+        return {
+            "traceId": self.trace.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent.span_id if self.parent else "",
+            "name": self.name,
+            "kind": "SPAN_KIND_INTERNAL",
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [{"key": key, "value": otel_value(value)} for key, value in self.attributes.items()],
+            "status": {"code": "STATUS_CODE_ERROR", "message": self.error} if self.error else {"code": "STATUS_CODE_OK"}
+        }
+
+
+def otel_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class SpanExporter:
+    """
+    Writes finished spans as OTLP-style JSON lines to stdout or a file.
+
+    The records can be loaded by an OpenTelemetry collector's file receiver or
+    read directly; nothing is written when the exporter is disabled.
+    """
+    def __init__(self, target: Optional[str] = None):
+        """
+        Args:
+            target: "console" for stdout, a file path to append to, or None/"none" to disable
+        """
+        self.enabled = target not in (None, "", "none")
+        self.path = None if target in (None, "", "none", "console") else target
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        if not self.enabled:
+            return
+        line = json.dumps({"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": "duke-chatbot"}}]},
+            "scopeSpans": [{"scope": {"name": "duke-chatbot"}, "spans": [span.to_otel()]}]
+        }]}, default=str)
+        with self._lock:
+            try:
+                if self.path:
+                    with open(self.path, "a") as f:
+                        f.write(line + "\n")
+                else:
+                    sys.stdout.write(line + "\n")
+                    sys.stdout.flush()
+            except OSError as e:
+                print(f"Warning: Could not export span {span.name}: {str(e)}")
+
+
+class Tracer:
+    """
+    Request-scoped tracing.
+
+    start_trace opens the root span of a request; span opens a child of
+    whichever span is current, so nested calls (graph node -> Gemini call,
+    tool executor -> tool) form a tree without passing anything around. The
+    current span lives in a context variable; work handed to a thread pool is
+    wrapped with propagate so it records into the same trace. Outside a
+    trace, span is a no-op.
+    """
+    def __init__(self, exporter: Optional[SpanExporter] = None):
+        self.exporter = exporter or SpanExporter(None)
+
+    @contextmanager
+    def start_trace(self, name: str, **attributes) -> Iterator[Span]:
+        trace = Trace()
+        with self._run(Span(name, trace, None, attributes)) as span:
+            yield span
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Optional[Span]]:
+        parent = _current_span.get()
+        if parent is None:
+            yield None
+            return
+        with self._run(Span(name, parent.trace, parent, attributes)) as span:
+            yield span
+
+    @contextmanager
+    def _run(self, span: Span) -> Iterator[Span]:
+        span.trace.add(span)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {str(e)}"
+            raise
+        finally:
+            span.end_ns = time.time_ns()
+            try:
+                _current_span.reset(token)
+            except ValueError:
+                # A streaming generator closed from another context than it started in
+                _current_span.set(span.parent)
+            self.exporter.export(span)
+
+    def current_span(self) -> Optional[Span]:
+        return _current_span.get()
+
+    def set(self, key: str, value: Any) -> None:
+        """Set an attribute on the current span, if any."""
+        span = _current_span.get()
+        if span is not None:
+            span.set(key, value)
+
+    def add(self, key: str, amount: float = 1) -> None:
+        """Increment an attribute on the current span, if any."""
+        span = _current_span.get()
+        if span is not None:
+            span.add(key, amount)
+
+    def timings(self, root: Span) -> Dict[str, Any]:
+        """
+        Summarize a request's spans for the API response.
+
+        Returns:
+            {"total_ms", "stages": total ms per span name, "spans": [...]} with each
+            span's offset from the start of the request, duration, parent and attributes
+        """
+        spans = sorted(root.trace.finished(), key=lambda span: span.start_ns)
+        stages: Dict[str, float] = {}
+        for span in spans:
+            if span is not root:
+                stages[span.name] = round(stages.get(span.name, 0) + span.duration_ms, 2)
+        return {
+            "trace_id": root.trace.trace_id,
+            "total_ms": root.duration_ms,
+            "stages": stages,
+            "spans": [
+                {
+                    "name": span.name,
+                    "parent": span.parent.name if span.parent else None,
+                    "start_ms": round((span.start_ns - root.start_ns) / 1e6, 2),
+                    "duration_ms": span.duration_ms,
+                    **({"attributes": span.attributes} if span.attributes else {}),
+                    **({"error": span.error} if span.error else {})
+                }
+                for span in spans
+            ]
+        }
+
+
+def propagate(fn: Callable) -> Callable:
+    """
+    Bind a callable to the current context, so a thread pool worker running
+    it records its spans into the submitting request's trace.
+    """
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(fn, *args, **kwargs)
+
+
+async def run_in_pool(pool: Executor, fn: Callable, *args: Any, **kwargs: Any) -> Any:
+    """Run a blocking call in a thread pool from async code, keeping the current trace."""
+    return await asyncio.get_running_loop().run_in_executor(pool, propagate(lambda: fn(*args, **kwargs)))
+
+
+def traced_node(name: str, node: Callable[[Dict[str, Any]], Dict[str, Any]]) -> Callable[[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Wrap a workflow node so each run is recorded as a span.
+    """
+    def run(state: Dict[str, Any]) -> Dict[str, Any]:
+        with tracer.span(f"node.{name}"):
+            return node(state)
+    return run
+
+
+def atraced_node(name: str, node: Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]) -> Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]:
+    """
+    Async variant of traced_node().
+    """
+    async def run(state: Dict[str, Any]) -> Dict[str, Any]:
+        with tracer.span(f"node.{name}"):
+            return await node(state)
+    return run
+
+
+# TRACING_EXPORTER is "none" (default), "console" or a file path for OTLP JSON lines
+tracer = Tracer(SpanExporter(os.environ.get("TRACING_EXPORTER", "none")))
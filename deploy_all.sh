@@ -19,6 +19,7 @@ gcloud run deploy backend \
   --region $REGION \
   --allow-unauthenticated \
   --memory 512Mi \
+  --set-env-vars=TRUSTED_PROXY_COUNT=1 \
   --set-secrets=GEMINI_API_KEY=GEMINI_API_KEY:latest,\
 GOOGLE_API_KEY=GOOGLE_API_KEY:latest,\
 DUKE_API_AUTH_TOKEN=DUKE_API_AUTH_TOKEN:latest,\
@@ -34,4 +34,56 @@ export const fetchGeneralInfo = async (query) => {
     console.error('API Error:', error);
     throw error;
   }
-};
\ No newline at end of file
+};
+
+// Stream a chat response from /api/chat/stream (Server-Sent Events).
+// `onEvent(event, data)` is called for every stage, token and trailing event;
+// the promise resolves with the final result from the "done" event.
+export const streamResponse = async (message, conversationId, onEvent) => {
+  const response = await fetch(`${API_URL}/api/chat/stream`, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+    },
+    body: JSON.stringify({ message, conversationId }),
+  });
+
+  if (!response.ok || !response.body) {
+    throw new Error(`Streaming request failed with status ${response.status}`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  let result = null;
+
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    let boundary;
+    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+      const rawEvent = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+
+      let event = 'message';
+      let data = '';
+      rawEvent.split('\n').forEach((line) => {
+        if (line.startsWith('event: ')) event = line.slice(7);
+        else if (line.startsWith('data: ')) data += line.slice(6);
+      });
+
+      const payload = data ? JSON.parse(data) : {};
+      if (event === 'error') {
+        throw new Error(payload.details || payload.error || 'Streaming error');
+      }
+      if (event === 'done') {
+        result = payload;
+      }
+      if (onEvent) onEvent(event, payload);
+    }
+  }
+
+  return result;
+};